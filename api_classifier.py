@@ -4,124 +4,69 @@ API 分类器 - 可选功能
 当前未启用，保留接口供未来扩展
 """
 from typing import Optional
-import os
 import json
-from datetime import date
-from pathlib import Path
+import re
+from contextlib import contextmanager
+from itertools import product
+from string import ascii_uppercase
 
-USAGE_TRACK_PATH = Path(
-    os.getenv(
-        "API_USAGE_TRACK_PATH",
-        Path.home() / ".us_china_picker" / "api_usage.json"
-    )
-)
-
-
-def _ensure_usage_dir() -> None:
-    try:
-        USAGE_TRACK_PATH.parent.mkdir(parents=True, exist_ok=True)
-    except Exception:
-        pass
-
-
-def _load_usage() -> dict:
-    if not USAGE_TRACK_PATH.exists():
-        return {}
-    try:
-        with USAGE_TRACK_PATH.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-
-def _save_usage(data: dict) -> None:
-    try:
-        _ensure_usage_dir()
-        with USAGE_TRACK_PATH.open("w", encoding="utf-8") as f:
-            json.dump(data, f)
-    except Exception:
-        pass
+from llm_gateway import get_gateway
+from usage_ledger import get_ledger
 
 
 def _get_budget_config() -> tuple[float, float]:
-    """Get budget and cost per call from environment or Streamlit secrets."""
-    budget = 0.0
-    cost_per_call = 0.0003  # Default: $0.0003 per call (based on $0.02/66 articles)
-    
-    # Try Streamlit secrets first
-    try:
-        import streamlit as st
-        if hasattr(st, "secrets") and "api" in st.secrets:
-            api_config = st.secrets.get("api", {})
-            budget_str = api_config.get("daily_budget_usd", "")
-            cost_str = api_config.get("cost_per_call_usd", "")
-            
-            if budget_str:
-                try:
-                    budget = float(budget_str)
-                except (ValueError, TypeError):
-                    pass
-            
-            if cost_str:
-                try:
-                    cost_per_call = float(cost_str)
-                except (ValueError, TypeError):
-                    pass
-    except:
-        pass
-    
-    # Fallback to environment variables
-    if budget == 0.0:
-        budget_str = os.getenv("API_DAILY_BUDGET_USD", "").strip()
-        if budget_str:
-            try:
-                budget = float(budget_str)
-            except ValueError:
-                pass
-    
-    if cost_per_call == 0.0003:
-        cost_str = os.getenv("API_COST_PER_CALL_USD", "0.0003").strip()
-        if cost_str:
-            try:
-                cost_per_call = float(cost_str)
-            except ValueError:
-                pass
-    
-    if cost_per_call <= 0:
-        cost_per_call = 0.0003
-    
-    return budget, cost_per_call
+    """Get budget and cost per call (resolved once by the LLM gateway from secrets / env)."""
+    config = get_gateway().config
+    return config.daily_budget, config.cost_per_call
 
 def _budget_allows_call() -> bool:
-    """Return False when daily budget is depleted."""
-    budget, cost_per_call = _get_budget_config()
+    """Return False when daily budget is depleted (O(1): in-memory ledger totals, including in-flight reservations)."""
+    budget, _ = _get_budget_config()
     
     if budget <= 0:
         return True  # No budget limit
     
-    usage = _load_usage()
-    today = date.today().isoformat()
-    calls = usage.get(today, 0)
-    current_cost = calls * cost_per_call
-    
-    if current_cost >= budget:
+    if get_ledger().committed_today() >= budget:
         print("⚠️ API daily budget reached, skipping API classification.")
         return False
     return True
 
+@contextmanager
+def _budget_reservation(items: int = 1):
+    """
+    Reserve the estimated cost (cost_per_call × items) in the ledger before a request and release it afterwards.
+    Yields False when the reservation would exceed the daily budget; concurrent chunks cannot all pass the same check.
+    """
+    budget, cost_per_call = _get_budget_config()
+    if budget <= 0:
+        yield True
+        return
+    amount = cost_per_call * items
+    ledger = get_ledger()
+    if not ledger.reserve(amount, budget):
+        print("⚠️ API daily budget reached, skipping API classification.")
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        ledger.release(amount)
+
 def get_budget_status() -> dict:
     """Get current budget status for display."""
     budget, cost_per_call = _get_budget_config()
-    usage = _load_usage()
-    today = date.today().isoformat()
-    calls = usage.get(today, 0)
-    current_cost = calls * cost_per_call
+    today = get_ledger().today()
+    current_cost = today["cost_usd"]
     
     return {
         "budget": budget,
         "daily_budget": budget,  # Alias for clarity in UI
         "cost_per_call": cost_per_call,
-        "calls_today": calls,
+        "calls_today": today["calls"],
+        "articles_today": today["items"],
+        "prompt_tokens_today": today["prompt_tokens"],
+        "completion_tokens_today": today["completion_tokens"],
+        "cached_tokens_today": today["cached_tokens"],
         "cost_today": current_cost,
         "remaining": budget - current_cost if budget > 0 else float('inf'),
         "has_budget": budget > 0
@@ -130,7 +75,9 @@ def get_budget_status() -> dict:
 def estimate_cost(num_articles: int) -> dict:
     """Estimate API cost for classifying given number of articles."""
     _, cost_per_call = _get_budget_config()
-    estimated_cost = num_articles * cost_per_call
+    # 有按 token 计费的历史时，用最近 7 天每篇的实际平均费用
+    cost_per_article = get_ledger().average_cost_per_item() or cost_per_call
+    estimated_cost = num_articles * cost_per_article
     
     budget_status = get_budget_status()
     can_afford = True
@@ -141,147 +88,44 @@ def estimate_cost(num_articles: int) -> dict:
     return {
         "estimated_cost": estimated_cost,
         "num_articles": num_articles,
-        "cost_per_call": cost_per_call,
+        "cost_per_call": cost_per_article,
         "can_afford": can_afford,
         "remaining_budget": budget_status["remaining"] if budget_status["has_budget"] else None
     }
 
 
-def _record_call() -> None:
-    try:
-        usage = _load_usage()
-        today = date.today().isoformat()
-        usage[today] = usage.get(today, 0) + 1
-        _save_usage(usage)
-    except Exception:
-        pass
-
-def classify_with_api(headline: str, nut_graph: str, 
-                      categories: list[str],
-                      provider: str = None) -> Optional[str]:
-    """
-    使用 API 进行文章分类
-    
-    Args:
-        headline: 文章标题
-        nut_graph: 文章摘要
-        categories: 可用类别列表
-        provider: API 提供商 (openai, anthropic)，如果为 None 则自动检测
-    
-    Returns:
-        分类名称，如果无法分类则返回 None
-    """
-    # Debug: Log function entry
-    import sys
-    print(f"🔍 classify_with_api() called: headline='{headline[:50]}...'", file=sys.stderr, flush=True)
-    
-    # 检查是否启用 API
-    api_available = is_api_available()
-    print(f"🔍 is_api_available() returned: {api_available}", file=sys.stderr, flush=True)
-    if not api_available:
-        print("❌ API not available, returning None", file=sys.stderr, flush=True)
-        return None
-    
-    # 自动检测 provider（如果未指定）
-    if provider is None:
-        provider = os.getenv("API_PROVIDER", "openai")
-        try:
-            import streamlit as st
-            if hasattr(st, "secrets") and "api" in st.secrets:
-                provider = st.secrets.get("api", {}).get("provider", provider)
-        except:
-            pass
-    
-    text = f"{headline}\n\n{nut_graph}"
-    
-    print(f"🔍 Provider: {provider}", file=sys.stderr, flush=True)
-    
-    if provider == "openai":
-        print("🔍 Calling _classify_openai()", file=sys.stderr, flush=True)
-        result = _classify_openai(text, categories)
-        print(f"🔍 _classify_openai() returned: {result}", file=sys.stderr, flush=True)
-        return result
-    elif provider == "anthropic":
-        print("🔍 Calling _classify_anthropic()", file=sys.stderr, flush=True)
-        result = _classify_anthropic(text, categories)
-        print(f"🔍 _classify_anthropic() returned: {result}", file=sys.stderr, flush=True)
-        return result
-    else:
-        print(f"❌ Unknown provider: {provider}, returning None", file=sys.stderr, flush=True)
-        return None
-
-def _classify_openai(text: str, categories: list[str]) -> Optional[str]:
-    """使用 OpenAI API 分类"""
-    try:
-        from openai import OpenAI
-        
-        # 从环境变量或 Streamlit secrets 获取 API key
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            # 尝试从 Streamlit secrets 读取（如果是在 Streamlit 环境中）
-            try:
-                import streamlit as st
-                if hasattr(st, "secrets") and "api" in st.secrets:
-                    api_key = st.secrets.get("api", {}).get("openai_api_key")
-            except:
-                pass
-        
-        if not api_key:
-            import sys
-            print("❌ API key not found", file=sys.stderr, flush=True)
-            return None
-        if not _budget_allows_call():
-            import sys
-            print("❌ Budget limit reached, skipping API call", file=sys.stderr, flush=True)
-            return None
-        
-        # Debug: Log API call attempt
-        import sys
-        print(f"🔍 Attempting API call with key: {api_key[:10]}...", file=sys.stderr, flush=True)
-        
-        client = OpenAI(api_key=api_key)
-        
-        # 构建类别说明
-        category_descriptions = {
-            "Administration": "US government administration, White House, Congress, Senate, House of Representatives, presidential orders, congressional actions. Focus on White House/Congress/Trump/Biden, not all agencies.",
-            "Trade & Commerce": "Trade policies, tariffs, trade deals, USTR, Section 301, WTO, market access, exports, imports, supply chains between US and China.",
-            "Shipping": "Shipping, ports, containers, shipbuilding, maritime logistics.",
-            "Chips": "Semiconductors, chips, lithography, ASML, SMIC, TSMC, EDA, wafers, foundries, Nvidia.",
-            "Science & AI": "Artificial intelligence, AI, machine learning, generative AI, foundation models, LLMs, frontier models, AI safety, AI governance, A100, H100, AI chips, ChatGPT, OpenAI, Anthropic.",
-            "Tech & National Security": "Export controls, entity list, CFIUS, critical technology, cybersecurity, espionage related to technology.",
-            "Biotech": "Biotechnology, biopharma, pharmaceuticals, drugs, vaccines, gene editing, CRISPR, synthetic biology, biosecurity, clinical trials, FDA, NMPA, mRNA.",
-            "Climate & Energy": "Climate policy, climate targets, net zero, carbon neutrality/emissions/tax/pricing, renewable energy, clean energy, solar, photovoltaic, wind turbines, hydrogen, EVs, electric vehicles, batteries, charging infrastructure, grid modernization, energy transition.",
-            "Critical Minerals": "Rare earth elements, critical minerals, lithium, cobalt, nickel, graphite.",
-            "Business & Investment": "Foreign direct investment (FDI), investments, mergers, acquisitions, IPOs, private equity, venture capital, sanctions risk in business context.",
-            "Digital Currencies": "Digital yuan, CBDC, stablecoins, cryptocurrency regulation.",
-            "US Multilateralism": "US collaboration with other countries/blocks: G7, G20, NATO, AUKUS, Quad, IMF, World Bank, OECD, EU, ASEAN, UN, UNSC, BRICS, SCO, APEC, CPTPP, RCEP, AU, OAS, joint statements/communiqués, trilateral, multilateral, ministerial meetings.",
-            "Geopolitics": "Adversarial/competition dynamics: deterrence, containment, counter-strategies, sanctions, arms sales/transfers, weapons, military aid, security pacts, alignment, rivalry, competition, great power competition, Indo-Pacific, strategic competition, confrontation.",
-            "China-Russia": "China-Russia relations, Sino-Russian cooperation, Moscow, sanction evasion between China and Russia.",
-            "Taiwan": "Taiwan, Taipei, Taiwan Strait, cross-strait relations, TTW (Taiwan Travel Act), TSMC in Taiwan context.",
-            "Military & Maritime": "PLA (People's Liberation Army), navy, missiles, maritime patrols, gray zone operations, freedom of navigation.",
-            "Influence & Espionage": "Influence operations, spies, espionage, propaganda, disinformation.",
-            "China's Economy": "China's domestic economy, GDP, deflation, stimulus, property sector, real estate in China.",
-            "Higher Education": "Strictly university/academic context: university/college students, professors, faculty, researchers, programs, partnerships, collaborations, funding, grants, visas, warnings, bans, cuts. Must involve university/college context.",
-            "Human Rights": "Human rights issues, Xinjiang, Uyghurs, Hong Kong rights, Tibet.",
-            "Fentanyl": "Fentanyl, precursors, cartels, pills, opioids.",
-            "Inside China": "China's domestic politics: NPC, Party Congress, provincial policies, SOEs, regulators, State Council, local policies.",
-            "Uncategorized": "Articles that don't fit into any of the above categories."
-        }
-        
-        # 构建类别说明文本
-        categories_with_desc = []
-        for cat in categories:
-            desc = category_descriptions.get(cat, cat)
-            categories_with_desc.append(f"- {cat}: {desc}")
-        categories_explanation = "\n".join(categories_with_desc)
-        
-        # 构建改进的提示词（包含类别说明和示例）
-        prompt = f"""You are a professional news classification assistant specializing in US-China relations.
-
-Available categories with descriptions:
-{categories_explanation}
-
-**IMPORTANT: National-Level vs Company-Level News**
+CATEGORY_DESCRIPTIONS = {
+    "Administration": "US government administration, White House, Congress, Senate, House of Representatives, presidential orders, congressional actions. Focus on White House/Congress/Trump/Biden, not all agencies.",
+    "Trade & Commerce": "Trade policies, tariffs, trade deals, USTR, Section 301, WTO, market access, exports, imports, supply chains between US and China.",
+    "Shipping": "Shipping, ports, containers, shipbuilding, maritime logistics.",
+    "Chips": "Semiconductors, chips, lithography, ASML, SMIC, TSMC, EDA, wafers, foundries, Nvidia.",
+    "Science & AI": "Artificial intelligence, AI, machine learning, generative AI, foundation models, LLMs, frontier models, AI safety, AI governance, A100, H100, AI chips, ChatGPT, OpenAI, Anthropic.",
+    "Tech & National Security": "Export controls, entity list, CFIUS, critical technology, cybersecurity, espionage related to technology.",
+    "Biotech": "Biotechnology, biopharma, pharmaceuticals, drugs, vaccines, gene editing, CRISPR, synthetic biology, biosecurity, clinical trials, FDA, NMPA, mRNA.",
+    "Climate & Energy": "Climate policy, climate targets, net zero, carbon neutrality/emissions/tax/pricing, renewable energy, clean energy, solar, photovoltaic, wind turbines, hydrogen, EVs, electric vehicles, batteries, charging infrastructure, grid modernization, energy transition.",
+    "Critical Minerals": "Rare earth elements, critical minerals, lithium, cobalt, nickel, graphite.",
+    "Business & Investment": "Foreign direct investment (FDI), investments, mergers, acquisitions, IPOs, private equity, venture capital, sanctions risk in business context.",
+    "Digital Currencies": "Digital yuan, CBDC, stablecoins, cryptocurrency regulation.",
+    "US Multilateralism": "US collaboration with other countries/blocks: G7, G20, NATO, AUKUS, Quad, IMF, World Bank, OECD, EU, ASEAN, UN, UNSC, BRICS, SCO, APEC, CPTPP, RCEP, AU, OAS, joint statements/communiqués, trilateral, multilateral, ministerial meetings.",
+    "Geopolitics": "Adversarial/competition dynamics: deterrence, containment, counter-strategies, sanctions, arms sales/transfers, weapons, military aid, security pacts, alignment, rivalry, competition, great power competition, Indo-Pacific, strategic competition, confrontation.",
+    "China-Russia": "China-Russia relations, Sino-Russian cooperation, Moscow, sanction evasion between China and Russia.",
+    "Taiwan": "Taiwan, Taipei, Taiwan Strait, cross-strait relations, TTW (Taiwan Travel Act), TSMC in Taiwan context.",
+    "Military & Maritime": "PLA (People's Liberation Army), navy, missiles, maritime patrols, gray zone operations, freedom of navigation.",
+    "Influence & Espionage": "Influence operations, spies, espionage, propaganda, disinformation.",
+    "China's Economy": "China's domestic economy, GDP, deflation, stimulus, property sector, real estate in China.",
+    "Higher Education": "Strictly university/academic context: university/college students, professors, faculty, researchers, programs, partnerships, collaborations, funding, grants, visas, warnings, bans, cuts. Must involve university/college context.",
+    "Human Rights": "Human rights issues, Xinjiang, Uyghurs, Hong Kong rights, Tibet.",
+    "Fentanyl": "Fentanyl, precursors, cartels, pills, opioids.",
+    "Inside China": "China's domestic politics: NPC, Party Congress, provincial policies, SOEs, regulators, State Council, local policies.",
+    "Uncategorized": "Articles that don't fit into any of the above categories."
+}
+
+
+# 提示词 / 输出格式有实质修改时递增，分类缓存中旧版本的结果随之失效
+PROMPT_VERSION = "5"  # 5: 收紧代码解析，作废按宽松解析缓存的错误标签
+
+# 分类规则与示例（单篇、批量提示词共用）
+_CLASSIFICATION_GUIDE = """**IMPORTANT: National-Level vs Company-Level News**
 
 The 22 categories above are ONLY for NATIONAL-LEVEL news (government policies, bilateral relations, strategic competition, etc.).
 
@@ -327,7 +171,10 @@ Classification rules:
   - If about broader tech competition → "Tech & National Security" (broader)
 - Always choose the category that is MOST SPECIFIC and BEST describes the PRIMARY focus of the article
 
-Examples (from your labeled data - 75 real examples covering all 22 categories):
+"""
+
+# 固定示例（few-shot 检索关闭或没有可用示例时使用）
+_STATIC_EXAMPLES = """Examples (from your labeled data - 75 real examples covering all 22 categories):
 - "Trump orders tariff pause after Xi makes rare call" → Administration
 - "US reaches interim trade agreement with China on tariffs" → Administration
 - "Trump signs executive order creating $500 billion AI infrastructure fund" → Administration
@@ -403,218 +250,373 @@ Examples (from your labeled data - 75 real examples covering all 22 categories):
 - "Japan-Australia defense pact sends message to China" → US Multilateralism
 - "U.S. and allies announce new sanctions on Chinese firms" → US Multilateralism
 - "Blinken rallies partners in Pacific against China" → US Multilateralism
+"""
 
-Article to classify:
-{text}
-
-**Before classifying, ask yourself:**
+_CLASSIFICATION_CHECKLIST = """**Before classifying, ask yourself:**
 1. Is this primarily about a COMPANY (Tencent, Alibaba, Huawei, ByteDance, etc.) without national policy implications? → "Uncategorized"
 2. Does this involve NATIONAL-LEVEL policies, relations, or strategic competition? → Classify into appropriate category
 3. Is this a company product launch, financial report, or internal company news? → "Uncategorized"
+"""
+
+
+def category_codes(categories: list[str]) -> dict[str, str]:
+    """
+    类别 → 短代码（A..Z，超过 26 个用 AA, AB ...），Uncategorized 总是在最后
+    模型只输出代码：输出 token 少，也不会出现大小写 / 引号 / 句号之类的变体
+    """
+    names = [cat for cat in categories if cat != "Uncategorized"] + ["Uncategorized"]
+    letters = list(ascii_uppercase) + ["".join(p) for p in product(ascii_uppercase, repeat=2)]
+    return dict(zip(names, letters))
+
+
+def _parse_label(raw: str, categories: list[str], codes: dict[str, str] | None = None) -> Optional[str]:
+    """
+    模型输出 → 类别名；无法识别时返回 None
+    容忍引号、句号、方括号、大小写差异，以及 "[C] Chips" / "C: Chips" / "Category: Chips" 之类的写法。
+    代码只在单独出现（可带括号 / 标点），或后面紧跟它对应的类别名时才算数：
+    "I think ..." / "A Taiwan story" 不会被读成代码 I / A
+    """
+    if not raw:
+        return None
+    valid = {cat.lower(): cat for cat in list(categories) + ["Uncategorized"]}
+    value = raw.strip().strip("\"'`*").strip()
+    value = re.sub(r"^(category|code)\s*[:：]\s*", "", value, flags=re.I)
+    name = value.strip(" \"'`.;,[]").lower()
+    if name in valid:
+        return valid[name]
+    if codes:
+        by_code = {code: cat for cat, code in codes.items()}
+        m = re.match(r"^\[?([A-Za-z]{1,2})\]?\s*[:.)\-]?\s*(.*)$", value, flags=re.S)
+        if m and m.group(1).upper() in by_code:
+            category = by_code[m.group(1).upper()]
+            rest = m.group(2).strip(" \"'`.;,[]").lower()
+            if not rest or rest == category.lower():
+                return category
+    return None
+
+
+def _categories_explanation(categories: list[str], codes: dict[str, str] | None = None) -> str:
+    if codes:
+        names = list(codes)
+        return "\n".join(f"- [{codes[cat]}] {cat}: {CATEGORY_DESCRIPTIONS.get(cat, cat)}" for cat in names)
+    return "\n".join(f"- {cat}: {CATEGORY_DESCRIPTIONS.get(cat, cat)}" for cat in categories)
+
+
+def _examples_block(examples: list[tuple[str, str]] | None) -> str:
+    """few-shot 示例段；examples 为 None 时使用固定的 75 条示例"""
+    if examples is None:
+        return _STATIC_EXAMPLES
+    lines = "\n".join(f'- "{text}" → {category}' for text, category in examples)
+    return f"Examples (the most similar labeled articles):\n{lines}\n"
+
+
+def _select_examples(texts: list[str], categories: list[str]) -> list[tuple[str, str]] | None:
+    """按文章检索最相近的标注示例；few-shot 关闭（API_FEWSHOT_K=0）或没有示例时返回 None"""
+    k = get_gateway().config.fewshot_k
+    if k <= 0:
+        return None
+    try:
+        from fewshot_selector import get_selector
+        selector = get_selector()
+        allowed = set(categories) | {"Uncategorized"}
+        if len(texts) == 1:
+            examples = selector.nearest(texts[0], k, allowed)
+        else:
+            examples = selector.examples_for_batch(texts, k, allowed)
+    except Exception as e:
+        print(f"⚠️ Few-shot example selection failed, using static examples: {e}")
+        return None
+    return examples or None
+
+
+def _build_classification_prompt(text: str, categories: list[str],
+                                 examples: list[tuple[str, str]] | None = None,
+                                 codes: dict[str, str] | None = None) -> str:
+    """单篇分类提示词；codes 不为空时要求模型只返回类别代码"""
+    if codes:
+        answer = (f"Return ONLY the code of the category (the letters in brackets), nothing else. "
+                  f"If unsure or if it's company-level news, return {codes['Uncategorized']} (Uncategorized).")
+    else:
+        answer = "Return ONLY the category name, nothing else. If unsure or if it's company-level news, return \"Uncategorized\"."
+    return f"""You are a professional news classification assistant specializing in US-China relations.
+
+Available categories with descriptions:
+{_categories_explanation(categories, codes)}
 
-Return ONLY the category name, nothing else. If unsure or if it's company-level news, return "Uncategorized".
+{_CLASSIFICATION_GUIDE}{_examples_block(examples)}
+Article to classify:
+{text}
+
+{_CLASSIFICATION_CHECKLIST}
+{answer}
+"""
+
+
+def _build_batch_prompt(texts: list[str], categories: list[str],
+                        examples: list[tuple[str, str]] | None = None,
+                        codes: dict[str, str] | None = None) -> str:
+    """批量分类提示词：文章按 1..N 编号，要求返回 {编号: 类别（或类别代码）} 的 JSON"""
+    articles = "\n\n".join(f"[{i}]\n{text}" for i, text in enumerate(texts, 1))
+    if codes:
+        first = codes.get("Taiwan") or next(iter(codes.values()))
+        answer = (f"Classify EACH article independently. Return ONLY a JSON object that maps every article id to the code "
+                  f"(the letters in brackets) of exactly one category from the list above, e.g. "
+                  f"{{\"1\": \"{first}\", \"2\": \"{codes['Uncategorized']}\"}}. "
+                  f"If unsure or if it's company-level news, use {codes['Uncategorized']} (Uncategorized).")
+    else:
+        answer = ("Classify EACH article independently. Return ONLY a JSON object that maps every article id to exactly "
+                  "one category name from the list above, e.g. {\"1\": \"Taiwan\", \"2\": \"Uncategorized\"}. "
+                  "If unsure or if it's company-level news, use \"Uncategorized\".")
+    return f"""You are a professional news classification assistant specializing in US-China relations.
+
+Available categories with descriptions:
+{_categories_explanation(categories, codes)}
+
+{_CLASSIFICATION_GUIDE}{_examples_block(examples)}
+Articles to classify (each starts with its id in brackets):
+{articles}
+
+{_CLASSIFICATION_CHECKLIST}
+{answer}
 """
-        
-        # 从环境变量或 Streamlit secrets 获取模型
-        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        try:
-            import streamlit as st
-            if hasattr(st, "secrets") and "api" in st.secrets:
-                model = st.secrets.get("api", {}).get("openai_model", model)
-        except:
-            pass
-        
-        # Make actual API call
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "你是一个专业的新闻分类助手。"},
-                {"role": "user", "content": prompt}
-            ],
+
+
+def _parse_batch_labels(raw: str) -> dict[str, str]:
+    """解析批量分类返回的 JSON；兼容 ```json 代码块和 {"results": [{"id", "category"}]} 格式"""
+    if not raw:
+        return {}
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        data = {str(r.get("id")): r.get("category") for r in data["results"] if isinstance(r, dict)}
+    if not isinstance(data, dict):
+        return {}
+    return {str(k).strip("[] "): str(v).strip() for k, v in data.items() if isinstance(v, str)}
+
+
+def _record_call(count: int = 1) -> None:
+    """
+    记录没有经过 LLM 网关的调用（按 cost_per_call 估算费用）；
+    经过 get_gateway().chat() 的请求已按实际 token 自动入账，不要重复调用
+    """
+    _, cost_per_call = _get_budget_config()
+    get_ledger().record("unmetered", calls=count, items=count, fallback_cost_per_call=cost_per_call)
+
+
+def classify_with_api(headline: str, nut_graph: str, 
+                      categories: list[str],
+                      provider: str = None, url: str = "") -> Optional[str]:
+    """
+    使用 API 进行文章分类
+    
+    Args:
+        headline: 文章标题
+        nut_graph: 文章摘要
+        categories: 可用类别列表
+        provider: API 提供商 (openai, anthropic)，如果为 None 则使用配置
+        url: 文章 URL（用于分类缓存的键）
+    
+    Returns:
+        分类名称，如果无法分类则返回 None
+    """
+    # 已有人工反馈的 URL 直接用反馈中的类别，不调用 API
+    from fewshot_selector import feedback_category
+    reviewed = feedback_category(url, categories)
+    if reviewed:
+        return reviewed
+
+    gateway = get_gateway()
+    provider = provider or gateway.config.provider
+    if provider not in ("openai", "anthropic"):
+        print(f"⚠️ Unknown API provider: {provider}")
+        return None
+    
+    # 缓存命中直接返回（不调用 API，不占预算；没有 key 时也能用之前的结果）
+    from classification_cache import get_cache, make_key
+    model = gateway.config.model(provider)
+    cache_key = make_key(url, headline, nut_graph, provider, model, categories, PROMPT_VERSION)
+    cached = get_cache().get(cache_key)
+    if cached:
+        return cached
+    if not gateway.available:
+        return None
+    
+    text = f"{headline}\n\n{nut_graph}"
+    if provider == "openai":
+        result = _classify_openai(text, categories, _select_examples([text], categories))
+    else:
+        result = _classify_anthropic(text, categories)
+    if result:
+        get_cache().put(cache_key, result, provider=provider, model=model)
+    return result
+
+def _classify_openai(text: str, categories: list[str],
+                     examples: list[tuple[str, str]] | None = None) -> Optional[str]:
+    """使用 OpenAI API 分类"""
+    gateway = get_gateway()
+    if not gateway.has_key("openai") or not _budget_allows_call():
+        return None
+    codes = category_codes(categories) if gateway.config.constrained_output else None
+    try:
+        result = gateway.chat(
+            _build_classification_prompt(text, categories, examples, codes),
+            system="你是一个专业的新闻分类助手。",
+            provider="openai",
             temperature=0.3,
-            max_tokens=50
+            # 代码模式只需要 1 个 token，留一点余量给 "[C]" 之类的写法
+            max_tokens=4 if codes else 50,
+            purpose="classify",
         )
-        
-        result = response.choices[0].message.content.strip()
-        
-        # Record API call (for budget tracking)
-        # Note: In Streamlit Cloud, the file system is temporary, so budget tracking
-        # may reset on each deployment/restart. This is expected behavior.
-        try:
-            _record_call()
-        except Exception as e:
-            # Silently fail budget tracking if file system is not available
-            # (e.g., in Streamlit Cloud with temporary file system)
-            pass
-        
-        # Debug: Log successful API call
-        import sys
-        print(f"✅ API call successful: result='{result}'", file=sys.stderr, flush=True)
-        
-        # Add adaptive delay to avoid hitting TPM rate limits
-        # 200,000 TPM = ~3,333 tokens/second = ~6-7 requests/second
-        # For small batches (< 100), use shorter delay
-        # For large batches (>= 100), use longer delay to be safer
-        import time
-        # Default: 150ms for safety, but can be reduced for small batches
-        # This balances speed vs. rate limit risk
-        time.sleep(0.15)  # 150ms delay between requests
-        
-        # 验证结果是否在类别列表中
-        if result in categories:
-            return result
-        elif result == "Uncategorized":
-            return "Uncategorized"
-        else:
-            # Debug: Log invalid result with more details
-            import sys
-            print(f"⚠️ API returned invalid category: '{result}' (not in categories list)", file=sys.stderr, flush=True)
-            print(f"   Available categories: {categories[:5]}... (showing first 5)", file=sys.stderr, flush=True)
-            print(f"   Full result from API: '{result}' (type: {type(result).__name__}, length: {len(result) if result else 0})", file=sys.stderr, flush=True)
-            return None
-            
     except ImportError:
-        import sys
-        print("❌ OpenAI SDK not installed, run: pip install openai", file=sys.stderr, flush=True)
+        print("⚠️ OpenAI SDK 未安装，请运行: pip install openai")
         return None
     except Exception as e:
-        import sys
-        import traceback
-        error_msg = f"❌ OpenAI API call failed: {e}"
-        print(error_msg, file=sys.stderr, flush=True)
-        print(traceback.format_exc(), file=sys.stderr, flush=True)
+        print(f"⚠️ OpenAI API call failed: {e}")
         return None
+    
+    # 验证结果是否在类别列表中（容忍引号、句号、大小写等变体）
+    category = _parse_label(result, categories, codes)
+    if category:
+        return category
+    gateway.record_invalid("classify")
+    print(f"⚠️ API returned invalid category: '{result}' (not in categories list)")
+    return None
 
 def _classify_anthropic(text: str, categories: list[str]) -> Optional[str]:
     """使用 Anthropic API 分类"""
-    try:
-        from anthropic import Anthropic
-        
-        # 从环境变量或 Streamlit secrets 获取 API key
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            # 尝试从 Streamlit secrets 读取（如果是在 Streamlit 环境中）
-            try:
-                import streamlit as st
-                if hasattr(st, "secrets") and "api" in st.secrets:
-                    api_key = st.secrets.get("api", {}).get("anthropic_api_key")
-            except:
-                pass
-        
-        if not api_key:
-            return None
-        if not _budget_allows_call():
-            return None
-        
-        client = Anthropic(api_key=api_key)
-        
+    gateway = get_gateway()
+    if not gateway.has_key("anthropic") or not _budget_allows_call():
+        return None
+    
+    codes = category_codes(categories) if gateway.config.constrained_output else None
+    if codes:
+        categories_str = ", ".join(f"{code}={cat}" for cat, code in codes.items())
+        answer = f"请只返回类别代码（例如 {codes['Uncategorized']}），不要其他内容。如果无法分类，返回 {codes['Uncategorized']}。"
+    else:
         categories_str = ", ".join(categories)
-        prompt = f"""请将以下新闻文章分类到最合适的类别。可用类别：{categories_str}
+        answer = '请只返回类别名称，不要其他内容。如果无法分类，返回 "Uncategorized"。'
+    prompt = f"""请将以下新闻文章分类到最合适的类别。可用类别：{categories_str}
 
 文章内容：
 {text}
 
-请只返回类别名称，不要其他内容。如果无法分类，返回 "Uncategorized"。
+{answer}
 """
-        
-        # 从环境变量或 Streamlit secrets 获取模型
-        model = os.getenv("ANTHROPIC_MODEL", "claude-3-haiku-20240307")
-        try:
-            import streamlit as st
-            if hasattr(st, "secrets") and "api" in st.secrets:
-                model = st.secrets.get("api", {}).get("anthropic_model", model)
-        except:
-            pass
-        
-        response = client.messages.create(
-            model=model,
-            max_tokens=50,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        result = response.content[0].text.strip()
-        _record_call()
-        
-        if result in categories:
-            return result
-        elif result == "Uncategorized":
-            return "Uncategorized"
-        else:
-            return None
-            
+    try:
+        result = gateway.chat(prompt, provider="anthropic", max_tokens=4 if codes else 50, purpose="classify")
     except ImportError:
         print("⚠️ Anthropic SDK 未安装，请运行: pip install anthropic")
         return None
     except Exception as e:
         print(f"⚠️ Anthropic API 调用失败: {e}")
         return None
+    
+    category = _parse_label(result, categories, codes)
+    if category is None:
+        gateway.record_invalid("classify")
+    return category
 
-def is_api_available() -> bool:
-    """检查 API 分类是否可用"""
-    # 优先从 Streamlit secrets 读取（如果存在）
-    api_enabled = False
+
+def classify_batch_with_api(articles: list[tuple], categories: list[str],
+                            provider: str = None, batch_size: int = None,
+                            max_retries: int = 1) -> dict:
+    """
+    批量 API 分类：每个请求打包 batch_size 篇文章，返回按文章编号的 JSON
+
+    Args:
+        articles: [(key, headline, nut_graph), ...]，key 可以是行索引、URL 等任意可哈希值
+        categories: 可用类别列表
+        provider: API 提供商 (openai, anthropic)，如果为 None 则使用配置
+        batch_size: 每个请求的文章数，默认读取 API_BATCH_SIZE（25）
+        max_retries: 标签无效 / 缺失 / 请求失败的文章最多重试几轮（只重试失败的那部分）
+
+    Returns:
+        {key: 类别名称或 None}
+    """
+    results = {key: None for key, _, _ in articles}
+    gateway = get_gateway()
+    if not articles or not gateway.available:
+        return results
+
+    provider = provider or gateway.config.provider
+    if provider not in ("openai", "anthropic"):
+        print(f"⚠️ Unknown API provider: {provider}")
+        return results
+
+    valid = set(categories) | {"Uncategorized"}
+    size = batch_size or gateway.config.batch_size
+    pending = list(articles)
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        failed = []
+        for start in range(0, len(pending), size):
+            chunk = pending[start:start + size]
+            # 在途的并发批次各自预占费用，不会都通过同一次预算检查
+            with _budget_reservation(len(chunk)) as allowed:
+                if not allowed:
+                    return results
+                labels = _classify_batch([f"{headline}\n\n{nut_graph}" for _, headline, nut_graph in chunk],
+                                         categories, provider)
+            for i, item in enumerate(chunk, 1):
+                label = labels.get(str(i)) if labels else None
+                if label in valid:
+                    results[item[0]] = label
+                else:
+                    failed.append(item)
+        if failed and attempt < max_retries:
+            print(f"🔁 Retrying {len(failed)} article(s) with missing/invalid labels")
+        pending = failed
+        # 重试时缩小批次，减少模型漏项
+        size = max(1, size // 2)
+
+    return results
+
+
+def _classify_batch(texts: list[str], categories: list[str], provider: str) -> Optional[dict]:
+    """一次批量请求；返回 {"1": 类别, ...}（只含有效类别），请求失败返回 None"""
+    gateway = get_gateway()
+    codes = category_codes(categories) if gateway.config.constrained_output else None
     try:
-        import streamlit as st
-        if hasattr(st, "secrets") and "api" in st.secrets:
-            api_config = st.secrets.get("api", {})
-            # 支持字符串 "true"/"false" 或布尔值 true/false
-            classifier_enabled = api_config.get("classifier_enabled", False)
-            if isinstance(classifier_enabled, str):
-                api_enabled = classifier_enabled.lower() == "true"
-            else:
-                api_enabled = bool(classifier_enabled)
-            
-            # Debug: 打印配置状态（输出到 stderr，可在 Streamlit Cloud 日志中查看）
-            import sys
-            print(f"🔍 is_api_available: classifier_enabled = {classifier_enabled} (type: {type(classifier_enabled).__name__}), api_enabled = {api_enabled}", file=sys.stderr, flush=True)
+        raw = gateway.chat(
+            _build_batch_prompt(texts, categories, _select_examples(texts, categories), codes),
+            system="你是一个专业的新闻分类助手。" if provider == "openai" else None,
+            provider=provider,
+            temperature=0.3 if provider == "openai" else None,
+            # 每篇约 7 个 token（"12": "K", ），类别名约 10 个（"12": "Tech & National Security",）
+            max_tokens=(8 if codes else 16) * len(texts) + 20,
+            json_mode=True,
+            purpose="classify_batch",
+            items=len(texts),
+        )
+    except ImportError:
+        print(f"⚠️ {provider} SDK 未安装，请运行: pip install {provider}")
+        return None
     except Exception as e:
-        import sys
-        print(f"🔍 is_api_available: Error reading Streamlit secrets: {e}", file=sys.stderr, flush=True)
-        pass
-    
-    # 如果 Streamlit secrets 中没有，则从环境变量读取
-    if not api_enabled:
-        api_enabled = os.getenv("API_CLASSIFIER_ENABLED", "false").lower() == "true"
-    
-    if not api_enabled:
-        import sys
-        print(f"🔍 is_api_available: API not enabled (classifier_enabled = False)", file=sys.stderr, flush=True)
-        return False
-    
-    # 检查 API key 是否存在
-    provider = os.getenv("API_PROVIDER", "openai")
-    try:
-        import streamlit as st
-        if hasattr(st, "secrets") and "api" in st.secrets:
-            provider = st.secrets.get("api", {}).get("provider", provider)
-    except:
-        pass
-    
-    if provider == "openai":
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            try:
-                import streamlit as st
-                if hasattr(st, "secrets") and "api" in st.secrets:
-                    api_key = st.secrets.get("api", {}).get("openai_api_key")
-            except:
-                pass
-        result = bool(api_key)
-        import sys
-        print(f"🔍 is_api_available: OpenAI API key exists = {result}, length = {len(api_key) if api_key else 0}", file=sys.stderr, flush=True)
-        return result
-    elif provider == "anthropic":
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            try:
-                import streamlit as st
-                if hasattr(st, "secrets") and "api" in st.secrets:
-                    api_key = st.secrets.get("api", {}).get("anthropic_api_key")
-            except:
-                pass
-        return bool(api_key)
-    
-    return False
+        print(f"⚠️ {provider} batch API call failed: {e}")
+        return None
+    return decode_batch_labels(raw, len(texts), categories, codes, gateway)
+
+
+def decode_batch_labels(raw: str, n: int, categories: list[str], codes: dict[str, str] | None,
+                        gateway=None) -> dict[str, str]:
+    """批量输出 → {"1": 类别名, ...}；缺失或无法识别的编号计入网关的 invalid 计数"""
+    labels = {}
+    for i, value in _parse_batch_labels(raw).items():
+        category = _parse_label(value, categories, codes)
+        if category:
+            labels[i] = category
+    missing = sum(1 for i in range(1, n + 1) if str(i) not in labels)
+    if missing and gateway is not None:
+        gateway.record_invalid("classify_batch", missing)
+    return labels
 
+
+def is_api_available() -> bool:
+    """检查 API 分类是否可用（已启用且当前 provider 有 API key）"""
+    return get_gateway().available
@@ -4,7 +4,6 @@ from zoneinfo import ZoneInfo
 import pandas as pd
 import yaml, io
 import sys
-from utils import compile_or_regex
 from openpyxl.utils import get_column_letter
 import os
 
@@ -268,13 +267,41 @@ def render_results(df: pd.DataFrame, start_date, end_date):
     try:
         from news_trending import group_similar_news, generate_trending_rank
 
+        # "entity" = 跨类别按关键实体 + 日期窗口分块（同一事件被分到不同类别时也能成组）
+        trending_blocking = os.getenv("TRENDING_BLOCKING", "category")
+        # "tfidf" = 批量相似度引擎（快，但 0.55 / 0.40 阈值尚未在真实文章上重新标定）
+        trending_scorer = os.getenv("TRENDING_SCORER", "sequence")
+        # >1 = 各类别的候选生成和打分并行（0 = CPU 核数）
+        try:
+            trending_workers = int(os.getenv("TRENDING_WORKERS", "1"))
+        except ValueError:
+            trending_workers = 1
         with st.spinner("Analyzing news trends..."):
-            df_with_groups = group_similar_news(
-                df.copy(),
-                similarity_threshold=0.55,  # Slightly higher threshold for better grouping (was 0.5)
-                use_api=use_api_classification
-            )
-        trending_df = generate_trending_rank(df_with_groups, top_n=3, min_sources=2)  # Keep at 2 sources for now
+            try:
+                # 持久化的聚类：只处理上次运行之后的新文章，热点榜是对已存簇的查询
+                from trending_store import get_trending_store
+                store = get_trending_store()
+                store_stats = store.update(
+                    df,
+                    similarity_threshold=0.55,  # Slightly higher threshold for better grouping (was 0.5)
+                    use_api=use_api_classification,
+                    blocking=trending_blocking,
+                    workers=trending_workers,
+                    scorer=trending_scorer
+                )
+                print(f"🔥 Trending store: {store_stats}")
+                trending_df = store.trending_rank(urls=df["URL"], top_n=3, min_sources=2)  # Keep at 2 sources for now
+            except Exception as e:
+                print(f"⚠️ Trending store unavailable, regrouping from scratch: {e}")
+                df_with_groups = group_similar_news(
+                    df.copy(),
+                    similarity_threshold=0.55,
+                    use_api=use_api_classification,
+                    blocking=trending_blocking,
+                    workers=trending_workers,
+                    scorer=trending_scorer
+                )
+                trending_df = generate_trending_rank(df_with_groups, top_n=3, min_sources=2)
 
         if not trending_df.empty:
             categories = sorted(trending_df["Category"].unique())
@@ -395,12 +422,25 @@ with col2:
     )
 selected_sources = st.multiselect("Sources (whitelist)", options=all_sources, default=all_sources)
 
-# API Classification toggle
-use_api_classification = st.checkbox(
-    "🤖 Use API Classification (OpenAI)", 
-    value=False,
-    help="Use AI to classify articles into categories. Disable if you hit rate limits or want faster processing."
-)
+# Classification backend
+CLASSIFICATION_BACKENDS = {
+    "🔤 Keywords": "keywords",
+    "🧠 Local model": "local",
+    "🤖 API (OpenAI)": "api",
+    "🪜 Cascade": "cascade",
+}
+classification_backend = CLASSIFICATION_BACKENDS[st.radio(
+    "Classification method",
+    options=list(CLASSIFICATION_BACKENDS),
+    index=0,
+    horizontal=True,
+    help="Keywords: regex rules. Local model: TF-IDF classifier trained from feedback and training examples "
+         "(no network, no API budget; retrain with `python local_classifier.py train`). "
+         "API: LLM classification — most accurate, uses API budget. "
+         "Cascade: keywords and the local model handle confident cases, only uncertain or conflicting "
+         "articles go to the API (thresholds in config_en.yaml → classification_cascade)."
+)]
+use_api_classification = classification_backend in ("api", "cascade")
 
 # Show budget status and cost estimate if API classification is enabled
 if use_api_classification:
@@ -782,11 +822,25 @@ elif run:
                 st.warning("No articles found")
 
         if not df.empty:
-            # Show cost estimate before classification if using API
-            if use_api_classification:
+            # 转载/通稿检测：同一篇通稿只分类一次，结果复制给其他转载
+            df = df.reset_index(drop=True)
+            dup_cfg = CFG.get("near_duplicates", {}) or {}
+            classify_reps_only = False
+            if dup_cfg.get("enabled", True):
+                from near_duplicates import tag_near_duplicates
+                df = tag_near_duplicates(df, max_distance=dup_cfg.get("max_hamming", 5))
+                classify_reps_only = bool(dup_cfg.get("classify_representatives_only", True))
+                dup_copies = int((~df["DupRepresentative"]).sum())
+                if dup_copies > 0:
+                    st.info(f"🔁 Detected {dup_copies} syndicated copies in {df.loc[~df['DupRepresentative'], 'DupCluster'].nunique()} clusters"
+                            + (" (only one article per cluster will be classified)" if classify_reps_only else ""))
+            df_to_classify = df[df["DupRepresentative"]] if classify_reps_only else df
+
+            # Show cost estimate before classification if using API（级联模式只有部分文章走 API，不做预估）
+            if classification_backend == "api":
                 try:
                     from api_classifier import estimate_cost, get_budget_status
-                    cost_estimate = estimate_cost(len(df))
+                    cost_estimate = estimate_cost(len(df_to_classify))
                     budget_status = get_budget_status()
                     
                     if budget_status["has_budget"]:
@@ -796,163 +850,83 @@ elif run:
                         else:
                             # Calculate weekly estimates
                             weekly_budget = budget_status['daily_budget'] * 7
-                            cost_per_article = cost_estimate['estimated_cost'] / len(df) if len(df) > 0 else 0
+                            cost_per_article = cost_estimate['estimated_cost'] / len(df_to_classify) if len(df_to_classify) > 0 else 0
                             
                             st.info(f"💰 **Estimated API Cost**\n"
-                                   f"- This batch: ${cost_estimate['estimated_cost']:.3f} for {len(df)} articles (${cost_per_article:.4f} per article)\n"
+                                   f"- This batch: ${cost_estimate['estimated_cost']:.3f} for {len(df_to_classify)} articles (${cost_per_article:.4f} per article)\n"
                                    f"- Remaining today: ${cost_estimate['remaining_budget']:.3f} / ${budget_status['daily_budget']:.3f}\n"
                                    f"- Weekly budget: ${weekly_budget:.3f} (${budget_status['daily_budget']:.3f}/day × 7)")
                     else:
-                        st.warning(f"⚠️ Estimated API cost: ${cost_estimate['estimated_cost']:.3f} for {len(df)} articles (no budget limit set)")
+                        st.warning(f"⚠️ Estimated API cost: ${cost_estimate['estimated_cost']:.3f} for {len(df_to_classify)} articles (no budget limit set)")
                 except:
                     pass
             
             # 分类步骤：显示进度（无论是否使用 API）
-            if use_api_classification:
-                status_text.text("🏷️ Classifying articles with API...")
-            else:
-                status_text.text("🏷️ Classifying articles with keywords...")
+            backend_label = {"api": "API", "local": "local model", "keywords": "keywords",
+                             "cascade": "cascade"}[classification_backend]
+            status_text.text(f"🏷️ Classifying articles with {backend_label}...")
             progress_bar.progress(80)
             
-            # Assign single category per article (first matched)
-            compiled = []
-            for cat, patt in CATEGORIES.items():
+            # 分类：API 批量请求 + 并发（classify_many），API 不可用或未给出有效类别的文章回退到关键词
+            api_stats = {"api": 0, "cache_hits": 0, "feedback": 0, "local": 0, "keywords": 0, "fallback": 0, "batches": 0,
+                         "output_tokens": 0, "invalid": 0}
+            if use_api_classification:
+                # 记录 API 调用时间（用于检测重复执行）
+                if st.session_state.last_api_call_time is None:
+                    st.session_state.last_api_call_time = datetime.now()
                 try:
-                    compiled.append((cat, compile_or_regex([patt])))
-                except Exception:
-                    continue
+                    from api_classifier import is_api_available
+                    if not is_api_available():
+                        st.error("❌ API classification is enabled but API is not available. Please check the API configuration debug info above.")
+                        st.warning("⚠️ API classifier not available, using keyword classification (70-80% accuracy)")
+                except ImportError:
+                    pass  # API classifier not installed, use regex
 
-            # Track API calls for debugging (use list to allow modification in nested function)
-            api_stats = {"calls_made": 0, "calls_successful": 0}
-
-            def assign_category(row):
-                # Try using API classification (if enabled)
-                if use_api_classification:
-                    # Debug: Log that API classification is enabled
-                    import sys
-                    print(f"🔍 assign_category() called with use_api_classification=True", file=sys.stderr, flush=True)
-                    
-                    # 记录 API 调用时间（用于检测重复执行）
-                    if st.session_state.last_api_call_time is None:
-                        st.session_state.last_api_call_time = datetime.now()
-                    try:
-                        from api_classifier import classify_with_api, is_api_available
-                        import time
-                        
-                        api_available_check = is_api_available()
-                        print(f"🔍 is_api_available() check in assign_category: {api_available_check}", file=sys.stderr, flush=True)
-                        
-                        # 如果 API 不可用，显示详细错误信息（仅第一次）
-                        if not api_available_check:
-                            if not hasattr(assign_category, '_api_unavailable_warned'):
-                                st.error("❌ API classification is enabled but API is not available. Please check the API configuration debug info above.")
-                                assign_category._api_unavailable_warned = True
-                                # 打印详细的调试信息到 stderr
-                                try:
-                                    # 注意：不要在这里重新导入 st，使用文件顶部已导入的 st
-                                    if hasattr(st, "secrets") and "api" in st.secrets:
-                                        api_config = st.secrets.get("api", {})
-                                        classifier_enabled = api_config.get("classifier_enabled", None)
-                                        openai_api_key = api_config.get("openai_api_key", None)
-                                        print(f"🔍 Debug: classifier_enabled = {classifier_enabled} (type: {type(classifier_enabled)})", file=sys.stderr, flush=True)
-                                        print(f"🔍 Debug: openai_api_key exists = {bool(openai_api_key)}, length = {len(openai_api_key) if openai_api_key else 0}", file=sys.stderr, flush=True)
-                                    else:
-                                        print(f"🔍 Debug: No [api] section in Streamlit secrets", file=sys.stderr, flush=True)
-                                except Exception as e:
-                                    print(f"🔍 Debug: Error checking secrets: {e}", file=sys.stderr, flush=True)
-                        
-                        if api_available_check:
-                            category_list = [cat for cat, _ in compiled] + ["Uncategorized"]
-                            
-                            # Add retry logic for rate limits
-                            max_retries = 3
-                            for attempt in range(max_retries):
-                                try:
-                                    api_stats["calls_made"] += 1
-                                    api_cat = classify_with_api(
-                                        row.get('Headline', ''),
-                                        row.get('Nut Graph', ''),
-                                        category_list
-                                    )
-                                    if api_cat:
-                                        api_stats["calls_successful"] += 1
-                                        # Debug: 显示使用了 API 分类
-                                        if not hasattr(assign_category, '_api_used'):
-                                            st.info("✅ Using API classification (95-98% accuracy)")
-                                            assign_category._api_used = True
-                                        return api_cat
-                                    else:
-                                        # API returned None - log this for debugging
-                                        if not hasattr(assign_category, '_api_returned_none_warned'):
-                                            st.warning("⚠️ API classification returned None. Possible reasons: API key issue, budget limit, invalid response, or API error. Check Streamlit Cloud logs (Settings → Logs → stderr) for details. Falling back to keyword classification.")
-                                            assign_category._api_returned_none_warned = True
-                                            # 打印更详细的调试信息
-                                            print(f"🔍 API returned None for article: '{row.get('Headline', '')[:50]}...'", file=sys.stderr, flush=True)
-                                            print(f"   Check logs above for specific error (API key, budget, invalid category, etc.)", file=sys.stderr, flush=True)
-                                    break  # Exit retry loop (even if api_cat is None)
-                                except Exception as e:
-                                    if "rate_limit" in str(e).lower() and attempt < max_retries - 1:
-                                        # Wait and retry for rate limit errors
-                                        # Exponential backoff: 2s, 4s, 8s
-                                        wait_time = 2 ** attempt
-                                        time.sleep(wait_time)
-                                        continue
-                                    else:
-                                        raise  # Re-raise other errors or final attempt
-                        else:
-                            # Debug: 显示 API 不可用
-                            if not hasattr(assign_category, '_fallback_warned'):
-                                st.warning("⚠️ API classifier not available, using keyword classification (70-80% accuracy)")
-                                assign_category._fallback_warned = True
-                    except ImportError:
-                        pass  # API classifier not installed, use regex
-                    except Exception as e:
-                        if not hasattr(assign_category, '_error_shown'):
-                            if "rate_limit" in str(e).lower():
-                                st.error(f"⚠️ API Rate Limit reached. Falling back to keyword classification. Try again in a minute or disable API classification.")
-                            else:
-                                st.error(f"⚠️ API classification error: {e}")
-                            assign_category._error_shown = True
-                        # Fall through to regex classification
-                
-                # Use regex classification (default or fallback)
-                text = f"{row.get('Headline','')} || {row.get('Nut Graph','')}"
-                for cat, rgx in compiled:
-                    if rgx.search(text):
-                        return cat
-                return "Uncategorized"
+            def on_classify_progress(done, total):
+                span = 15 if use_api_classification else 20
+                progress_bar.progress(min(80 + int(done / max(total, 1) * span), 100))
+                status_text.text(f"🏷️ Classifying with {backend_label}... {done}/{total} articles")
 
             df = df.copy()
+            from classification import classify_many, path_summary
+            categories = classify_many(df_to_classify, CATEGORIES, backend=classification_backend,
+                                       on_progress=on_classify_progress, stats=api_stats,
+                                       cascade=CFG.get("classification_cascade") or {}).to_dict()
+            if classification_backend == "cascade":
+                st.info(f"🪜 Classification paths: {path_summary(api_stats)}")
+            if classification_backend == "local":
+                if api_stats["local"] > 0:
+                    st.info(f"🧠 Classified {api_stats['local']} articles with the local model"
+                            + (f", {api_stats['fallback']} low-confidence articles with keywords" if api_stats["fallback"] else ""))
+                else:
+                    st.warning("⚠️ Local model not available (no training data?), using keyword classification")
+            if use_api_classification and (api_stats["batches"] > 0 or api_stats["cache_hits"] > 0):
+                if api_stats["api"] > 0:
+                    st.info("✅ Using API classification (95-98% accuracy)")
+                if api_stats["fallback"] > 0:
+                    st.warning(f"⚠️ API classification returned no valid category for {api_stats['fallback']} article(s). "
+                               "Possible reasons: budget limit, rate limit, invalid response, or API error. "
+                               "Check Streamlit Cloud logs (Settings → Logs) for details. Falling back to keyword classification.")
             
-            # Apply classification with progress tracking（无论是否使用 API 都显示进度）
-            total = len(df)
-            categories = []
-            for idx, row in df.iterrows():
-                cat = assign_category(row)
-                categories.append(cat)
-                # Update progress every 10%（或不使用 API 时每 20%）
-                update_interval = max(1, total // 10) if use_api_classification else max(1, total // 5)
-                if idx % update_interval == 0:
-                    if use_api_classification:
-                        progress = 80 + int((idx / total) * 15)
-                    else:
-                        progress = 80 + int((idx / total) * 20)
-                    progress_bar.progress(min(progress, 100))
-                    if use_api_classification:
-                        status_text.text(f"🏷️ Classifying with API... {idx+1}/{total} articles")
-                    else:
-                        status_text.text(f"🏷️ Classifying with keywords... {idx+1}/{total} articles")
-            
-            df["Category"] = categories
+            if classify_reps_only:
+                from near_duplicates import propagate_from_representatives
+                df = propagate_from_representatives(df, categories, "Category")
+            else:
+                df["Category"] = pd.Series(categories)
+            from near_duplicates import drop_dup_columns
+            df = drop_dup_columns(df)
             progress_bar.progress(100)
             status_text.text("✅ Complete!")
             
             # Show API usage summary if API classification was used
-            if use_api_classification and api_stats["calls_made"] > 0:
+            if use_api_classification and (api_stats["batches"] > 0 or api_stats["cache_hits"] > 0):
                 try:
                     from api_classifier import get_budget_status
                     budget_status = get_budget_status()
-                    st.info(f"📊 API Usage: {api_stats['calls_made']} calls attempted, {api_stats['calls_successful']} successful. "
+                    st.info(f"📊 API Usage: {api_stats['batches']} batched requests, {api_stats['api']} articles classified by API "
+                           f"({api_stats['cache_hits']} from cache), {api_stats['local']} by local model, "
+                           f"{api_stats['keywords']} by keywords. "
+                           f"Output: {api_stats['output_tokens']} tokens, {api_stats['invalid']} invalid label(s) retried. "
                            f"Budget: ${budget_status['cost_today']:.3f} used today "
                            f"(${budget_status['remaining']:.3f} remaining)")
                     
@@ -0,0 +1,164 @@
+"""
+文章派生特征（侧表）
+同一篇文章的派生文本特征在流水线各阶段反复计算：热点榜对每个文章对重新清洗标题，
+转载检测、分类、Sheets 合并又各自拼接 / 小写化一遍。这里每篇文章只算一次：
+
+- url_key：去空格、小写的 URL（Sheets 合并去重用）；url_hash：utils.url_id
+- headline_norm / text_norm：normalize_text 后的标题、标题 + 导语
+- keyword_text：关键词规则匹配用的 "标题 || 导语"
+- tokens：去停用词的词集合（MinHash）；signature：MinHash 签名
+- simhash：字符 5-gram SimHash 指纹（转载检测）
+- entity_keys：标题 / 导语里的专有名词（连续的首字母大写词，小写化）
+
+特征按 (URL, 标题/导语哈希) 缓存在进程内（文章改写后自动重算），不写进 DataFrame，
+因此不会出现在导出的 Excel / Sheets 里。属性在第一次读取时计算，之后复用。
+
+用法：
+    feats = features_for(df)          # 与 df 行顺序对齐的 [ArticleFeatures, ...]
+    feats[0].text_norm, feats[0].signature
+"""
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from classification_cache import content_hash
+from near_duplicates import normalize_text, simhash_tokens
+from utils import url_id
+
+MAX_CACHED = 50000
+
+_ENTITY_RE = re.compile(r"\b[A-Z][\w'’-]*(?:\s+[A-Z][\w'’-]*)*")
+# 句首等位置常见的首字母大写词，不算专有名词
+_NOT_ENTITIES = frozenset(
+    "a an the in on at for of to and or but as by with from after before over is are was were "
+    "this that these those it its his her their new why how what who when says said".split()
+)
+
+
+def url_key(url) -> str:
+    """去重用的 URL 键：去空格、小写；空值为 ""（与 Sheets 合并原来的 strip().lower() 一致）"""
+    if url is None or (isinstance(url, float) and np.isnan(url)):
+        return ""
+    key = str(url).strip().lower()
+    return "" if key == "nan" else key
+
+
+def entity_keys(text: str) -> frozenset[str]:
+    keys = set()
+    for match in _ENTITY_RE.finditer(text or ""):
+        words = [w for w in match.group(0).split() if w.lower() not in _NOT_ENTITIES]
+        if words:
+            keys.add(" ".join(words).lower())
+    return frozenset(keys)
+
+
+class ArticleFeatures:
+    def __init__(self, url: str, headline: str, nut_graph: str):
+        self.url = url
+        self.headline = headline
+        self.nut_graph = nut_graph
+
+    @cached_property
+    def url_key(self) -> str:
+        return url_key(self.url)
+
+    @cached_property
+    def url_hash(self) -> str:
+        return url_id(self.url)
+
+    @cached_property
+    def headline_norm(self) -> str:
+        return normalize_text(self.headline)
+
+    @cached_property
+    def text_norm(self) -> str:
+        nut = normalize_text(self.nut_graph)
+        return f"{self.headline_norm} {nut}" if nut else self.headline_norm
+
+    @cached_property
+    def keyword_text(self) -> str:
+        return f"{self.headline} || {self.nut_graph}"
+
+    @cached_property
+    def tokens(self) -> frozenset[str]:
+        from minhash_lsh import token_set
+        return frozenset(token_set(self.text_norm))
+
+    @cached_property
+    def signature(self) -> np.ndarray:
+        from minhash_lsh import minhash_signatures
+        return minhash_signatures([self.tokens])[0]
+
+    @cached_property
+    def simhash(self) -> int | None:
+        return simhash_tokens(self.text_norm.split())
+
+    @cached_property
+    def entity_keys(self) -> frozenset[str]:
+        return entity_keys(f"{self.headline} {self.nut_graph}")
+
+
+class FeatureStore:
+    """进程内 LRU 侧表：(URL, 内容哈希) → ArticleFeatures"""
+
+    def __init__(self, max_items: int = MAX_CACHED):
+        self.max_items = max_items
+        self._items: OrderedDict[tuple[str, str], ArticleFeatures] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "computed": 0}
+
+    def get(self, url: str, headline: str, nut_graph: str) -> ArticleFeatures:
+        key = (url, content_hash(headline, nut_graph))
+        with self._lock:
+            feats = self._items.get(key)
+            if feats is not None:
+                self._items.move_to_end(key)
+                self.stats["hits"] += 1
+                return feats
+            feats = self._items[key] = ArticleFeatures(url, headline, nut_graph)
+            self.stats["computed"] += 1
+            if len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+            return feats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+def _column(df: pd.DataFrame, name: str) -> list[str]:
+    return df[name].fillna("").astype(str).tolist() if name in df.columns else [""] * len(df)
+
+
+def features_for(df: pd.DataFrame, store: FeatureStore | None = None) -> list[ArticleFeatures]:
+    """df 每行的特征（URL / Headline / Nut Graph 列），与行顺序对齐"""
+    store = store or get_feature_store()
+    return [store.get(u, h, n) for u, h, n in zip(_column(df, "URL"), _column(df, "Headline"),
+                                                    _column(df, "Nut Graph"))]
+
+
+def _text(value) -> str:
+    return "" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+
+
+def features_for_records(records: list[dict], store: FeatureStore | None = None) -> list[ArticleFeatures]:
+    """同 features_for，输入是 df.to_dict("records")"""
+    store = store or get_feature_store()
+    return [store.get(_text(r.get("URL")), _text(r.get("Headline")), _text(r.get("Nut Graph"))) for r in records]
+
+
+_default_store: FeatureStore | None = None
+
+
+def get_feature_store() -> FeatureStore:
+    """进程内共用一个侧表"""
+    global _default_store
+    if _default_store is None:
+        _default_store = FeatureStore()
+    return _default_store
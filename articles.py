@@ -0,0 +1,144 @@
+"""
+文章记录类型
+采集阶段统一使用紧凑的 Article 记录（__slots__），而不是每行一个 10 个键的 dict；
+同一次采集共用一个抓取时间，最后一次性按列构造导出用的 DataFrame。
+"""
+from __future__ import annotations
+
+import heapq
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+import pandas as pd
+
+from utils import url_id, normalize_source_short
+
+EXPORT_COLUMNS = ["Nested?", "URL", "Date", "Outlet", "Headline", "Nut Graph"]
+
+
+@dataclass(slots=True)
+class Article:
+    source: str
+    title: str
+    summary: str
+    url: str
+    published_dt: datetime | None
+    raw_source: str
+    keep_filter: bool = False
+    keep_limit: bool = False
+    id: str = ""
+
+    def __post_init__(self):
+        # source / raw_source 只有几十种取值，驻留后所有文章共享同一个字符串对象
+        self.source = sys.intern(self.source or "")
+        self.raw_source = sys.intern(self.raw_source or "")
+        self.title = self.title or ""
+        self.summary = self.summary or ""
+        self.url = self.url or ""
+        if not self.id:
+            self.id = url_id(self.url)
+
+
+class ArticleBatch:
+    """
+    一次采集的文章集合
+
+    fetched_dt 整批只有一个（原来每行调用一次 datetime.now()），
+    Outlet 简写按 raw_source 缓存，导出时按列一次性构造 DataFrame。
+    """
+    __slots__ = ("fetched_dt", "items", "_outlets")
+
+    def __init__(self, fetched_dt: datetime | None = None):
+        self.fetched_dt = fetched_dt or datetime.now(timezone.utc)
+        self.items: list[Article] = []
+        self._outlets: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def append(self, article: Article) -> None:
+        self.items.append(article)
+
+    def base_dt(self, article: Article) -> datetime:
+        """时间过滤/排序用：优先 published，其次本批次的抓取时间"""
+        return article.published_dt or self.fetched_dt
+
+    def outlet(self, raw_source: str) -> str:
+        name = self._outlets.get(raw_source)
+        if name is None:
+            name = self._outlets[raw_source] = sys.intern(normalize_source_short(raw_source))
+        return name
+
+    def count_by_source(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for a in self.items:
+            counts[a.source] = counts.get(a.source, 0) + 1
+        return counts
+
+    def to_frame(self, articles: list[Article] | None = None) -> pd.DataFrame:
+        """导出所需列，按 Date 倒序"""
+        arts = self.items if articles is None else articles
+        if not arts:
+            return pd.DataFrame(columns=EXPORT_COLUMNS)
+        dates = [self.base_dt(a) for a in arts]
+        order = sorted(range(len(arts)), key=dates.__getitem__, reverse=True)
+        return pd.DataFrame({
+            "Nested?": [""] * len(arts),
+            "URL": [arts[i].url for i in order],
+            "Date": [dates[i].strftime("%Y-%m-%d %H:%M") for i in order],
+            "Outlet": [self.outlet(arts[i].raw_source) for i in order],
+            "Headline": [arts[i].title for i in order],
+            "Nut Graph": [arts[i].summary for i in order],
+        }, columns=EXPORT_COLUMNS)
+
+
+class SourceTopK:
+    """
+    每个来源只保留最新的 K 篇（流式，小顶堆按 published_dt / fetched_dt）
+
+    - keep_limit 的文章不占名额，总是保留
+    - k 为 None 时不限数量
+    - is_full(): 某来源已有 K 篇且都比 older_than 新，后面更旧的文章不可能再入选，可以停止翻页
+    """
+
+    def __init__(self, k: int | None, key: Callable[[Article], datetime]):
+        self.k = k
+        self.key = key
+        self._heaps: dict[str, list] = {}
+        self._pinned: list[Article] = []
+        self._seq = 0
+
+    def offer(self, article: Article) -> bool:
+        """返回文章是否（暂时）入选"""
+        self._seq += 1
+        if self.k is None or article.keep_limit:
+            self._pinned.append(article)
+            return True
+        if self.k <= 0:
+            return False
+        heap = self._heaps.setdefault(article.source, [])
+        # 同一时间的文章先到先得（与原来 rank(method='first') 一致）：seq 越大越先被挤掉
+        entry = (self.key(article), -self._seq, article)
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+            return True
+        if entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+            return True
+        return False
+
+    def is_full(self, source: str, older_than: datetime | None) -> bool:
+        if self.k is None or older_than is None:
+            return False
+        if self.k <= 0:
+            return True
+        heap = self._heaps.get(source)
+        return bool(heap) and len(heap) >= self.k and heap[0][0] > older_than
+
+    def items(self) -> list[Article]:
+        return self._pinned + [entry[2] for heap in self._heaps.values() for entry in heap]
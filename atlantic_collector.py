@@ -1,7 +1,7 @@
 import json
 import os
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, List, Optional, Set
 
 import requests
 from dateutil import parser as dtparser
@@ -51,7 +51,11 @@ def fetch_atlantic_articles(
     date_to: datetime,
     max_pages: int = 5,
     page_size: int = 36,
+    on_page: Optional[Callable[[List[Dict[str, Any]]], bool]] = None,
 ) -> List[Dict[str, Any]]:
+    """
+    on_page: 可选回调，每页结束时传入本页新增的文章；返回 True 表示调用方已经够了，停止翻页
+    """
     if date_from.tzinfo is None:
         date_from = date_from.replace(tzinfo=timezone.utc)
     else:
@@ -138,6 +142,7 @@ def fetch_atlantic_articles(
         if not edges:
             break
 
+        page_start = len(results)
         for edge in edges:
             node = edge.get("node") or {}
             article_id = node.get("id")
@@ -169,6 +174,9 @@ def fetch_atlantic_articles(
                 }
             )
 
+        if on_page and on_page(results[page_start:]):
+            break
+
         page_info = river.get("pageInfo") or {}
         end_cursor = page_info.get("endCursor")
         has_next = page_info.get("hasNextPage")
@@ -1,7 +1,7 @@
 import json
 import os
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, List, Optional, Set
 
 import requests
 from dateutil import parser as dtparser
@@ -103,7 +103,11 @@ def fetch_axios_articles(
     date_from: datetime,
     date_to: datetime,
     max_pages: int = 5,
+    on_page: Optional[Callable[[List[Dict[str, Any]]], bool]] = None,
 ) -> List[Dict[str, Any]]:
+    """
+    on_page: 可选回调，每页结束时传入本页新增的文章；返回 True 表示调用方已经够了，停止翻页
+    """
     if date_from.tzinfo is None:
         date_from = date_from.replace(tzinfo=timezone.utc)
     else:
@@ -174,6 +178,7 @@ def fetch_axios_articles(
             time.sleep(1.5)  # 页面请求之间等待 1.5 秒
         
         stories = _stories_from_payload(payload)
+        page_start = len(results)
         for story in stories:
             story_id = story.get("id")
             if not story_id or story_id in seen_ids:
@@ -205,6 +210,8 @@ def fetch_axios_articles(
             )
 
         pages_fetched += 1
+        if on_page and on_page(results[page_start:]):
+            break
         next_token = _next_page_token(payload)
         if not next_token:
             break
@@ -0,0 +1,432 @@
+"""
+延迟分类（OpenAI Batch API）
+定时采集任务没有时延要求：把未分类的文章写成 JSONL 批量请求，提交到 Batch API，
+下次运行（或手动 poll）时取回结果并写入分类缓存（classification_cache）。
+之后 app / export_to_excel 分类这些文章时直接命中缓存，不再发实时请求。
+
+- Batch API 按半价计费，不占实时接口的限流额度
+- 提交过的批次记录在 CLASSIFICATION_BATCH_STATE_PATH（默认 ~/.us_china_picker/classification_batches.json）
+- 缓存键与实时分类完全相同（URL + 内容哈希 + provider + model + 类别 + 提示词版本）
+
+只适合常驻主机（例如 launchd 定时任务所在的机器）：批次记录和分类缓存都在本机，
+下次运行必须在同一台机器上才能收取结果，app 也要读同一份缓存。
+GitHub Actions 等一次性 runner 上 submit_deferred 直接跳过。
+
+用法：
+    python batch_classifier.py submit --input articles.csv   # 含 URL / Headline / Nut Graph 列
+    python batch_classifier.py poll [--wait]                  # 取回已完成的批次，写入缓存
+    python batch_classifier.py status
+    python batch_classifier.py serve --port 8765              # 本地替身服务，用于测试
+
+本地测试：
+    python batch_classifier.py serve &
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test python batch_classifier.py submit --input a.csv
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from api_classifier import (PROMPT_VERSION, _budget_allows_call, _build_batch_prompt, _select_examples,
+                            category_codes, decode_batch_labels)
+from classification import compile_rules
+from classification_cache import get_cache, make_key
+from llm_gateway import get_gateway
+from usage_ledger import get_ledger
+
+BATCH_STATE_PATH = Path(
+    os.getenv(
+        "CLASSIFICATION_BATCH_STATE_PATH",
+        Path.home() / ".us_china_picker" / "classification_batches.json"
+    )
+)
+BATCH_WORK_DIR = BATCH_STATE_PATH.parent / "batches"
+BATCH_PRICE_FACTOR = 0.5
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def _load_state() -> dict:
+    if BATCH_STATE_PATH.exists():
+        try:
+            with BATCH_STATE_PATH.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not read batch state: {e}")
+    return {"batches": []}
+
+
+def _save_state(state: dict) -> None:
+    BATCH_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = BATCH_STATE_PATH.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, BATCH_STATE_PATH)
+
+
+def load_rules(categories_path: str = "categories_en.yaml") -> dict:
+    import yaml
+    with open(categories_path, "r", encoding="utf-8") as f:
+        return (yaml.safe_load(f) or {}).get("categories", {})
+
+
+def build_requests(df: pd.DataFrame, category_list: list[str], model: str, batch_size: int,
+                   codes: dict[str, str] | None = None) -> tuple[list[dict], dict[str, list[str]]]:
+    """
+    未命中缓存的文章 → Batch API 请求行
+
+    Returns:
+        (JSONL 请求行, {custom_id: [第 1..N 篇文章的缓存键]})
+    """
+    headlines = df["Headline"].fillna("").astype(str).tolist() if "Headline" in df else [""] * len(df)
+    nuts = df["Nut Graph"].fillna("").astype(str).tolist() if "Nut Graph" in df else [""] * len(df)
+    urls = df["URL"].fillna("").astype(str).tolist() if "URL" in df else [""] * len(df)
+
+    from fewshot_selector import feedback_category, get_selector
+    selector = get_selector()
+    articles = {}
+    for url, headline, nut in zip(urls, headlines, nuts):
+        # 已有人工反馈的文章分类时直接用反馈，不需要提交
+        if feedback_category(url, category_list, selector):
+            continue
+        key = make_key(url, headline, nut, "openai", model, category_list, PROMPT_VERSION)
+        articles.setdefault(key, f"{headline}\n\n{nut}")
+    cached = get_cache().get_many(list(articles))
+    pending = [(key, text) for key, text in articles.items() if key not in cached]
+
+    requests, mapping = [], {}
+    for n, start in enumerate(range(0, len(pending), batch_size), 1):
+        chunk = pending[start:start + batch_size]
+        custom_id = f"chunk-{n}"
+        mapping[custom_id] = [key for key, _ in chunk]
+        requests.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": "你是一个专业的新闻分类助手。"},
+                    {"role": "user", "content": _build_batch_prompt(
+                        [text for _, text in chunk], category_list,
+                        _select_examples([text for _, text in chunk], category_list), codes)},
+                ],
+                "temperature": 0.3,
+                "max_tokens": (8 if codes else 16) * len(chunk) + 20,
+                "response_format": {"type": "json_object"},
+            },
+        })
+    return requests, mapping
+
+
+def submit(df: pd.DataFrame, rules: dict, batch_size: int | None = None) -> str | None:
+    """
+    提交延迟分类批次；返回 batch id（没有需要分类的文章、没有 key 或超出预算时返回 None）
+    """
+    gateway = get_gateway()
+    if not gateway.has_key("openai"):
+        print("⚠️ Deferred classification needs an OpenAI API key (Batch API)")
+        return None
+    if not _budget_allows_call():
+        print("⚠️ Daily API budget reached, deferred classification not submitted")
+        return None
+
+    category_list = [cat for cat, _ in compile_rules(rules)] + ["Uncategorized"]
+    model = gateway.config.model("openai")
+    # Batch API 没有实时接口的输出长度压力，批次可以大一些
+    size = batch_size or min(gateway.config.batch_size * 2, 50)
+    codes = category_codes(category_list) if gateway.config.constrained_output else None
+    requests, mapping = build_requests(df, category_list, model, size, codes)
+    if not requests:
+        print("💾 Deferred classification: all articles already cached")
+        return None
+
+    BATCH_WORK_DIR.mkdir(parents=True, exist_ok=True)
+    path = BATCH_WORK_DIR / f"classify_{datetime.now():%Y%m%d_%H%M%S}.jsonl"
+    with path.open("w", encoding="utf-8") as f:
+        for req in requests:
+            f.write(json.dumps(req, ensure_ascii=False) + "\n")
+
+    client = gateway.client("openai")
+    with path.open("rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h",
+        metadata={"purpose": "classification", "prompt_version": PROMPT_VERSION},
+    )
+
+    state = _load_state()
+    state["batches"].append({
+        "id": batch.id,
+        "model": model,
+        "categories": category_list,
+        "constrained_output": bool(codes),
+        "input_file": str(path),
+        "submitted_at": datetime.now().isoformat(timespec="seconds"),
+        "n_articles": sum(len(keys) for keys in mapping.values()),
+        "requests": mapping,
+    })
+    _save_state(state)
+    n_articles = state["batches"][-1]["n_articles"]
+    print(f"📤 Deferred classification submitted: batch {batch.id}, {n_articles} articles in {len(requests)} requests")
+    return batch.id
+
+
+def _merge_output(text: str, entry: dict) -> tuple[int, int]:
+    """解析批次输出 JSONL，有效标签写入缓存并记账；返回 (已分类, 失败)"""
+    valid_labels: dict[str, str] = {}
+    failed = 0
+    ledger = get_ledger()
+    gateway = get_gateway()
+    codes = category_codes(entry["categories"]) if entry.get("constrained_output") else None
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        keys = entry["requests"].get(item.get("custom_id"), [])
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+        if item.get("error") or response.get("status_code") != 200 or not body.get("choices"):
+            failed += len(keys)
+            continue
+        usage = body.get("usage") or {}
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+        ledger.record(entry["model"], usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                      cached_tokens, items=len(keys), fallback_cost_per_call=gateway.config.cost_per_call,
+                      price_factor=BATCH_PRICE_FACTOR)
+        labels = decode_batch_labels(body["choices"][0]["message"].get("content") or "", len(keys),
+                                     entry["categories"], codes)
+        for i, key in enumerate(keys, 1):
+            label = labels.get(str(i))
+            if label:
+                valid_labels[key] = label
+            else:
+                failed += 1
+    get_cache().put_many(valid_labels, provider="openai", model=entry["model"])
+    ledger.flush()
+    return len(valid_labels), failed
+
+
+def poll(wait: bool = False, interval: float = 60.0, timeout: float | None = None) -> dict:
+    """
+    检查已提交的批次，完成的结果写入缓存并从状态文件中移除
+
+    wait: 一直等到所有批次结束（或超过 timeout 秒）
+    """
+    totals = {"completed": 0, "failed": 0, "pending": 0, "classified": 0, "invalid": 0}
+    state = _load_state()
+    if not state["batches"]:
+        return totals
+    gateway = get_gateway()
+    if not gateway.has_key("openai"):
+        print("⚠️ Cannot poll deferred classification batches: OpenAI API key not configured")
+        totals["pending"] = len(state["batches"])
+        return totals
+    client = gateway.client("openai")
+    started = time.monotonic()
+
+    while True:
+        remaining = []
+        for entry in state["batches"]:
+            try:
+                batch = client.batches.retrieve(entry["id"])
+            except Exception as e:
+                print(f"⚠️ Could not retrieve batch {entry['id']}: {e}")
+                remaining.append(entry)
+                continue
+            if batch.status not in TERMINAL_STATUSES:
+                remaining.append(entry)
+                continue
+            if batch.status == "completed" and batch.output_file_id:
+                text = client.files.content(batch.output_file_id).text
+                classified, invalid = _merge_output(text, entry)
+                totals["completed"] += 1
+                totals["classified"] += classified
+                totals["invalid"] += invalid
+                print(f"📥 Batch {entry['id']}: {classified} articles classified and cached"
+                      + (f", {invalid} without a valid label" if invalid else ""))
+            else:
+                totals["failed"] += 1
+                print(f"⚠️ Batch {entry['id']} ended with status '{batch.status}'; "
+                      f"its {entry['n_articles']} articles will be classified on demand")
+        state["batches"] = remaining
+        _save_state(state)
+        if not remaining or not wait or (timeout is not None and time.monotonic() - started >= timeout):
+            break
+        time.sleep(interval)
+
+    totals["pending"] = len(state["batches"])
+    return totals
+
+
+def is_ephemeral_host() -> bool:
+    """一次性 CI runner：~/.us_china_picker 在运行结束后就没了"""
+    return os.getenv("GITHUB_ACTIONS", "").lower() == "true"
+
+
+def submit_deferred(df: pd.DataFrame, categories_path: str = "categories_en.yaml") -> str | None:
+    """定时任务入口：先收取之前提交的批次，再提交本次文章；任何错误都不影响采集任务本身"""
+    if is_ephemeral_host():
+        # 提交了也没有下一次运行来收取，白花 Batch API 的钱
+        print("⚠️ Deferred classification skipped: batch state and classification cache "
+              "do not survive an ephemeral CI runner (use a long-lived host)")
+        return None
+    try:
+        result = poll()
+        if result["completed"] or result["failed"] or result["pending"]:
+            print(f"📦 Deferred classification: {result['completed']} batch(es) merged, "
+                  f"{result['pending']} still pending")
+        return submit(df, load_rules(categories_path))
+    except Exception as e:
+        print(f"⚠️ Deferred classification skipped: {e}")
+        return None
+
+
+# ---------------------------------------------------------------------------
+# 本地替身服务：实现 Batch API 用到的 4 个接口，用关键词规则给出分类结果
+# ---------------------------------------------------------------------------
+
+def serve(port: int = 8765, categories_path: str = "categories_en.yaml") -> None:
+    import email
+    import re
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from api_classifier import _CLASSIFICATION_CHECKLIST
+    from classification import keyword_category
+
+    compiled = compile_rules(load_rules(categories_path))
+    files: dict[str, bytes] = {}
+    batches: dict[str, dict] = {}
+    article_re = re.compile(r"^\[(\d+)\]\n", re.M)
+
+    codes = category_codes([cat for cat, _ in compiled])
+
+    def answer(body: dict) -> dict:
+        full_prompt = body["messages"][-1]["content"]
+        use_codes = "letters in brackets" in full_prompt
+        prompt = full_prompt.split(_CLASSIFICATION_CHECKLIST[:40])[0]
+        parts = article_re.split(prompt)
+        labels = {}
+        for n, text in zip(parts[1::2], parts[2::2]):
+            headline, _, nut = text.strip().partition("\n\n")
+            category = keyword_category(compiled, headline, nut)
+            labels[n] = codes[category] if use_codes else category
+        content = json.dumps(labels)
+        return {
+            "id": f"chatcmpl-{len(prompt)}", "object": "chat.completion", "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+
+    def run_batch(batch: dict) -> None:
+        out = io.StringIO()
+        lines = files[batch["input_file_id"]].decode("utf-8").splitlines()
+        for line in filter(None, lines):
+            req = json.loads(line)
+            out.write(json.dumps({"id": f"resp-{req['custom_id']}", "custom_id": req["custom_id"], "error": None,
+                                  "response": {"status_code": 200, "body": answer(req["body"])}}) + "\n")
+        file_id = f"file-{len(files) + 1}"
+        files[file_id] = out.getvalue().encode("utf-8")
+        batch.update(status="completed", output_file_id=file_id, completed_at=int(time.time()),
+                     request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, data: dict, status: int = 200) -> None:
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.endswith("/files"):
+                msg = email.message_from_bytes(
+                    b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body)
+                data = next((part.get_payload(decode=True) for part in msg.get_payload()
+                             if part.get_param("name", header="content-disposition") == "file"), b"")
+                file_id = f"file-{len(files) + 1}"
+                files[file_id] = data
+                self._json({"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                            "filename": "batch.jsonl", "purpose": "batch", "status": "processed"})
+            elif self.path.endswith("/batches"):
+                req = json.loads(body or b"{}")
+                batch_id = f"batch_{len(batches) + 1}"
+                batches[batch_id] = {
+                    "id": batch_id, "object": "batch", "endpoint": req.get("endpoint"),
+                    "input_file_id": req.get("input_file_id"), "completion_window": req.get("completion_window"),
+                    "status": "in_progress", "created_at": int(time.time()), "metadata": req.get("metadata"),
+                }
+                self._json(batches[batch_id])
+            else:
+                self._json({"error": {"message": "not found"}}, 404)
+
+        def do_GET(self):
+            parts = self.path.rstrip("/").split("/")
+            if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in batches:
+                batch = batches[parts[-1]]
+                # 第一次查询时“完成”，模拟异步处理
+                if batch["status"] == "in_progress":
+                    run_batch(batch)
+                self._json(batch)
+            elif parts[-1] == "content" and parts[-2] in files:
+                data = files[parts[-2]]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._json({"error": {"message": "not found"}}, 404)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"🧪 Batch API stand-in listening on http://127.0.0.1:{port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Deferred classification via the OpenAI Batch API")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_submit = sub.add_parser("submit", help="submit articles from a CSV / Excel file")
+    p_submit.add_argument("--input", required=True)
+    p_submit.add_argument("--categories", default="categories_en.yaml")
+    p_submit.add_argument("--batch_size", type=int, default=None)
+    p_poll = sub.add_parser("poll", help="merge finished batches into the classification cache")
+    p_poll.add_argument("--wait", action="store_true")
+    p_poll.add_argument("--interval", type=float, default=60.0)
+    p_poll.add_argument("--timeout", type=float, default=None)
+    sub.add_parser("status", help="list submitted batches")
+    p_serve = sub.add_parser("serve", help="run a local Batch API stand-in for testing")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--categories", default="categories_en.yaml")
+    args = ap.parse_args()
+
+    if args.cmd == "submit":
+        data = pd.read_excel(args.input) if args.input.endswith((".xlsx", ".xls")) else pd.read_csv(args.input)
+        submit(data, load_rules(args.categories), args.batch_size)
+    elif args.cmd == "poll":
+        print(poll(wait=args.wait, interval=args.interval, timeout=args.timeout))
+    elif args.cmd == "status":
+        for entry in _load_state()["batches"]:
+            print(f"{entry['id']}  submitted {entry['submitted_at']}  {entry['n_articles']} articles  ({entry['model']})")
+    else:
+        serve(args.port, args.categories)
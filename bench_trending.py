@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+热点榜分组基准测试（合成数据，不调用 API）
+
+    python bench_trending.py                        # 1k / 5k / 20k
+    python bench_trending.py --sizes 1000 2000 --exhaustive_max 2000
+    python bench_trending.py --misfiled 0.3 --blocking category entity   # 同一事件被分到不同类别
+    python bench_trending.py --sizes 20000 --scorer tfidf --workers 1 4    # 按类别并行 vs 单进程
+
+每个规模、每种打分方式（tfidf 相似度引擎 / 逐对 sequence）报告 LSH 候选模式的耗时；
+规模不超过 --exhaustive_max 时同时跑两两比较模式。
+召回率 = 同一事件的文章对中被分到同组的比例；精确率 = 分到同组的文章对中确属同一事件的比例。
+--workers 给出多个进程数时，每次计时前清空文章特征缓存（冷启动），speed-up 相对于第一个进程数。
+进程数不超过 CPU 核数（单核机器上都按单进程跑），只有 ≥ PARALLEL_MIN_ARTICLES 篇的类别进进程池。
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from itertools import combinations, product
+
+import pandas as pd
+
+from entity_blocking import GAZETTEER
+from article_features import get_feature_store
+from news_trending import group_similar_news
+
+CATEGORIES = [
+    "Administration", "Trade & Commerce", "Shipping", "Chips", "Science & AI", "Tech & National Security",
+    "Biotech", "Climate & Energy", "Critical Minerals", "Business & Investment", "Digital Currencies",
+    "US Multilateralism", "Geopolitics", "China-Russia", "Taiwan", "Military & Maritime",
+    "Influence & Espionage", "China's Economy", "Higher Education", "Human Rights", "Fentanyl", "Inside China",
+]
+OUTLETS = ["Reuters", "AP", "NYT", "WSJ", "FT", "WaPo", "SCMP", "Bloomberg", "Politico", "Axios", "Nikkei", "BBC"]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+
+
+def _rewrite(words: list[str], vocab: list[str], keep: float, rng: random.Random) -> list[str]:
+    """改写：按 keep 比例保留原词，其余换成别的词，再交换一对相邻词"""
+    out = [w if rng.random() < keep else rng.choice(vocab) for w in words]
+    if len(out) > 2:
+        k = rng.randrange(len(out) - 1)
+        out[k], out[k + 1] = out[k + 1], out[k]
+    return out
+
+
+def synthetic_articles(n: int, seed: int = 7, misfiled: float = 0.0) -> pd.DataFrame:
+    """
+    按「事件」生成文章：同一事件的报道是同一标题 / 导语的不同改写；约一半事件只有一篇报道。
+    misfiled > 0 时每个事件的标题带一个关键实体，且每篇报道以该概率被归到随机的其他类别
+    """
+    rng = random.Random(seed)
+    # 单独的随机源：misfiled=0 时生成的数据与原来完全一致
+    misfile_rng = random.Random(seed + 1)
+    entities = sorted(GAZETTEER)
+    vocab = [_word(rng) for _ in range(20000)]
+    rows = []
+    event = 0
+    while len(rows) < n:
+        headline = rng.sample(vocab, 9)
+        nut = rng.sample(vocab, 22)
+        category = rng.choice(CATEGORIES)
+        day = rng.randint(1, 7)
+        entity = misfile_rng.choice(entities) if misfiled > 0 else None
+        for _ in range(rng.choice([1, 1, 1, 2, 3, 4, 6])):
+            outlet = rng.choice(OUTLETS)
+            words = _rewrite(headline, vocab, 0.7, rng)
+            filed = category
+            if entity:
+                words.insert(misfile_rng.randrange(len(words) + 1), entity)
+                if misfile_rng.random() < misfiled:
+                    filed = misfile_rng.choice([c for c in CATEGORIES if c != category])
+            rows.append({
+                "URL": f"https://example.com/{event}/{len(rows)}",
+                "Date": f"2025-11-{day:02d}",
+                "Outlet": outlet,
+                "Headline": " ".join(words).capitalize(),
+                "Nut Graph": " ".join(_rewrite(nut, vocab, 0.6, rng)).capitalize() + ".",
+                "Category": filed,
+                "Event": event,
+            })
+        event += 1
+    return pd.DataFrame(rows[:n])
+
+
+def grouped_pairs(df: pd.DataFrame, column: str = "GroupID") -> set[tuple[str, str]]:
+    pairs = set()
+    for _, group in df.groupby(column):
+        urls = sorted(group["URL"])
+        pairs.update(combinations(urls, 2))
+    return pairs
+
+
+def run(df: pd.DataFrame, **kwargs) -> tuple[float, pd.DataFrame]:
+    started = time.perf_counter()
+    result = group_similar_news(df, similarity_threshold=0.55, use_api=False, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    ap.add_argument("--exhaustive_max", type=int, default=1000,
+                    help="largest size for which the all-pairs mode is also timed")
+    ap.add_argument("--lsh_threshold", type=float, nargs="+", default=[0.05, 0.1, 0.15])
+    ap.add_argument("--scorer", nargs="+", default=["tfidf", "sequence"], choices=["tfidf", "sequence"])
+    ap.add_argument("--clustering", default="union_find", choices=["union_find", "greedy"])
+    ap.add_argument("--blocking", nargs="+", default=["category"], choices=["category", "entity"])
+    ap.add_argument("--misfiled", type=float, default=0.0,
+                    help="share of reports filed under a different category than their event")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1],
+                    help="process counts for per-category grouping; the first one is the speed-up baseline")
+    args = ap.parse_args()
+
+    print(f"{'articles':>9} {'mode':>26} {'seconds':>9} {'groups':>7} {'recall':>7} {'precision':>9}"
+          + (f" {'speed-up':>8}" if len(args.workers) > 1 else ""))
+
+    def report(n, mode, elapsed, result, truth, baseline=None):
+        found = grouped_pairs(result)
+        recall = len(truth & found) / len(truth) if truth else 1.0
+        precision = len(truth & found) / len(found) if found else 1.0
+        line = f"{n:>9} {mode:>26} {elapsed:>9.2f} {result['GroupID'].nunique():>7} {recall:>7.1%} {precision:>9.1%}"
+        if baseline:
+            line += f" {baseline / elapsed:>7.2f}x"
+        print(line)
+
+    def timed(n, mode, truth, **kwargs):
+        baseline = None
+        for workers in args.workers:
+            if len(args.workers) > 1:
+                get_feature_store().clear()
+            elapsed, result = run(df, workers=workers, **kwargs)
+            baseline = baseline or elapsed
+            label = mode if workers == 1 else f"{mode}/w{workers}"
+            report(n, label, elapsed, result, truth, baseline if len(args.workers) > 1 else None)
+
+    for n in args.sizes:
+        df = synthetic_articles(n, misfiled=args.misfiled)
+        truth = grouped_pairs(df, "Event")
+        for blocking, scorer in product(args.blocking, args.scorer):
+            suffix = f"/{scorer}" if blocking == "category" else f"/{scorer}/{blocking}"
+            if n <= args.exhaustive_max:
+                timed(n, f"all pairs{suffix}", truth, candidates="all", scorer=scorer,
+                      clustering=args.clustering, blocking=blocking)
+            for threshold in args.lsh_threshold:
+                timed(n, f"lsh@{threshold}{suffix}", truth, candidates="lsh", lsh_threshold=threshold,
+                      scorer=scorer, clustering=args.clustering, blocking=blocking)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+文章分类执行器
+classify_many(df, rules, backend=...)：四种后端
+- "keywords": 关键词正则（先匹配先得）
+- "local":    本地 TF-IDF 模型（local_classifier，无网络、不占预算），置信度低于 local_min_confidence 回退到关键词
+- "api":      API 批量请求 + 线程池并发（限流在 LLM 网关中全局共享）
+- "cascade":  关键词打分 → 本地模型 → API，只有低置信度或有冲突的文章才发给 API
+结果按 df 原顺序返回；本地模型 / API 不可用或失败的文章回退到关键词正则。
+app、export_to_excel 和批处理脚本共用这一个入口。
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+import pandas as pd
+
+from article_features import features_for
+from utils import compile_or_regex
+
+BACKENDS = ("keywords", "local", "api", "cascade")
+
+# 级联阈值默认值；config_en.yaml 的 classification_cascade 段可覆盖
+DEFAULT_CASCADE = {
+    "min_keyword_hits": 2,      # 只命中一个类别且命中次数 ≥ 此值：直接采用关键词结果
+    "use_local_model": True,
+    "local_confidence": 0.6,    # 本地模型置信度 ≥ 此值且不与关键词冲突：直接采用
+    "agree_confidence": 0.3,    # 关键词只命中一个类别、本地模型结论相同且置信度 ≥ 此值：采用
+    "local_min_confidence": 0.15,  # "local" 后端：置信度低于此值回退到关键词（关键词也没命中 → Uncategorized）
+}
+
+
+def compile_rules(rules: dict) -> list[tuple]:
+    """categories_en.yaml 的 {类别: 正则} → [(类别, 编译后的正则)]，按配置顺序（先匹配先得）"""
+    compiled = []
+    for cat, patt in rules.items():
+        try:
+            compiled.append((cat, compile_or_regex([patt])))
+        except Exception:
+            continue
+    return compiled
+
+
+def keyword_category(compiled: list[tuple], headline: str, nut_graph: str) -> str:
+    return _keyword_category(compiled, f"{headline} || {nut_graph}")
+
+
+def _keyword_category(compiled: list[tuple], text: str) -> str:
+    for cat, rgx in compiled:
+        if rgx.search(text):
+            return cat
+    return "Uncategorized"
+
+
+def keyword_scores(compiled: list[tuple], headline: str, nut_graph: str) -> dict[str, int]:
+    """{类别: 命中次数}，只包含有命中的类别（按配置顺序）"""
+    return _keyword_scores(compiled, f"{headline} || {nut_graph}")
+
+
+def _keyword_scores(compiled: list[tuple], text: str) -> dict[str, int]:
+    scores = {}
+    for cat, rgx in compiled:
+        hits = sum(1 for _ in rgx.finditer(text))
+        if hits:
+            scores[cat] = hits
+    return scores
+
+
+def cascade_config(overrides: dict | None = None) -> dict:
+    cfg = dict(DEFAULT_CASCADE)
+    cfg.update({k: v for k, v in (overrides or {}).items() if k in DEFAULT_CASCADE})
+    return cfg
+
+
+def path_summary(stats: dict) -> str:
+    """各路径占比，例如 "keywords 58% · local 25% · API 17% (3 cached)" """
+    total = sum(stats.get(k, 0) for k in ("keywords", "local", "api"))
+    if not total:
+        return "no articles"
+    parts = [f"{name} {stats.get(k, 0) / total:.0%}"
+             for k, name in (("keywords", "keywords"), ("local", "local"), ("api", "API"))
+             if stats.get(k, 0)]
+    extra = []
+    if stats.get("cache_hits"):
+        extra.append(f"{stats['cache_hits']} cached")
+    if stats.get("feedback"):
+        extra.append(f"{stats['feedback']} from feedback")
+    if stats.get("fallback"):
+        extra.append(f"{stats['fallback']} fallback")
+    return " · ".join(parts) + (f" ({', '.join(extra)})" if extra else "")
+
+
+def _classify_api(pending: list[int], headlines: list[str], nuts: list[str], urls: list[str],
+                  labels: list, counts: dict, category_list: list[str], provider: str | None,
+                  concurrency: int | None, batch_size: int | None,
+                  progress: Callable[[int], None] | None) -> bool:
+    """
+    pending 中的文章走 API（先查人工反馈和缓存，API 不可用时也查），结果按位置写入 labels；返回 API 是否可用
+    progress(n)：每完成 n 篇调用一次
+    """
+    try:
+        from api_classifier import classify_batch_with_api, PROMPT_VERSION
+        from llm_gateway import get_gateway
+        gateway = get_gateway()
+    except ImportError:
+        return False
+    from classification_cache import get_cache, make_key
+    from fewshot_selector import feedback_category, get_selector
+    provider = provider or gateway.config.provider
+    model = gateway.config.model(provider)
+
+    # 已有人工反馈的 URL 直接用反馈中的类别
+    unreviewed = []
+    selector = get_selector()
+    for i in pending:
+        reviewed = feedback_category(urls[i], category_list, selector)
+        if reviewed:
+            labels[i] = reviewed
+            counts["feedback"] += 1
+        else:
+            unreviewed.append(i)
+    if progress and len(unreviewed) < len(pending):
+        progress(len(pending) - len(unreviewed))
+    pending = unreviewed
+
+    # 再查缓存：命中的文章不发请求，也不经过预算检查
+    cache = get_cache()
+    keys = {i: make_key(urls[i], headlines[i], nuts[i], provider, model, category_list, PROMPT_VERSION)
+            for i in pending}
+    cached = cache.get_many(list(keys.values()))
+    misses = []
+    for i in pending:
+        if keys[i] in cached:
+            labels[i] = cached[keys[i]]
+            counts["cache_hits"] += 1
+        else:
+            misses.append(i)
+    hits = len(pending) - len(misses)
+    if hits:
+        print(f"💾 Classification cache: {hits} hit(s), {len(misses)} miss(es)")
+        if progress:
+            progress(hits)
+    if not gateway.available:
+        return False
+
+    before = gateway.totals(("classify_batch",))
+    size = batch_size or gateway.config.batch_size
+    chunks = [misses[start:start + size] for start in range(0, len(misses), size)]
+    workers = max(1, min(concurrency or gateway.config.concurrency, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(classify_batch_with_api,
+                        [(i, headlines[i], nuts[i]) for i in chunk],
+                        category_list, provider, size): chunk
+            for chunk in chunks
+        }
+        # 结果按位置写回，完成顺序不影响输出顺序
+        for future in as_completed(futures):
+            try:
+                fresh = {i: label for i, label in future.result().items() if label}
+                for i, label in fresh.items():
+                    labels[i] = label
+                cache.put_many({keys[i]: label for i, label in fresh.items()}, provider=provider, model=model)
+            except Exception as e:
+                print(f"⚠️ API batch classification failed: {e}")
+            counts["batches"] += 1
+            if progress:
+                progress(len(futures[future]))
+    if chunks:
+        after = gateway.totals(("classify_batch",))
+        counts["output_tokens"] += after["completion_tokens"] - before["completion_tokens"]
+        counts["invalid"] += after["invalid"] - before["invalid"]
+        print(f"📈 LLM gateway: {gateway.summary()}")
+    return True
+
+
+def classify_many(df: pd.DataFrame, rules: dict, use_api: bool = True,
+                  provider: str = None, concurrency: int = None, batch_size: int = None,
+                  on_progress: Callable[[int, int], None] | None = None,
+                  stats: dict | None = None, backend: str | None = None,
+                  cascade: dict | None = None) -> pd.Series:
+    """
+    批量分类
+
+    Args:
+        df: 含 Headline / Nut Graph 列
+        rules: {类别: 正则}，同时决定 API 可选的类别列表
+        use_api: 是否尝试 API 分类（backend 未指定时：True → "api"，False → "keywords"）
+        concurrency: 同时进行的请求数，默认读取 API_CONCURRENCY（4）
+        batch_size: 每个请求的文章数，默认读取 API_BATCH_SIZE（25）
+        on_progress: 进度回调 (已完成, 总数)，在调用线程中执行（Streamlit 组件可直接更新）
+        stats: 可选，写入每篇文章最终结果的来源
+               {"keywords": n, "local": n, "api": n（含缓存命中和人工反馈）, "cache_hits": n, "feedback": n,
+                "fallback": 本该由 API / 本地模型分类但回退了的文章数, "batches": API 批次数,
+                "output_tokens": API 输出 token 数, "invalid": API 返回的无效 / 缺失标签数（含重试前）}
+        backend: "keywords" / "local" / "api" / "cascade"
+        cascade: 级联阈值（见 DEFAULT_CASCADE）；"local" 后端只用 local_min_confidence
+
+    Returns:
+        与 df.index 对齐的 Category 序列
+    """
+    compiled = compile_rules(rules)
+    # 标题 / 导语 / 关键词匹配文本来自文章特征侧表（转载检测、热点榜共用）
+    features = features_for(df)
+    headlines = [f.headline for f in features]
+    nuts = [f.nut_graph for f in features]
+    urls = [f.url for f in features]
+    total = len(df)
+    labels: list[str | None] = [None] * total
+    # 每篇文章最终结果的来源
+    sources: list[str | None] = [None] * total
+    counts = {"keywords": 0, "local": 0, "api": 0, "cache_hits": 0, "feedback": 0, "fallback": 0, "batches": 0,
+              "output_tokens": 0, "invalid": 0}
+    backend = backend or ("api" if use_api else "keywords")
+    category_list = [cat for cat, _ in compiled] + ["Uncategorized"]
+    allowed = set(category_list)
+    done = 0
+
+    def advance(n: int) -> None:
+        nonlocal done
+        done += n
+        if on_progress:
+            on_progress(min(done, total), total)
+
+    model = None
+    if backend in ("local", "cascade") and total:
+        if backend == "local" or cascade_config(cascade)["use_local_model"]:
+            from local_classifier import get_local_classifier
+            model = get_local_classifier()
+
+    pending: list[int] = []
+    if backend == "local" and model is not None:
+        min_confidence = cascade_config(cascade)["local_min_confidence"]
+        for i in range(total):
+            local_cat, local_conf = model.predict(headlines[i], nuts[i], allowed=allowed)
+            # 低置信度的文章留给下面的关键词回退
+            if local_conf >= min_confidence:
+                labels[i], sources[i] = local_cat, "local"
+    elif backend == "api":
+        pending = list(range(total))
+    elif backend == "cascade":
+        cfg = cascade_config(cascade)
+        # 关键词 / 本地模型都不确定的文章留着，稍后发给 API；API 不可用时用 guesses 里的最佳猜测
+        guesses: dict[int, tuple[str, str]] = {}
+        for i in range(total):
+            scores = _keyword_scores(compiled, features[i].keyword_text)
+            if len(scores) == 1 and next(iter(scores.values())) >= cfg["min_keyword_hits"]:
+                labels[i], sources[i] = next(iter(scores)), "keywords"
+                continue
+            local_cat, local_conf = model.predict(headlines[i], nuts[i], allowed=allowed) if model else (None, 0.0)
+            if local_cat and local_cat != "Uncategorized":
+                if local_conf >= cfg["local_confidence"] and (not scores or local_cat in scores):
+                    labels[i], sources[i] = local_cat, "local"
+                    continue
+                if len(scores) == 1 and local_cat in scores and local_conf >= cfg["agree_confidence"]:
+                    labels[i], sources[i] = local_cat, "local"
+                    continue
+            pending.append(i)
+            if scores:
+                guesses[i] = (next(iter(scores)), "keywords")
+            elif local_cat and local_cat != "Uncategorized" and local_conf >= cfg["agree_confidence"]:
+                guesses[i] = (local_cat, "local")
+        advance(total - len(pending))
+
+    if pending and total:
+        _classify_api(pending, headlines, nuts, urls, labels, counts, category_list,
+                      provider, concurrency, batch_size, advance)
+        for i in pending:
+            if labels[i] is not None:
+                sources[i] = "api"
+        if backend == "cascade":
+            # API 没给出结果的文章用关键词 / 本地模型的最佳猜测
+            for i in pending:
+                if labels[i] is None and i in guesses:
+                    labels[i], sources[i] = guesses[i]
+                    counts["fallback"] += 1
+
+    for i in range(total):
+        if labels[i] is None:
+            labels[i], sources[i] = _keyword_category(compiled, features[i].keyword_text), "keywords"
+            if backend != "keywords":
+                counts["fallback"] += 1
+    for src in sources:
+        counts[src] += 1
+    if backend == "cascade" and total:
+        print(f"🪜 Classification cascade: {path_summary(counts)}")
+    if on_progress:
+        on_progress(total, total)
+    if stats is not None:
+        stats.update(counts)
+    return pd.Series(labels, index=df.index, name="Category", dtype=object)
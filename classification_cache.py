@@ -0,0 +1,135 @@
+"""
+分类结果持久化缓存（SQLite）
+重复运行 app / export_to_excel 时，已经分类过的文章直接读缓存，不再调用 API、不计入预算。
+
+缓存键 = URL + 标题/导语哈希 + provider + model + 类别集合哈希 + 提示词版本，
+任何一项变化（文章改写、换模型、改类别或提示词）都会自然失效。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CLASSIFICATION_CACHE_PATH = Path(
+    os.getenv(
+        "CLASSIFICATION_CACHE_PATH",
+        Path.home() / ".us_china_picker" / "classification_cache.sqlite3"
+    )
+)
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def content_hash(headline: str, nut_graph: str) -> str:
+    return _sha(f"{(headline or '').strip()}\n{(nut_graph or '').strip()}")[:16]
+
+
+def categories_hash(categories: list[str]) -> str:
+    return _sha("\n".join(sorted(categories)))[:12]
+
+
+def make_key(url: str, headline: str, nut_graph: str, provider: str, model: str,
+             categories: list[str], prompt_version: str) -> str:
+    parts = [url or "", content_hash(headline, nut_graph), provider or "", model or "",
+             categories_hash(categories), prompt_version]
+    return _sha("|".join(parts))
+
+
+class ClassificationCache:
+    """
+    用法：
+        cache = ClassificationCache()
+        hits = cache.get_many(keys)          # {key: category}
+        cache.put_many({key: category}, provider=..., model=...)
+        cache.stats                          # {"hits": n, "misses": m}
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else CLASSIFICATION_CACHE_PATH
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self._conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS classifications ("
+                    " key TEXT PRIMARY KEY,"
+                    " category TEXT NOT NULL,"
+                    " provider TEXT,"
+                    " model TEXT,"
+                    " created_at REAL)"
+                )
+                self._conn = conn
+            except sqlite3.Error as e:
+                print(f"⚠️ Classification cache unavailable: {e}")
+                return None
+        return self._conn
+
+    def get_many(self, keys: list[str]) -> dict[str, str]:
+        found: dict[str, str] = {}
+        with self._lock:
+            conn = self._connect()
+            if conn is not None and keys:
+                unique = list(dict.fromkeys(keys))
+                # SQLite 默认最多 999 个参数，分块查询
+                for start in range(0, len(unique), 500):
+                    chunk = unique[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    try:
+                        rows = conn.execute(
+                            f"SELECT key, category FROM classifications WHERE key IN ({placeholders})", chunk
+                        ).fetchall()
+                    except sqlite3.Error as e:
+                        print(f"⚠️ Classification cache read failed: {e}")
+                        rows = []
+                    found.update(rows)
+            hits = sum(1 for k in keys if k in found)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(keys) - hits
+        return found
+
+    def get(self, key: str) -> str | None:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: dict[str, str], provider: str = "", model: str = "") -> None:
+        if not items:
+            return
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            now = time.time()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO classifications (key, category, provider, model, created_at)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        [(k, v, provider, model, now) for k, v in items.items()],
+                    )
+            except sqlite3.Error as e:
+                print(f"⚠️ Classification cache write failed: {e}")
+
+    def put(self, key: str, category: str, provider: str = "", model: str = "") -> None:
+        self.put_many({key: category}, provider=provider, model=model)
+
+
+_default_cache: ClassificationCache | None = None
+
+
+def get_cache() -> ClassificationCache:
+    """进程内共用一个缓存连接"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ClassificationCache()
+    return _default_cache
@@ -5,6 +5,8 @@ from datetime import datetime, timezone
 from dateutil import parser as dtparser
 import pandas as pd
 from utils import clean_html, url_id, domain_of, compile_or_regex, bool_match, normalize_source_short
+from gnews_resolver import GoogleNewsResolver, strip_publisher_suffix
+from articles import Article, ArticleBatch, SourceTopK
 
 _BROWSER_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
@@ -153,8 +155,9 @@ def _fetch_feed(url: str) -> feedparser.FeedParserDict:
 
 # 注意：AP News 日期获取已移至 apnews_collector.py，不再需要此函数
 
-def _entry_to_row(e, source_label: str, raw_source_url: str):
-    url = e.get("link") or ""
+def _entry_to_row(e, source_label: str, raw_source_url: str, url: str | None = None) -> Article:
+    # url: 调用方已解析好的链接（如 Google News 跳转链接还原后的原始 URL）
+    url = url or e.get("link") or ""
     title = clean_html(e.get("title"))
     # 尝试多个字段获取摘要（RSSHub 可能使用不同的字段名）
     summary = ""
@@ -195,23 +198,18 @@ def _entry_to_row(e, source_label: str, raw_source_url: str):
     
     # 注意：AP News 现在使用专门的 collector，不再需要这里获取日期
     
-    fetched = datetime.now(timezone.utc)
-    return {
-        "id": url_id(url),
-        "source": source_label,
-        "title": title,
-        "summary": summary,
-        "url": url,
-        "published_dt": published,
-        "fetched_dt": fetched,
-        "raw_source": raw_source_url,
-        "keep_filter": False,
-        "keep_limit": False,
-    }
-
-def _relevance_score(row, pos_regex: re.Pattern | None, neg_regex: re.Pattern | None) -> float:
+    return Article(
+        source=source_label,
+        title=title,
+        summary=summary,
+        url=url,
+        published_dt=published,
+        raw_source=raw_source_url,
+    )
+
+def _relevance_score(row: Article, pos_regex: re.Pattern | None, neg_regex: re.Pattern | None) -> float:
     # 规则评分：命中正向 +1，命中负向 -0.6，标题加权
-    t = row["title"]; s = row["summary"]; u = row["url"]
+    t = row.title; s = row.summary; u = row.url
     score = 0.0
     if pos_regex:
         if bool_match(t, pos_regex): score += 1.0
@@ -221,7 +219,7 @@ def _relevance_score(row, pos_regex: re.Pattern | None, neg_regex: re.Pattern |
         if bool_match(s, neg_regex): score -= 0.4
     # 来源加一点点常识加权（白名单主流媒体 +0.1）
     dom = domain_of(u)
-    if any(k in (row["source"] or "") for k in ["NYT","WSJ","Bloomberg","Reuters","FT","Economist","SCMP","WaPo","BBC","CNN","Nikkei","AP","FP","FA"]):
+    if any(k in (row.source or "") for k in ["NYT","WSJ","Bloomberg","Reuters","FT","Economist","SCMP","WaPo","BBC","CNN","Nikkei","AP","FP","FA"]):
         score += 0.1
     return score
 
@@ -256,8 +254,87 @@ def collect(config_path: str,
         for u in feeds:
             feed_jobs.append((dom, u))
 
+    # 本次采集的所有文章共用一个抓取时间
+    batch = ArticleBatch()
+
+    # 相关性过滤：us_china_only 时，用正向/负向规则打分
+    pos_regex = compile_or_regex(rel_cfg.get("us_china_only_keywords", [])) if us_china_only else None
+    neg_regex = compile_or_regex(rel_cfg.get("negative_patterns", [])) if us_china_only else None
+
+    # 每源限制上限（避免某源刷屏）：边抓边保留每个来源最新的 K 篇
+    window_days = (end - start).days + 1
+    max_per = None if window_days <= 7 else policy.get('max_per_source', 200)
+    limiter = SourceTopK(max_per, key=batch.base_dt)
+
+    seen_urls: set[str] = set()
+    fetched_ids: dict[str, set[str]] = {}
+
+    def add(article: Article, check_range: bool = True) -> bool:
+        """返回 False = 不在日期范围内被丢弃（同一条目在别的 feed 里可能带着不同日期再出现）"""
+        # 时间过滤：优先 published，其次 fetched
+        if check_range and not _in_range(batch.base_dt(article), start, end):
+            return False
+        fetched_ids.setdefault(article.source, set()).add(article.id)
+        # 去重（按 url）
+        if article.url in seen_urls:
+            return True
+        seen_urls.add(article.url)
+        if not article.keep_filter and us_china_only:
+            if _relevance_score(article, pos_regex, neg_regex) < 0.6:
+                return True
+        limiter.offer(article)
+        return True
+
+    def add_collected(articles, dom: str, default_raw_source: str, keep: bool = False) -> None:
+        # 专用 collector 返回的 dict → Article
+        for art in articles:
+            if art.get("url", "") in seen_urls:
+                continue  # 翻页回调里已经处理过
+            add(Article(
+                id=art.get("id") or "",
+                source=dom,
+                title=art.get("title", ""),
+                summary=art.get("summary", ""),
+                url=art.get("url", ""),
+                published_dt=art.get("published"),
+                raw_source=art.get("raw_source") or default_raw_source,
+                keep_filter=keep,
+                keep_limit=keep,
+            ))
+
+    # 跨 feed 的原始条目去重：在 _entry_to_row（clean_html、日期解析、url_id）之前按 link / GUID 判断
+    # Politico 六个 feed 大量重叠，同一条目只清洗一次
+    seen_entries: set = set()
+    entry_stats = {"entries": 0, "early_duplicates": 0}
+
+    def entry_keys(e, dom: str) -> list:
+        link = e.get("link") or ""
+        guid = e.get("id") or ""
+        return [k for k in (link, (dom, guid) if guid else None) if k]
+
+    def is_duplicate_entry(e, dom: str) -> bool:
+        """只检查；条目被接受后才用 mark_entry_seen 记下，被日期范围 / 来源过滤丢掉的条目别的 feed 还能再给"""
+        entry_stats["entries"] += 1
+        if any(k in seen_entries for k in entry_keys(e, dom)):
+            entry_stats["early_duplicates"] += 1
+            return True
+        return False
+
+    def mark_entry_seen(e, dom: str) -> None:
+        seen_entries.update(entry_keys(e, dom))
+
+    def page_hook(dom: str, default_raw_source: str):
+        """
+        给翻页型 collector 的回调：每抓完一页就把文章送进每源上限，
+        如果该来源已经有 K 篇都比本页最旧的文章新，返回 True 让 collector 停止翻页
+        """
+        def on_page(page_articles: list[dict]) -> bool:
+            add_collected(page_articles, dom, default_raw_source)
+            dates = [a["published"] for a in page_articles if a.get("published")]
+            return limiter.is_full(dom, min(dates)) if dates else False
+        return on_page
+
     # 读取 RSS
-    rows = []
     for idx, (dom, feed_url) in enumerate(feed_jobs):
         # Special handling: PIIE China listing page (AJAX interface)
         if dom == "piie.com":
@@ -271,23 +348,15 @@ def collect(config_path: str,
                             published = _parse_dt(article["published"])
                         except Exception:
                             pass
-                    row = {
-                        "id": url_id(article["url"]),
-                        "source": dom,
-                        "title": article["title"],
-                        "summary": article.get("summary", ""),
-                        "url": article["url"],
-                        "published_dt": published,
-                        "fetched_dt": datetime.now(timezone.utc),
-                        "raw_source": feed_url,
-                        "keep_filter": False,
-                        "keep_limit": False,
-                    }
                     # Time filtering safeguard
-                    base_dt = row["published_dt"] or row["fetched_dt"]
-                    if not _in_range(base_dt, start, end):
-                        continue
-                    rows.append(row)
+                    add(Article(
+                        source=dom,
+                        title=article["title"],
+                        summary=article.get("summary", ""),
+                        url=article["url"],
+                        published_dt=published,
+                        raw_source=feed_url,
+                    ))
             except ImportError:
                 print("⚠️ PIIE collector not found, skipping")
             except Exception as e:
@@ -307,19 +376,15 @@ def collect(config_path: str,
                         except:
                             pass
                     
-                    row = {
-                        "id": url_id(article["url"]),
-                        "source": dom,
-                        "title": article["title"],
-                        "summary": article.get("summary", ""),
-                        "url": article["url"],
-                        "published_dt": published,
-                        "fetched_dt": datetime.now(timezone.utc),
-                        "raw_source": feed_url
-                    }
-                    row.setdefault("keep_filter", False)
-                    row.setdefault("keep_limit", False)
-                    rows.append(row)
+                    # Nikkei collector 已按日期过滤
+                    add(Article(
+                        source=dom,
+                        title=article["title"],
+                        summary=article.get("summary", ""),
+                        url=article["url"],
+                        published_dt=published,
+                        raw_source=feed_url,
+                    ), check_range=False)
             except ImportError:
                 print(f"⚠️ Nikkei collector not found, skipping")
             except Exception as e:
@@ -331,6 +396,8 @@ def collect(config_path: str,
             # Fetch RSS feed and filter for China-related articles
             d = _fetch_feed(feed_url)
             for e in d.entries:
+                if is_duplicate_entry(e, dom):
+                    continue
                 title = e.get("title", "").lower()
                 link = e.get("link", "").lower()
                 summary = e.get("summary", "").lower()
@@ -345,14 +412,8 @@ def collect(config_path: str,
                 has_keyword = any(kw in text for kw in keywords for text in [title, summary])
                 
                 # Only include China-related articles
-                if is_china_url or has_keyword:
-                    row = _entry_to_row(e, dom, feed_url)
-                    # Time filtering: prioritize published, fallback to fetched
-                    base_dt = row["published_dt"] or row["fetched_dt"]
-                    if not _in_range(base_dt, start, end): continue
-                    row.setdefault("keep_filter", False)
-                    row.setdefault("keep_limit", False)
-                    rows.append(row)
+                if (is_china_url or has_keyword) and add(_entry_to_row(e, dom, feed_url)):
+                    mark_entry_seen(e, dom)
             continue
 
         # Special handling: Axios China section (requires authenticated cookies)
@@ -364,6 +425,7 @@ def collect(config_path: str,
                     date_from=start,
                     date_to=end,
                     max_pages=policy.get("max_pages", 5),
+                    on_page=page_hook(dom, feed_url),
                 )
             except ImportError:
                 print("⚠️ Axios collector not found, skipping")
@@ -375,23 +437,7 @@ def collect(config_path: str,
             if not axios_articles:
                 continue
 
-            for art in axios_articles:
-                row = {
-                    "id": art.get("id") or url_id(art.get("url", "")),
-                    "source": dom,
-                    "title": art.get("title", ""),
-                    "summary": art.get("summary", ""),
-                    "url": art.get("url", ""),
-                    "published_dt": art.get("published"),
-                    "fetched_dt": datetime.now(timezone.utc),
-                    "raw_source": art.get("raw_source", feed_url),
-                    "keep_filter": False,
-                    "keep_limit": False,
-                }
-                base_dt = row["published_dt"] or row["fetched_dt"]
-                if not _in_range(base_dt, start, end):
-                    continue
-                rows.append(row)
+            add_collected(axios_articles, dom, feed_url)
             continue
 
         # Special handling: The Atlantic tag river (GraphQL endpoint)
@@ -404,6 +450,7 @@ def collect(config_path: str,
                     date_from=start,
                     date_to=end,
                     max_pages=policy.get("max_pages", 5),
+                    on_page=page_hook(dom, feed_url),
                 )
             except ImportError:
                 print("⚠️ Atlantic collector not found, skipping")
@@ -415,23 +462,7 @@ def collect(config_path: str,
             if not atlantic_articles:
                 continue
 
-            for art in atlantic_articles:
-                row = {
-                    "id": art["id"],
-                    "source": dom,
-                    "title": art["title"],
-                    "summary": art.get("summary", ""),
-                    "url": art["url"],
-                    "published_dt": art.get("published"),
-                    "fetched_dt": datetime.now(timezone.utc),
-                    "raw_source": art.get("raw_source", feed_url),
-                    "keep_filter": False,
-                    "keep_limit": False,
-                }
-                base_dt = row["published_dt"] or row["fetched_dt"]
-                if not _in_range(base_dt, start, end):
-                    continue
-                rows.append(row)
+            add_collected(atlantic_articles, dom, feed_url)
             continue
 
         # Special handling: AP News China hub (HTML parser, direct from website)
@@ -449,23 +480,7 @@ def collect(config_path: str,
             if not apnews_articles:
                 continue
 
-            for art in apnews_articles:
-                row = {
-                    "id": url_id(art["url"]),
-                    "source": dom,
-                    "title": art["title"],
-                    "summary": art.get("summary", ""),
-                    "url": art["url"],
-                    "published_dt": art.get("published"),
-                    "fetched_dt": datetime.now(timezone.utc),
-                    "raw_source": art.get("raw_source", feed_url),
-                    "keep_filter": False,
-                    "keep_limit": False,
-                }
-                base_dt = row["published_dt"] or row["fetched_dt"]
-                if not _in_range(base_dt, start, end):
-                    continue
-                rows.append(row)
+            add_collected(apnews_articles, dom, feed_url)
             continue
 
         # Special handling: Washington Post Asia-Pacific section (HTML with auth cookies)
@@ -513,44 +528,23 @@ def collect(config_path: str,
                 if us_china_only and not (has_us_reference or has_policy_signal):
                     continue
 
-                row = {
-                    "id": url_id(link),
-                    "source": dom,
-                    "title": title,
-                    "summary": summary,
-                    "url": link,
-                    "published_dt": art.get("published"),
-                    "fetched_dt": datetime.now(timezone.utc),
-                    "raw_source": art.get("raw_source", link),
-                    "keep_filter": False,
-                    "keep_limit": False,
-                }
-                base_dt = row["published_dt"] or row["fetched_dt"]
-                if not _in_range(base_dt, start, end):
-                    continue
-                rows.append(row)
+                add(Article(
+                    source=dom,
+                    title=title,
+                    summary=summary,
+                    url=link,
+                    published_dt=art.get("published"),
+                    raw_source=art.get("raw_source", link),
+                ))
             continue
         
         # Special handling: Wall Street Journal China GraphQL feed
         if dom == "wsj.com":
             try:
                 from wsj_collector import fetch_wsj_articles
-                wsj_articles = fetch_wsj_articles(date_from=start, date_to=end, max_pages=5)
-                for article in wsj_articles:
-                    row = {
-                        "id": url_id(article["url"]),
-                        "source": dom,
-                        "title": article["title"],
-                        "summary": article["summary"],
-                        "url": article["url"],
-                        "published_dt": article["published"],
-                        "fetched_dt": datetime.now(timezone.utc),
-                        "raw_source": article.get("raw_source", feed_url) or feed_url,
-                    }
-                    base_dt = row["published_dt"] or row["fetched_dt"]
-                    if not _in_range(base_dt, start, end):
-                        continue
-                    rows.append(row)
+                wsj_articles = fetch_wsj_articles(date_from=start, date_to=end, max_pages=5,
+                                                  on_page=page_hook(dom, feed_url))
+                add_collected(wsj_articles, dom, feed_url)
             except ImportError:
                 print("⚠️ WSJ collector not found, skipping")
             except Exception as e:
@@ -561,22 +555,9 @@ def collect(config_path: str,
         if dom == "csis.org":
             try:
                 from csis_collector import fetch_csis_articles
-                csis_articles = fetch_csis_articles(date_from=start, date_to=end, max_pages=5)
-                for article in csis_articles:
-                    row = {
-                        "id": url_id(article["url"]),
-                        "source": dom,
-                        "title": article["title"],
-                        "summary": article["summary"],
-                        "url": article["url"],
-                        "published_dt": article["published"],
-                        "fetched_dt": datetime.now(timezone.utc),
-                        "raw_source": article.get("raw_source", feed_url) or feed_url,
-                    }
-                    base_dt = row["published_dt"] or row["fetched_dt"]
-                    if not _in_range(base_dt, start, end):
-                        continue
-                    rows.append(row)
+                csis_articles = fetch_csis_articles(date_from=start, date_to=end, max_pages=5,
+                                                    on_page=page_hook(dom, feed_url))
+                add_collected(csis_articles, dom, feed_url)
             except ImportError:
                 print("⚠️ CSIS collector not found, skipping")
             except Exception as e:
@@ -588,23 +569,7 @@ def collect(config_path: str,
             try:
                 from foreignpolicy_collector import fetch_foreignpolicy_articles
                 fp_articles = fetch_foreignpolicy_articles(date_from=start, date_to=end)
-                for article in fp_articles:
-                    row = {
-                        "id": url_id(article["url"]),
-                        "source": dom,
-                        "title": article["title"],
-                        "summary": article["summary"],
-                        "url": article["url"],
-                        "published_dt": article.get("published"),
-                        "fetched_dt": datetime.now(timezone.utc),
-                        "raw_source": article.get("raw_source", feed_url) or feed_url,
-                        "keep_filter": False,
-                        "keep_limit": False,
-                    }
-                    base_dt = row["published_dt"] or row["fetched_dt"]
-                    if not _in_range(base_dt, start, end):
-                        continue
-                    rows.append(row)
+                add_collected(fp_articles, dom, feed_url)
             except ImportError:
                 print("⚠️ Foreign Policy collector not found, skipping")
             except Exception as e:
@@ -616,23 +581,8 @@ def collect(config_path: str,
             try:
                 from reuters_collector import fetch_reuters_articles
                 reuters_articles = fetch_reuters_articles(date_from=start, date_to=end, max_pages=20)
-                for article in reuters_articles:
-                    row = {
-                        "id": url_id(article["url"]),
-                        "source": dom,
-                        "title": article["title"],
-                        "summary": article["summary"],
-                        "url": article["url"],
-                        "published_dt": article["published"],
-                        "fetched_dt": datetime.now(timezone.utc),
-                        "raw_source": article.get("raw_source", feed_url) or feed_url,
-                        "keep_filter": True,
-                        "keep_limit": True,
-                    }
-                    base_dt = row["published_dt"] or row["fetched_dt"]
-                    if not _in_range(base_dt, start, end):
-                        continue
-                    rows.append(row)
+                # Reuters China 栏目本身就是精选内容：跳过相关性过滤和每源上限
+                add_collected(reuters_articles, dom, feed_url, keep=True)
             except ImportError:
                 print("⚠️ Reuters collector not found, skipping")
             except Exception as e:
@@ -654,23 +604,7 @@ def collect(config_path: str,
             if not bloomberg_articles:
                 continue
 
-            for art in bloomberg_articles:
-                row = {
-                    "id": url_id(art["url"]),
-                    "source": dom,
-                    "title": art["title"],
-                    "summary": art.get("summary", ""),
-                    "url": art["url"],
-                    "published_dt": art.get("published"),
-                    "fetched_dt": datetime.now(timezone.utc),
-                    "raw_source": art.get("raw_source", feed_url),
-                    "keep_filter": False,
-                    "keep_limit": False,
-                }
-                base_dt = row["published_dt"] or row["fetched_dt"]
-                if not _in_range(base_dt, start, end):
-                    continue
-                rows.append(row)
+            add_collected(bloomberg_articles, dom, feed_url)
             continue
         
         # 对 RSSHub 源添加延迟，避免同时发送多个请求触发限流
@@ -681,11 +615,10 @@ def collect(config_path: str,
         
         d = _fetch_feed(feed_url)
         for e in d.entries:
-            row = _entry_to_row(e, dom, feed_url)
-            # 时间过滤：优先 published，其次 fetched
-            base_dt = row["published_dt"] or row["fetched_dt"]
-            if not _in_range(base_dt, start, end): continue
-            rows.append(row)
+            if is_duplicate_entry(e, dom):
+                continue
+            if add(_entry_to_row(e, dom, feed_url)):
+                mark_entry_seen(e, dom)
 
     # 如果某些来源明显不足，且开启 GNews 兜底，则用 site:domain + keywords 拉一小撮补齐
     if gnews_cfg.get("enabled", True) and policy.get("fallback_google", True):
@@ -696,8 +629,10 @@ def collect(config_path: str,
             return [f"site:{domain} ({kw})" for kw in base_kw] if per_domain else base_kw
 
         # 以来源为单位检查数量
-        df_tmp = pd.DataFrame(rows)
-        count_by_dom = df_tmp.groupby("source")["id"].nunique().to_dict() if not df_tmp.empty else {}
+        count_by_dom = {dom: len(ids) for dom, ids in fetched_ids.items()}
+        # Google News 返回的是 news.google.com 跳转链接，先还原成媒体原始 URL，否则无法与 RSS 结果去重
+        resolver = GoogleNewsResolver()
+        resolver.index_known(limiter.items())
         for dom in allowed_domains:
             have = count_by_dom.get(dom, 0)
             if have >= policy.get("min_per_source", 0):
@@ -707,60 +642,18 @@ def collect(config_path: str,
                 rss_url = google_news_rss(q)
                 d = _fetch_feed(rss_url)
                 for e in d.entries:
-                    row = _entry_to_row(e, dom, rss_url)
-                    base_dt = row["published_dt"] or row["fetched_dt"]
-                    if not _in_range(base_dt, start, end): continue
-                    rows.append(row)
-
-    if not rows:
-        return pd.DataFrame(columns=["Nested?","URL","Date","Outlet","Headline","Nut Graph"])
-
-    # 去重（按 url）
-    seen = set()
-    uniq = []
-    for r in rows:
-        if r["url"] in seen: continue
-        seen.add(r["url"])
-        uniq.append(r)
-    rows = uniq
-
-    # 相关性过滤：us_china_only 时，用正向/负向规则打分
-    pos_regex = compile_or_regex(rel_cfg.get("us_china_only_keywords", [])) if us_china_only else None
-    neg_regex = compile_or_regex(rel_cfg.get("negative_patterns", [])) if us_china_only else None
+                    if is_duplicate_entry(e, dom):
+                        continue
+                    article = _entry_to_row(e, dom, rss_url, url=resolver.resolve(e))
+                    article.title = strip_publisher_suffix(article.title, (e.get("source") or {}).get("title"))
+                    if add(article):
+                        mark_entry_seen(e, dom)
+        resolver.save()
 
-    kept = []
-    for r in rows:
-        if r.get("keep_filter"):
-            kept.append(r)
-            continue
-        score = _relevance_score(r, pos_regex, neg_regex) if us_china_only else 0.0
-        if (not us_china_only) or score >= 0.6:
-            kept.append(r)
-
-    # 每源限制上限（避免某源刷屏）
-    if kept:
-        df = pd.DataFrame(kept)
-        # 以 published_dt 优先，其次 fetched_dt 排序/分组
-        df['sort_dt'] = pd.to_datetime(df.get('published_dt')).fillna(pd.to_datetime(df.get('fetched_dt')))
-        if 'keep_limit' not in df.columns:
-            df['keep_limit'] = False
-        window_days = (end - start).days + 1
-        max_per = None if window_days <= 7 else policy.get('max_per_source', 200)
-        if max_per is not None:
-            df['rank'] = df.groupby('source')['sort_dt'].rank(ascending=False, method='first')
-            df = df[(df['rank'] <= max_per) | df['keep_limit'].fillna(False)].copy()
-            df.drop(columns=['rank'], inplace=True)
-        df.drop(columns=['sort_dt'], inplace=True)
-    else:
-        df = pd.DataFrame(kept)
+    if entry_stats["early_duplicates"]:
+        dup = entry_stats["early_duplicates"]
+        print(f"♻️ 跨 feed 提前去重: {dup}/{entry_stats['entries']} 条重复条目，"
+              f"省去 {dup * 2} 次 clean_html、{dup} 次日期解析和 url_id 计算")
 
     # 整理成导出所需列
-    if not df.empty:
-        df["Outlet"] = df["raw_source"].apply(normalize_source_short)
-        df["Date"] = df["published_dt"].fillna(df["fetched_dt"]).dt.strftime("%Y-%m-%d %H:%M")
-        df["Headline"] = df["title"]
-        df["Nut Graph"] = df["summary"]
-        df["URL"] = df["url"]
-        df["Nested?"] = ""  # 先空着
-        df = df[["Nested?","URL","Date","Outlet","Headline","Nut Graph"]].sort_values("Date", ascending=False)
-    return df.reset_index(drop=True)
+    return batch.to_frame(limiter.items())
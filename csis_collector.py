@@ -1,6 +1,6 @@
 import re
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List
 from urllib.parse import urljoin
 
 import requests
@@ -101,7 +101,11 @@ def fetch_csis_articles(
     date_to: datetime,
     max_pages: int = 5,
     timeout: int = 20,
+    on_page: Callable[[List[Dict[str, Any]]], bool] | None = None,
 ) -> List[Dict[str, Any]]:
+    """
+    on_page: 可选回调，每页结束时传入本页新增的文章；返回 True 表示调用方已经够了，停止翻页
+    """
     results: List[Dict[str, Any]] = []
     seen_urls: set[str] = set()
     session = requests.Session()
@@ -127,6 +131,7 @@ def fetch_csis_articles(
             break
 
         stop_paging = False
+        page_start = len(results)
 
         for art in articles:
             link = art.select_one("h3 a")
@@ -172,6 +177,9 @@ def fetch_csis_articles(
             )
             seen_urls.add(url)
 
+        if on_page and on_page(results[page_start:]):
+            stop_paging = True
+
         if stop_paging:
             break
 
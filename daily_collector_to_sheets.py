@@ -28,6 +28,11 @@ CREDENTIALS_PATH = os.getenv("GOOGLE_CREDENTIALS_PATH", "google_credentials.json
 # GitHub Actions 支持：从环境变量读取 JSON 字符串
 GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON", "")
 
+# 延迟分类：把抓到的文章提交到 OpenAI Batch API（半价、不占实时限流），结果写入分类缓存
+# 需要 OPENAI_API_KEY；每次运行会先收取上次提交的批次。也可用命令行参数 --defer-classification 开启
+# 批次记录和缓存在本机 ~/.us_china_picker，只适合常驻主机；GitHub Actions 上会自动跳过
+DEFERRED_CLASSIFICATION = os.getenv("DEFERRED_CLASSIFICATION", "false").lower() == "true"
+
 def get_credentials_path():
     """获取凭证路径，支持 GitHub Actions"""
     # 如果 GitHub Actions 提供了 JSON 字符串，创建临时文件
@@ -96,6 +101,11 @@ def collect_and_upload_to_sheets(config_path: str = "config_en.yaml",
         return (0, 0)
     
     log_print(f"[{datetime.now()}] 找到 {len(df)} 篇文章")
+
+    if DEFERRED_CLASSIFICATION:
+        from batch_classifier import submit_deferred
+        submit_deferred(df)
+        sys.stdout.flush()
     
     # 上传到 Google Sheets
     try:
@@ -172,6 +182,10 @@ def create_weekly_sheet_from_range(spreadsheet_id: str, date_from: str, date_to:
         print("未找到文章")
         return
     
+    if DEFERRED_CLASSIFICATION:
+        from batch_classifier import submit_deferred
+        submit_deferred(df)
+
     upload_df = df[["Nested?","URL","Date","Outlet","Headline","Nut Graph"]].copy()
     
     try:
@@ -186,6 +200,10 @@ def create_weekly_sheet_from_range(spreadsheet_id: str, date_from: str, date_to:
 if __name__ == "__main__":
     import sys
     
+    if "--defer-classification" in sys.argv:
+        sys.argv.remove("--defer-classification")
+        DEFERRED_CLASSIFICATION = True
+
     if len(sys.argv) > 1 and sys.argv[1] == "weekly":
         # 每周汇总模式
         from datetime import timedelta
@@ -0,0 +1,179 @@
+"""
+热点榜跨类别分块（entity + 日期窗口）
+group_similar_news 只在同一 Category 内比较，同一事件被分到不同类别（Taiwan / Geopolitics）就找不到；
+直接去掉类别限制又回到全量两两比较。这里按「关键实体 + 发布日期 ±N 天」分块：
+两篇文章至少共享一个关键实体（国家、领导人、公司、机构，来自关键词词表）且日期相差不超过 N 天
+才成为候选对。
+
+出现在太多文章里的实体（本应用里几乎每篇都有 "china"）区分不出事件，按文档频率剔除。
+
+用法：
+    pairs = blocked_pairs(records, window_days=3)    # {(i, j)}，i < j
+"""
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+
+import pandas as pd
+
+from near_duplicates import normalize_text
+
+DEFAULT_WINDOW_DAYS = 3
+# 出现在超过此比例文章里的实体不参与分块（文章数少于 MIN_DOCS_FOR_CUTOFF 时不剔除）
+MAX_ENTITY_SHARE = 0.15
+MIN_DOCS_FOR_CUTOFF = 50
+
+# 规范名 → 别名（小写、无标点，与 normalize_text 的结果比较）
+GAZETTEER = {
+    # 国家 / 地区
+    # "U.S." 归一化后是 "u s"；不收 "us"（与代词同形）
+    "united states": ["u s", "usa", "united states", "america", "washington"],
+    "china": ["china", "chinese", "beijing", "prc"],
+    "taiwan": ["taiwan", "taiwanese", "taipei"],
+    "hong kong": ["hong kong"],
+    "japan": ["japan", "japanese", "tokyo"],
+    "south korea": ["south korea", "korean", "seoul"],
+    "north korea": ["north korea", "pyongyang"],
+    "russia": ["russia", "russian", "moscow", "kremlin"],
+    "ukraine": ["ukraine", "ukrainian", "kyiv"],
+    "india": ["india", "indian", "new delhi"],
+    "philippines": ["philippines", "philippine", "manila"],
+    "vietnam": ["vietnam", "vietnamese", "hanoi"],
+    "australia": ["australia", "australian", "canberra"],
+    "european union": ["eu", "european union", "brussels"],
+    "germany": ["germany", "german", "berlin"],
+    "france": ["france", "french", "paris"],
+    "united kingdom": ["uk", "britain", "british", "london"],
+    "canada": ["canada", "canadian", "ottawa"],
+    "mexico": ["mexico", "mexican"],
+    "iran": ["iran", "iranian", "tehran"],
+    "israel": ["israel", "israeli"],
+    "thailand": ["thailand", "thai", "bangkok"],
+    "indonesia": ["indonesia", "indonesian", "jakarta"],
+    "singapore": ["singapore"],
+    "netherlands": ["netherlands", "dutch"],
+    "xinjiang": ["xinjiang", "uyghur", "uyghurs", "uighur"],
+    "tibet": ["tibet", "tibetan"],
+    "south china sea": ["south china sea", "scarborough", "spratly", "second thomas shoal"],
+    # 领导人 / 官员
+    "xi jinping": ["xi", "xi jinping"],
+    "li qiang": ["li qiang"],
+    "wang yi": ["wang yi"],
+    "donald trump": ["trump"],
+    "joe biden": ["biden"],
+    "marco rubio": ["rubio"],
+    "scott bessent": ["bessent"],
+    "jamieson greer": ["greer"],
+    "howard lutnick": ["lutnick"],
+    "pete hegseth": ["hegseth"],
+    "he lifeng": ["he lifeng"],
+    "lai ching-te": ["lai ching te", "william lai"],
+    "vladimir putin": ["putin"],
+    "sanae takaichi": ["takaichi"],
+    "kim jong un": ["kim jong un"],
+    "narendra modi": ["modi"],
+    # 公司
+    "nvidia": ["nvidia"],
+    "huawei": ["huawei"],
+    "tsmc": ["tsmc", "taiwan semiconductor"],
+    "smic": ["smic"],
+    "asml": ["asml"],
+    "tiktok": ["tiktok", "bytedance"],
+    "apple": ["apple"],
+    "tesla": ["tesla"],
+    "byd": ["byd"],
+    "catl": ["catl"],
+    "alibaba": ["alibaba"],
+    "tencent": ["tencent"],
+    "deepseek": ["deepseek"],
+    "boeing": ["boeing"],
+    "micron": ["micron"],
+    "intel": ["intel"],
+    "qualcomm": ["qualcomm"],
+    "nexperia": ["nexperia"],
+    "openai": ["openai"],
+    # 机构
+    "congress": ["congress", "senate", "lawmakers"],
+    "white house": ["white house"],
+    "pentagon": ["pentagon"],
+    "commerce department": ["commerce department", "bis", "bureau of industry and security"],
+    "ustr": ["ustr"],
+    "pla": ["pla", "peoples liberation army"],
+    "wto": ["wto"],
+    "nato": ["nato"],
+    "apec": ["apec"],
+    "asean": ["asean"],
+    "g20": ["g20"],
+    "united nations": ["un", "united nations"],
+}
+
+
+def _compile(gazetteer: dict[str, list[str]]) -> tuple[re.Pattern, dict[str, str]]:
+    alias_to_entity = {}
+    for entity, aliases in gazetteer.items():
+        for alias in [entity, *aliases]:
+            alias_to_entity[normalize_text(alias)] = entity
+    # 长别名优先（"south china sea" 先于 "china"）
+    ordered = sorted(alias_to_entity, key=len, reverse=True)
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(a) for a in ordered) + r")\b")
+    return pattern, alias_to_entity
+
+
+_compiled: dict[int, tuple[re.Pattern, dict[str, str]]] = {}
+
+
+def gazetteer_entities(text_norm: str, gazetteer: dict[str, list[str]] | None = None) -> set[str]:
+    """已归一化文本里出现的规范实体名"""
+    gazetteer = gazetteer or GAZETTEER
+    key = id(gazetteer)
+    if key not in _compiled:
+        _compiled[key] = _compile(gazetteer)
+    pattern, alias_to_entity = _compiled[key]
+    return {alias_to_entity[m.group(0)] for m in pattern.finditer(text_norm)}
+
+
+def blocked_pairs(records: list[dict], window_days: int = DEFAULT_WINDOW_DAYS,
+                  gazetteer: dict[str, list[str]] | None = None) -> set[tuple[int, int]]:
+    """
+    共享至少一个关键实体、日期相差不超过 window_days 的文章对 {(i, j)}，i < j。
+    没有日期的文章视为与块内所有文章在窗口内。
+    """
+    from article_features import features_for_records
+
+    features = features_for_records(records)
+    entities = [gazetteer_entities(f.text_norm, gazetteer) for f in features]
+    days = pd.to_datetime(pd.Series([r.get("Date") for r in records], dtype=object), errors="coerce", utc=True)
+    day_numbers = [None if pd.isna(d) else d.toordinal() for d in days]
+
+    doc_freq = defaultdict(int)
+    for ents in entities:
+        for e in ents:
+            doc_freq[e] += 1
+    n = len(records)
+    too_common = set()
+    if n >= MIN_DOCS_FOR_CUTOFF:
+        too_common = {e for e, c in doc_freq.items() if c > MAX_ENTITY_SHARE * n}
+
+    blocks = defaultdict(list)
+    for i, ents in enumerate(entities):
+        for e in ents - too_common:
+            blocks[e].append(i)
+
+    pairs: set[tuple[int, int]] = set()
+    for members in blocks.values():
+        dated = sorted((day_numbers[i], i) for i in members if day_numbers[i] is not None)
+        undated = [i for i in members if day_numbers[i] is None]
+        # 按日期排序后双指针：只配对窗口内的文章
+        lo = 0
+        for hi in range(len(dated)):
+            while dated[hi][0] - dated[lo][0] > window_days:
+                lo += 1
+            for k in range(lo, hi):
+                a, b = dated[k][1], dated[hi][1]
+                pairs.add((a, b) if a < b else (b, a))
+        for a in undated:
+            for b in members:
+                if a != b:
+                    pairs.add((a, b) if a < b else (b, a))
+    return pairs
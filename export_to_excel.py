@@ -1,44 +1,39 @@
 import argparse, yaml, pandas as pd
 from openpyxl.utils import get_column_letter
 from collector import collect
-from utils import compile_or_regex
+from classification import BACKENDS, classify_many, compile_rules
 
 def export(config_path: str, categories_path: str, out_path: str,
            date_from: str, date_to: str, us_china_only: bool,
-           selected_sources: list[str] | None = None):
+           selected_sources: list[str] | None = None, backend: str = "api"):
 
     df = collect(config_path, date_from, date_to, us_china_only, selected_sources)
+    with open(config_path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
     with open(categories_path, "r", encoding="utf-8") as f:
         cats = yaml.safe_load(f) or {}
     rules: dict = cats.get("categories", {})
+    cascade = cfg.get("classification_cascade") or {}
 
-    compiled = [(cat, compile_or_regex([patt])) for cat, patt in rules.items()]
-
-    def assign_category(row):
-        # 尝试使用 API 分类（如果启用）
-        try:
-            from api_classifier import classify_with_api, is_api_available
-            if is_api_available():
-                category_list = [cat for cat, _ in compiled] + ["Uncategorized"]
-                api_cat = classify_with_api(
-                    row.get('Headline', ''),
-                    row.get('Nut Graph', ''),
-                    category_list
-                )
-                if api_cat:
-                    return api_cat
-        except ImportError:
-            pass  # API 分类器未安装，使用正则
-        
-        # 使用正则表达式分类（默认）
-        text = f"{row.get('Headline','')} || {row.get('Nut Graph','')}"
-        for cat, rgx in compiled:
-            if rgx.search(text):
-                return cat
-        return "Uncategorized"
+    compiled = compile_rules(rules)
 
     df = df.copy()
-    df["Category"] = df.apply(assign_category, axis=1)
+    dup_cfg = cfg.get("near_duplicates", {}) or {}
+    if not df.empty and dup_cfg.get("enabled", True):
+        # 同一篇通稿只分类一次，结果复制给其他转载
+        from near_duplicates import tag_near_duplicates, propagate_from_representatives
+        df = tag_near_duplicates(df.reset_index(drop=True), max_distance=dup_cfg.get("max_hamming", 5))
+        if dup_cfg.get("classify_representatives_only", True):
+            reps = df[df["DupRepresentative"]]
+            df = propagate_from_representatives(df, classify_many(reps, rules, backend=backend, cascade=cascade).to_dict(), "Category")
+        else:
+            df["Category"] = classify_many(df, rules, backend=backend, cascade=cascade)
+    elif not df.empty:
+        df["Category"] = classify_many(df, rules, backend=backend, cascade=cascade)
+    else:
+        df["Category"] = []
+    from near_duplicates import drop_dup_columns
+    df = drop_dup_columns(df)
     df = df.sort_values("Date", ascending=False).drop_duplicates(subset=["URL"], keep="first")
 
     with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
@@ -88,7 +83,10 @@ if __name__ == "__main__":
     ap.add_argument("--date_to", required=True)
     ap.add_argument("--us_china_only", action="store_true", default=False)
     ap.add_argument("--sources", nargs="*", default=None)
+    ap.add_argument("--backend", choices=BACKENDS, default="api",
+                    help="classification backend (api falls back to keywords when the API is not configured; "
+                         "cascade only sends low-confidence articles to the API)")
     args = ap.parse_args()
 
     export(args.config, args.categories, args.out,
-           args.date_from, args.date_to, args.us_china_only, args.sources)
\ No newline at end of file
+           args.date_from, args.date_to, args.us_china_only, args.sources, args.backend)
\ No newline at end of file
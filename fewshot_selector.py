@@ -0,0 +1,143 @@
+"""
+Few-shot 示例检索
+分类提示词不再附带固定的 75 条示例，而是为每篇文章挑出最相近的 k 条已标注样本
+（classification_feedback.json + training_data/*.txt），用内存中的 TF-IDF 倒排索引检索。
+
+- 已有人工反馈的 URL 直接返回反馈中的类别，不需要调用 API
+- 索引只在反馈文件 / 训练数据文件变化（mtime、大小）时重建
+
+用法：
+    selector = get_selector()
+    feedback_category(url, categories)          # 有反馈且类别仍有效时返回类别，否则 None
+    feedback_category(url, categories, selector)  # 逐篇查询时复用同一个索引，不必每篇都检查文件
+    selector.nearest(text, k=8)                 # [(示例文本, 类别), ...]
+    selector.examples_for_batch(texts, k=8)     # 一批文章共用的示例（去重）
+"""
+from __future__ import annotations
+
+import json
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+
+from local_classifier import FEEDBACK_PATH, TRAINING_DIR, load_training_examples, tokenize
+
+MAX_EXAMPLE_CHARS = 200
+
+
+def _feedback_categories(feedback_path: Path) -> dict[str, str]:
+    """{URL: 人工确认的类别}"""
+    if not feedback_path.exists():
+        return {}
+    try:
+        with feedback_path.open("r", encoding="utf-8") as f:
+            feedback = json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read feedback file: {e}")
+        return {}
+    categories = {}
+    for url, item in feedback.items() if isinstance(feedback, dict) else []:
+        if item.get("status") == "correct":
+            category = item.get("current_category")
+        elif item.get("status") == "incorrect":
+            category = item.get("correct_category")
+        else:
+            category = None
+        if category:
+            categories[url] = category
+    return categories
+
+
+class FewShotSelector:
+    def __init__(self, examples: list[tuple[str, str]], feedback: dict[str, str] | None = None):
+        self.examples = examples
+        self.feedback = feedback or {}
+        df = Counter()
+        tokens = [Counter(tokenize(text)) for text, _ in examples]
+        for counts in tokens:
+            df.update(counts.keys())
+        n = len(examples)
+        self.idf = {t: math.log((1 + n) / (1 + c)) + 1 for t, c in df.items()}
+        # 倒排索引：词 → [(示例编号, 权重)]
+        self.postings: dict[str, list[tuple[int, float]]] = {}
+        for doc, counts in enumerate(tokens):
+            for t, w in self._weights(counts).items():
+                self.postings.setdefault(t, []).append((doc, w))
+
+    def _weights(self, counts: Counter) -> dict[str, float]:
+        vec = {t: (1 + math.log(c)) * self.idf[t] for t, c in counts.items() if t in self.idf}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {t: v / norm for t, v in vec.items()}
+
+    def feedback_category(self, url: str) -> str | None:
+        return self.feedback.get(url) if url else None
+
+    def nearest(self, text: str, k: int = 8, categories: set[str] | None = None) -> list[tuple[str, str]]:
+        """余弦相似度最高的 k 条示例；categories 限定示例的类别（当前类别列表之外的示例没有意义）"""
+        scores: dict[int, float] = {}
+        for t, w in self._weights(Counter(tokenize(text))).items():
+            for doc, dw in self.postings.get(t, ()):
+                scores[doc] = scores.get(doc, 0.0) + w * dw
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        result = []
+        for doc in ranked:
+            headline, category = self.examples[doc]
+            if categories is None or category in categories:
+                result.append((headline[:MAX_EXAMPLE_CHARS], category))
+                if len(result) == k:
+                    break
+        return result
+
+    def examples_for_batch(self, texts: list[str], k: int = 8,
+                           categories: set[str] | None = None) -> list[tuple[str, str]]:
+        """批量提示词：每篇文章的近邻轮流取、去重，总数不超过 3k"""
+        per_article = [self.nearest(text, k, categories) for text in texts]
+        chosen: dict[str, tuple[str, str]] = {}
+        for rank in range(k):
+            for neighbours in per_article:
+                if rank < len(neighbours):
+                    chosen.setdefault(neighbours[rank][0], neighbours[rank])
+                if len(chosen) >= 3 * k:
+                    return list(chosen.values())
+        return list(chosen.values())
+
+
+def _signature(training_dir: Path, feedback_path: Path) -> tuple:
+    paths = sorted(training_dir.glob("*.txt")) if training_dir.exists() else []
+    if feedback_path.exists():
+        paths.append(feedback_path)
+    return tuple((str(p), p.stat().st_mtime_ns, p.stat().st_size) for p in paths)
+
+
+_selector: FewShotSelector | None = None
+_selector_signature: tuple | None = None
+_selector_lock = threading.Lock()
+
+
+def get_selector(training_dir: Path | None = None, feedback_path: Path | None = None) -> FewShotSelector:
+    """进程内共用一个索引；反馈文件或训练数据变化后自动重建"""
+    global _selector, _selector_signature
+    training_dir = Path(training_dir) if training_dir else TRAINING_DIR
+    feedback_path = Path(feedback_path) if feedback_path else FEEDBACK_PATH
+    signature = _signature(training_dir, feedback_path)
+    with _selector_lock:
+        if _selector is None or signature != _selector_signature:
+            examples = load_training_examples(training_dir, feedback_path, include_descriptions=False)
+            _selector = FewShotSelector(examples, _feedback_categories(feedback_path))
+            _selector_signature = signature
+        return _selector
+
+
+def feedback_category(url: str, categories: list[str] | None = None,
+                      selector: FewShotSelector | None = None) -> str | None:
+    """
+    URL 已有人工反馈时返回反馈中的类别（不在当前类别列表里的忽略）
+    selector: 一批文章逐篇查询时由调用方取一次 get_selector() 传进来，避免每篇都 stat 反馈 / 训练数据文件
+    """
+    if not url:
+        return None
+    category = (selector or get_selector()).feedback_category(url)
+    if category and (categories is None or category in categories or category == "Uncategorized"):
+        return category
+    return None
@@ -0,0 +1,193 @@
+"""
+Google News 链接解析
+将 news.google.com 的跳转链接还原为媒体原始 URL，并持久化缓存（解析成功的链接只解析一次；失败的下次运行重试）
+
+解析顺序（越靠前越便宜）：
+1. 本地缓存
+2. 从文章 ID（base64 protobuf）中直接解码出原始 URL
+3. 用 feed 的 <source> 元数据 + 标题，匹配本次已经通过 RSS 抓到的文章
+4. HEAD / GET 跟随跳转（仅在前面都失败时）
+"""
+from __future__ import annotations
+
+import base64
+import json
+import os
+import re
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+from utils import domain_of
+
+GNEWS_CACHE_PATH = Path(
+    os.getenv(
+        "GNEWS_URL_CACHE_PATH",
+        Path.home() / ".us_china_picker" / "gnews_url_cache.json"
+    )
+)
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+}
+_URL_IN_PAYLOAD_RE = re.compile(rb"https?://[\x21-\x7e]+")
+_DATA_URL_RE = re.compile(r'data-n-au="([^"]+)"')
+_TITLE_KEY_RE = re.compile(r"[^\w\s]")
+
+
+def is_gnews_link(url: str | None) -> bool:
+    return bool(url) and "news.google.com" in url
+
+
+def _title_key(title: str | None) -> str:
+    # 标题归一化：小写、去标点、压缩空格
+    text = _TITLE_KEY_RE.sub("", (title or "").lower())
+    return " ".join(text.split())
+
+
+def strip_publisher_suffix(title: str | None, publisher: str | None) -> str:
+    """Google News 标题形如 "Headline - Reuters"，去掉末尾的媒体名"""
+    title = title or ""
+    if publisher:
+        suffix = f" - {publisher}"
+        if title.endswith(suffix):
+            return title[: -len(suffix)].rstrip()
+    return title
+
+
+def _decode_article_id(link: str) -> str | None:
+    """旧版文章 ID 是 base64 编码的 protobuf，里面直接包含原始 URL"""
+    try:
+        path = urlparse(link).path
+        if "/articles/" not in path:
+            return None
+        token = path.rsplit("/", 1)[-1]
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except Exception:
+        return None
+    m = _URL_IN_PAYLOAD_RE.search(raw)
+    if not m:
+        return None
+    url = m.group(0).decode("ascii", errors="ignore")
+    return url if not is_gnews_link(url) else None
+
+
+class GoogleNewsResolver:
+    """
+    Google News 链接 → 媒体原始 URL
+
+    用法：
+        resolver = GoogleNewsResolver()
+        resolver.index_known(rows)            # 可选：用已抓到的文章做标题匹配
+        url = resolver.resolve(entry)
+        resolver.save()                       # 写回持久化缓存
+    """
+
+    def __init__(self, cache_path: Path | None = None, allow_network: bool = True, timeout: float = 10):
+        self.cache_path = Path(cache_path) if cache_path else GNEWS_CACHE_PATH
+        self.allow_network = allow_network
+        self.timeout = timeout
+        self._cache: dict[str, str] = self._load()
+        self._dirty = False
+        self._known: dict[tuple[str, str], str] = {}
+        # 本次运行中解析失败的链接：只在内存里记，下次运行重试（超时 / 429 / 离线不应永久生效）
+        self._failed: set[str] = set()
+        self.stats = {"cache": 0, "decoded": 0, "title_match": 0, "network": 0, "unresolved": 0}
+
+    def _load(self) -> dict:
+        if not self.cache_path.exists():
+            return {}
+        try:
+            with self.cache_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                return {}
+            # 旧版本把解析失败的链接也记成 link → link，丢掉它们以便重试
+            return {k: v for k, v in data.items() if v and not is_gnews_link(v)}
+        except Exception:
+            return {}
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(self._cache, f)
+            os.replace(tmp, self.cache_path)
+            self._dirty = False
+        except Exception as e:
+            print(f"⚠️ Google News URL cache write failed: {e}")
+
+    def index_known(self, rows) -> None:
+        """登记本次已抓到的文章（按 域名 + 标题），用于免网络请求的匹配"""
+        for r in rows:
+            url = r["url"] if isinstance(r, dict) else r.url
+            title = r["title"] if isinstance(r, dict) else r.title
+            if not url or is_gnews_link(url):
+                continue
+            key = (domain_of(url), _title_key(title))
+            if key[1]:
+                self._known.setdefault(key, url)
+
+    def _remember(self, link: str, url: str) -> str:
+        self._cache[link] = url
+        self._dirty = True
+        return url
+
+    def _follow(self, link: str) -> str | None:
+        try:
+            resp = requests.head(link, allow_redirects=True, timeout=self.timeout, headers=_HEADERS)
+            if resp.url and not is_gnews_link(resp.url):
+                return resp.url
+            # 新版链接不是 HTTP 跳转，而是在页面里给出目标地址
+            resp = requests.get(link, allow_redirects=True, timeout=self.timeout, headers=_HEADERS)
+            if resp.url and not is_gnews_link(resp.url):
+                return resp.url
+            m = _DATA_URL_RE.search(resp.text or "")
+            if m and not is_gnews_link(m.group(1)):
+                return m.group(1)
+        except Exception:
+            pass
+        return None
+
+    def resolve(self, entry) -> str:
+        """返回媒体原始 URL；无法解析时返回原链接"""
+        link = entry.get("link") or ""
+        if not is_gnews_link(link):
+            return link
+
+        cached = self._cache.get(link)
+        if cached:
+            self.stats["cache"] += 1
+            return cached
+        if link in self._failed:
+            self.stats["unresolved"] += 1
+            return link
+
+        url = _decode_article_id(link)
+        if url:
+            self.stats["decoded"] += 1
+            return self._remember(link, url)
+
+        source = entry.get("source") or {}
+        publisher_domain = domain_of(source.get("href"))
+        if publisher_domain:
+            title = strip_publisher_suffix(entry.get("title"), source.get("title"))
+            url = self._known.get((publisher_domain, _title_key(title)))
+            if url:
+                self.stats["title_match"] += 1
+                return self._remember(link, url)
+
+        if self.allow_network:
+            url = self._follow(link)
+            if url:
+                self.stats["network"] += 1
+                return self._remember(link, url)
+
+        # 解析失败不写入持久化缓存（下次运行重试），本次运行内不再重复请求
+        self.stats["unresolved"] += 1
+        self._failed.add(link)
+        return link
@@ -283,10 +283,10 @@ def export_to_sheets_append(df: pd.DataFrame, spreadsheet_id: str, sheet_name: s
     if 'URL' in combined_df.columns and not combined_df.empty:
         before_dedup = len(combined_df)
         # 清理 URL 格式（去除空格、统一格式）
-        combined_df['URL_cleaned'] = combined_df['URL'].astype(str).str.strip().str.lower()
-        # 去除空URL
+        from article_features import url_key
+        combined_df['URL_cleaned'] = [url_key(u) for u in combined_df['URL']]
+        # 去除空URL（url_key 对空值 / "nan" 返回 ""）
         combined_df = combined_df[combined_df['URL_cleaned'] != '']
-        combined_df = combined_df[combined_df['URL_cleaned'] != 'nan']
         # 去重（保留第一个）
         combined_df = combined_df.drop_duplicates(subset=['URL_cleaned'], keep='first')
         combined_df = combined_df.drop('URL_cleaned', axis=1)
@@ -0,0 +1,350 @@
+"""
+LLM 网关
+api_classifier 和 news_trending 共用的长生命周期对象：
+
+- 配置（开关、provider、key、模型、批量/并发、预算）在创建时从 Streamlit secrets / 环境变量解析；
+  get_gateway() 定期比较 secrets / 环境变量的指纹，有变化时自动重建网关（长时间运行的 Streamlit 应用不用重启）
+- OpenAI / Anthropic 客户端按 provider 复用（SDK 客户端线程安全，内部有 HTTP 连接池）
+- chat() 是唯一的调用路径：限流、429 / 5xx 重试、按用途统计次数 / 耗时 / token，
+  并把 API 返回的实际 token 用量写入用量账本（usage_ledger）
+
+用法：
+    gw = get_gateway()
+    if gw.available:
+        text = gw.chat(prompt, system="...", max_tokens=50, purpose="classify")
+    reset_gateway()   # 立即丢弃网关，下次 get_gateway() 重新解析配置
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from rate_limiter import AdaptiveRateLimiter, retry_after_from_headers
+from usage_ledger import get_ledger
+
+DEFAULT_MODELS = {"openai": "gpt-4o-mini", "anthropic": "claude-3-haiku-20240307"}
+DEFAULT_COST_PER_CALL = 0.0003  # $0.0003 per call (based on $0.02/66 articles)
+
+
+def _secrets_api() -> dict:
+    """Streamlit secrets 中的 [api] 段；不在 Streamlit 环境或没有 secrets 时返回空 dict"""
+    try:
+        import streamlit as st
+        if hasattr(st, "secrets") and "api" in st.secrets:
+            return dict(st.secrets.get("api", {}))
+    except Exception:
+        pass
+    return {}
+
+
+def _as_bool(value) -> bool:
+    # 支持字符串 "true"/"false" 或布尔值 true/false
+    if isinstance(value, str):
+        return value.strip().lower() == "true"
+    return bool(value)
+
+
+def _as_float(value, default: float) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def _as_int(value, default: int) -> int:
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return default
+
+
+@dataclass
+class LLMConfig:
+    enabled: bool
+    provider: str
+    # repr=False：打印配置时不泄露 key
+    openai_api_key: str | None = field(repr=False)
+    anthropic_api_key: str | None = field(repr=False)
+    openai_model: str
+    anthropic_model: str
+    batch_size: int
+    concurrency: int
+    fewshot_k: int
+    constrained_output: bool
+    daily_budget: float
+    cost_per_call: float
+    # 热点榜每次运行最多花掉剩余日预算的比例；最多调用次数（0 = 不设固定上限）
+    trending_budget_share: float
+    trending_max_calls: int
+
+    @classmethod
+    def load(cls) -> "LLMConfig":
+        """Streamlit secrets 优先（API key 除外：环境变量优先），其次环境变量"""
+        sec = _secrets_api()
+
+        enabled = _as_bool(sec.get("classifier_enabled", False))
+        if not enabled:
+            enabled = os.getenv("API_CLASSIFIER_ENABLED", "false").lower() == "true"
+
+        budget = _as_float(sec.get("daily_budget_usd") or 0, 0.0)
+        if budget == 0.0:
+            budget = _as_float(os.getenv("API_DAILY_BUDGET_USD", "").strip() or 0, 0.0)
+        cost = _as_float(sec.get("cost_per_call_usd") or os.getenv("API_COST_PER_CALL_USD", "").strip()
+                         or DEFAULT_COST_PER_CALL, DEFAULT_COST_PER_CALL)
+        if cost <= 0:
+            cost = DEFAULT_COST_PER_CALL
+
+        return cls(
+            enabled=enabled,
+            provider=sec.get("provider", os.getenv("API_PROVIDER", "openai")),
+            openai_api_key=os.getenv("OPENAI_API_KEY") or sec.get("openai_api_key"),
+            anthropic_api_key=os.getenv("ANTHROPIC_API_KEY") or sec.get("anthropic_api_key"),
+            openai_model=sec.get("openai_model", os.getenv("OPENAI_MODEL", DEFAULT_MODELS["openai"])),
+            anthropic_model=sec.get("anthropic_model", os.getenv("ANTHROPIC_MODEL", DEFAULT_MODELS["anthropic"])),
+            batch_size=max(1, min(_as_int(sec.get("batch_size", os.getenv("API_BATCH_SIZE", "25")), 25), 50)),
+            concurrency=max(1, _as_int(sec.get("concurrency", os.getenv("API_CONCURRENCY", "4")), 4)),
+            # 每个提示词附带的相似示例数；0 = 使用固定的 75 条示例
+            fewshot_k=max(0, _as_int(sec.get("fewshot_k", os.getenv("API_FEWSHOT_K", "8")), 8)),
+            # 分类只输出类别代码（A, B, ...）；false = 输出完整类别名
+            constrained_output=_as_bool(sec.get("constrained_output", os.getenv("API_CONSTRAINED_OUTPUT", "true"))),
+            daily_budget=budget,
+            cost_per_call=cost,
+            trending_budget_share=min(1.0, max(0.0, _as_float(
+                sec.get("trending_budget_share", os.getenv("TRENDING_BUDGET_SHARE", "0.25")), 0.25))),
+            trending_max_calls=max(0, _as_int(
+                sec.get("trending_max_calls", os.getenv("TRENDING_MAX_API_CALLS", "0")), 0)),
+        )
+
+    def api_key(self, provider: str | None = None) -> str | None:
+        provider = provider or self.provider
+        if provider == "openai":
+            return self.openai_api_key
+        if provider == "anthropic":
+            return self.anthropic_api_key
+        return None
+
+    def model(self, provider: str | None = None) -> str:
+        provider = provider or self.provider
+        return self.anthropic_model if provider == "anthropic" else self.openai_model
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status == 429 or (status is not None and status >= 500):
+        return True
+    return type(exc).__name__ in ("RateLimitError", "APIConnectionError", "APITimeoutError")
+
+
+def _is_rate_limit(exc: Exception) -> bool:
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+class LLMGateway:
+    def __init__(self, config: LLMConfig | None = None):
+        self.config = config or LLMConfig.load()
+        self.limiter = AdaptiveRateLimiter()
+        self._clients: dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.stats: dict[str, dict] = {}
+
+    @property
+    def available(self) -> bool:
+        """API 分类已启用且当前 provider 有 key"""
+        return self.config.enabled and bool(self.config.api_key())
+
+    def has_key(self, provider: str | None = None) -> bool:
+        return bool(self.config.api_key(provider))
+
+    def client(self, provider: str | None = None):
+        provider = provider or self.config.provider
+        with self._lock:
+            client = self._clients.get(provider)
+            if client is None:
+                api_key = self.config.api_key(provider)
+                if not api_key:
+                    raise RuntimeError(f"API key for {provider} not configured")
+                # SDK 自带的重试关掉，429 交给限流器处理
+                if provider == "openai":
+                    from openai import OpenAI
+                    client = OpenAI(api_key=api_key, max_retries=0)
+                elif provider == "anthropic":
+                    from anthropic import Anthropic
+                    client = Anthropic(api_key=api_key, max_retries=0)
+                else:
+                    raise ValueError(f"Unknown API provider: {provider}")
+                self._clients[provider] = client
+        return client
+
+    def _stats_for(self, purpose: str) -> dict:
+        """调用方需持有锁"""
+        return self.stats.setdefault(purpose, {"calls": 0, "errors": 0, "invalid": 0, "latency_s": 0.0,
+                                               "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0})
+
+    def record_invalid(self, purpose: str, n: int = 1) -> None:
+        """请求成功但输出无法识别（无效类别、缺项）的结果数"""
+        with self._lock:
+            self._stats_for(purpose)["invalid"] += n
+
+    def totals(self, purposes: tuple[str, ...] | None = None) -> dict:
+        """按用途汇总的计数（purposes 为 None 时汇总全部）"""
+        with self._lock:
+            rows = [s for p, s in self.stats.items() if purposes is None or p in purposes]
+            return {k: sum(s[k] for s in rows)
+                    for k in ("calls", "errors", "invalid", "prompt_tokens", "completion_tokens", "cached_tokens")}
+
+    def _record(self, purpose: str, elapsed: float, usage: tuple[int, int, int] | None, error: bool) -> None:
+        with self._lock:
+            s = self._stats_for(purpose)
+            s["calls"] += 1
+            s["latency_s"] += elapsed
+            if error:
+                s["errors"] += 1
+            if usage:
+                s["prompt_tokens"] += usage[0]
+                s["completion_tokens"] += usage[1]
+                s["cached_tokens"] += usage[2]
+
+    def _send(self, create, est_tokens: int, max_attempts: int = 4):
+        """经限流器发出请求；create 返回 SDK 的 raw response（with_raw_response），成功后用响应头校准限流器"""
+        for attempt in range(max_attempts):
+            self.limiter.acquire(est_tokens)
+            try:
+                raw = create()
+            except Exception as e:
+                if not _is_retryable(e) or attempt == max_attempts - 1:
+                    raise
+                if _is_rate_limit(e):
+                    headers = getattr(getattr(e, "response", None), "headers", None)
+                    self.limiter.penalize(retry_after_from_headers(headers))
+                else:
+                    time.sleep(2 ** attempt)
+                continue
+            self.limiter.update(raw.headers)
+            return raw.parse()
+
+    def chat(self, prompt: str, *, system: str | None = None, provider: str | None = None,
+             model: str | None = None, max_tokens: int = 50, temperature: float | None = None,
+             json_mode: bool = False, purpose: str = "chat", items: int = 1) -> str:
+        """
+        发送一条用户消息，返回模型输出文本（已 strip）
+
+        json_mode: OpenAI 用 response_format=json_object，Anthropic 预填 "{"（返回文本包含这个 "{"）
+        items: 本次请求处理的文章数（批量分类时 > 1），记入用量账本用于费用预估
+        出错时抛出 SDK 异常，由调用方决定回退策略
+        """
+        provider = provider or self.config.provider
+        model = model or self.config.model(provider)
+        client = self.client(provider)
+        est_tokens = len(prompt) // 4 + max_tokens
+        started = time.monotonic()
+        usage = None
+        try:
+            if provider == "anthropic":
+                messages = [{"role": "user", "content": prompt}]
+                if json_mode:
+                    messages.append({"role": "assistant", "content": "{"})
+                kwargs = {"model": model, "max_tokens": max_tokens, "messages": messages}
+                if system:
+                    kwargs["system"] = system
+                if temperature is not None:
+                    kwargs["temperature"] = temperature
+                response = self._send(lambda: client.messages.with_raw_response.create(**kwargs), est_tokens)
+                text = response.content[0].text
+                if json_mode:
+                    text = "{" + text
+                u = getattr(response, "usage", None)
+                if u:
+                    # Anthropic 的 input_tokens 不含缓存命中的部分
+                    cached = getattr(u, "cache_read_input_tokens", 0) or 0
+                    usage = ((u.input_tokens or 0) + cached, u.output_tokens or 0, cached)
+            else:
+                messages = [{"role": "system", "content": system}] if system else []
+                messages.append({"role": "user", "content": prompt})
+                kwargs = {"model": model, "messages": messages, "max_tokens": max_tokens}
+                if temperature is not None:
+                    kwargs["temperature"] = temperature
+                if json_mode:
+                    kwargs["response_format"] = {"type": "json_object"}
+                response = self._send(lambda: client.chat.completions.with_raw_response.create(**kwargs), est_tokens)
+                text = response.choices[0].message.content or ""
+                u = getattr(response, "usage", None)
+                if u:
+                    details = getattr(u, "prompt_tokens_details", None)
+                    cached = getattr(details, "cached_tokens", 0) or 0
+                    usage = (u.prompt_tokens or 0, u.completion_tokens or 0, cached)
+        except Exception:
+            self._record(purpose, time.monotonic() - started, None, error=True)
+            raise
+        self._record(purpose, time.monotonic() - started, usage, error=False)
+        prompt_tokens, completion_tokens, cached_tokens = usage or (0, 0, 0)
+        get_ledger(self.config.cost_per_call).record(
+            model, prompt_tokens, completion_tokens, cached_tokens,
+            items=items, fallback_cost_per_call=self.config.cost_per_call,
+        )
+        return text.strip()
+
+    def summary(self) -> str:
+        parts = []
+        for purpose, s in self.stats.items():
+            avg = s["latency_s"] / s["calls"] if s["calls"] else 0.0
+            ok = s["calls"] - s["errors"]
+            out_avg = s["completion_tokens"] / ok if ok else 0.0
+            parts.append(f"{purpose}: {s['calls']} calls ({s['errors']} errors, {s['invalid']} invalid results), "
+                         f"avg {avg:.2f}s, {s['prompt_tokens']}+{s['completion_tokens']} tokens "
+                         f"({out_avg:.1f} output tokens/call)")
+        if self.limiter.stats["throttled"]:
+            parts.append(f"throttled {self.limiter.stats['throttled']}x")
+        return "; ".join(parts)
+
+
+# LLMConfig.load 读取的环境变量
+CONFIG_ENV_VARS = (
+    "API_CLASSIFIER_ENABLED", "API_PROVIDER", "OPENAI_API_KEY", "ANTHROPIC_API_KEY", "OPENAI_MODEL",
+    "ANTHROPIC_MODEL", "API_BATCH_SIZE", "API_CONCURRENCY", "API_FEWSHOT_K", "API_CONSTRAINED_OUTPUT",
+    "API_DAILY_BUDGET_USD", "API_COST_PER_CALL_USD", "TRENDING_BUDGET_SHARE", "TRENDING_MAX_API_CALLS",
+)
+# 两次指纹检查之间的最短间隔（秒）：get_gateway 在热路径上，不必每次都读 secrets
+CONFIG_CHECK_INTERVAL = 5.0
+
+
+def config_fingerprint() -> str:
+    """secrets [api] 段 + 相关环境变量的哈希（不保存 key 本身）"""
+    payload = {"secrets": _secrets_api(), "env": {name: os.getenv(name) for name in CONFIG_ENV_VARS}}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+_gateway: LLMGateway | None = None
+_gateway_fingerprint: str | None = None
+_gateway_checked_at = 0.0
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """进程内共用一个网关；secrets / 环境变量变化后自动重建（重新解析配置、重建客户端）"""
+    global _gateway, _gateway_fingerprint, _gateway_checked_at
+    now = time.monotonic()
+    if _gateway is not None and now - _gateway_checked_at < CONFIG_CHECK_INTERVAL:
+        return _gateway
+    with _gateway_lock:
+        if _gateway is not None and now - _gateway_checked_at < CONFIG_CHECK_INTERVAL:
+            return _gateway
+        fingerprint = config_fingerprint()
+        _gateway_checked_at = now
+        if _gateway is None or fingerprint != _gateway_fingerprint:
+            if _gateway is not None:
+                print("🔄 LLM configuration changed, reloading gateway")
+            _gateway = LLMGateway()
+            _gateway_fingerprint = fingerprint
+    return _gateway
+
+
+def reset_gateway() -> None:
+    """丢弃当前网关；下次 get_gateway() 重新解析配置、重建客户端"""
+    global _gateway, _gateway_fingerprint
+    with _gateway_lock:
+        _gateway = None
+        _gateway_fingerprint = None
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+本地文本分类器（TF-IDF + 多类逻辑回归，纯 CPU，无网络、不占 API 预算）
+
+训练数据：
+- api_classifier.CATEGORY_DESCRIPTIONS 中的类别说明（冷启动时每个类别至少有一条样本）
+- training_data/*.txt 中形如  - "Headline" → Category  的示例
+- classification_feedback.json 中的人工反馈（correct → current_category，incorrect → correct_category）
+
+模型保存为带版本号的 JSON（默认 ~/.us_china_picker/local_classifier.json，可用 LOCAL_CLASSIFIER_PATH 覆盖）；
+训练数据变化后 get_local_classifier() 会自动重新训练。
+
+命令行：
+    python local_classifier.py train                 # 重新训练并保存
+    python local_classifier.py info                  # 查看当前模型
+    python local_classifier.py predict "headline" ["nut graph"]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from near_duplicates import normalize_text
+
+BASE_DIR = Path(__file__).resolve().parent
+LOCAL_MODEL_PATH = Path(
+    os.getenv(
+        "LOCAL_CLASSIFIER_PATH",
+        Path.home() / ".us_china_picker" / "local_classifier.json"
+    )
+)
+TRAINING_DIR = BASE_DIR / "training_data"
+FEEDBACK_PATH = BASE_DIR / "classification_feedback.json"
+
+# 模型文件格式；特征提取或结构变化时递增，旧文件自动重训
+FORMAT_VERSION = 1
+
+_EXAMPLE_RE = re.compile(r'^\s*-\s*"(.+)"\s*→\s*(.+?)\s*$')
+_STOPWORDS = frozenset(
+    "a an the of to in on for and or but with by at from as is are was were be been it its this that "
+    "after over into about says said say new will would could may can his her their they he she we "
+    "us s".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """小写、去标点后的单词 + 相邻词二元组（去停用词）"""
+    words = [w for w in normalize_text(text).split() if w not in _STOPWORDS and len(w) > 1]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _category_descriptions() -> dict[str, str]:
+    try:
+        from api_classifier import CATEGORY_DESCRIPTIONS
+        return {c: d for c, d in CATEGORY_DESCRIPTIONS.items() if c != "Uncategorized"}
+    except ImportError:
+        return {}
+
+
+def load_training_examples(training_dir: Path | None = None,
+                           feedback_path: Path | None = None,
+                           include_descriptions: bool = True) -> list[tuple[str, str]]:
+    """
+    返回 [(文本, 类别)]；同一文本以人工反馈为准，其次以最后出现的示例为准
+    include_descriptions: 是否把类别说明也作为样本（训练用；检索 few-shot 示例时不需要）
+    """
+    training_dir = Path(training_dir) if training_dir else TRAINING_DIR
+    feedback_path = Path(feedback_path) if feedback_path else FEEDBACK_PATH
+    examples: dict[str, tuple[str, str]] = {
+        f"description {category}": (description, category)
+        for category, description in _category_descriptions().items()
+    } if include_descriptions else {}
+
+    for path in sorted(training_dir.glob("*.txt")) if training_dir.exists() else []:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            m = _EXAMPLE_RE.match(line)
+            if m:
+                headline, category = m.group(1).strip(), m.group(2).strip()
+                examples[normalize_text(headline)] = (headline, category)
+
+    if feedback_path.exists():
+        try:
+            with feedback_path.open("r", encoding="utf-8") as f:
+                feedback = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not read feedback file: {e}")
+            feedback = {}
+        for item in feedback.values() if isinstance(feedback, dict) else []:
+            if item.get("status") == "correct":
+                category = item.get("current_category")
+            elif item.get("status") == "incorrect":
+                category = item.get("correct_category")
+            else:
+                category = None
+            headline = (item.get("headline") or "").strip()
+            if category and headline:
+                text = f"{headline} {item.get('summary') or ''}".strip()
+                examples[normalize_text(headline)] = (text, category)
+
+    return list(examples.values())
+
+
+def training_data_hash(training_dir: Path | None = None, feedback_path: Path | None = None) -> str:
+    """训练数据内容指纹，用于判断模型是否过期"""
+    training_dir = Path(training_dir) if training_dir else TRAINING_DIR
+    feedback_path = Path(feedback_path) if feedback_path else FEEDBACK_PATH
+    h = hashlib.sha256(str(FORMAT_VERSION).encode())
+    h.update(json.dumps(_category_descriptions(), sort_keys=True).encode())
+    paths = sorted(training_dir.glob("*.txt")) if training_dir.exists() else []
+    for path in paths + ([feedback_path] if feedback_path.exists() else []):
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+class LocalClassifier:
+    def __init__(self, classes: list[str], vocab: dict[str, int], idf: list[float],
+                 weights: np.ndarray, bias: np.ndarray, meta: dict | None = None):
+        self.classes = classes
+        self.vocab = vocab
+        self.idf = idf
+        self.weights = weights  # (特征数, 类别数)
+        self.bias = bias
+        self.meta = meta or {}
+
+    @property
+    def version(self) -> str:
+        return self.meta.get("model_version", "")
+
+    def _vector(self, text: str) -> dict[int, float]:
+        counts = Counter(t for t in tokenize(text) if t in self.vocab)
+        vec = {self.vocab[t]: (1 + math.log(c)) * self.idf[self.vocab[t]] for t, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {i: v / norm for i, v in vec.items()}
+
+    def predict_proba(self, headline: str, nut_graph: str = "") -> dict[str, float]:
+        vec = self._vector(f"{headline} {nut_graph}")
+        scores = self.bias.copy()
+        for i, v in vec.items():
+            scores += v * self.weights[i]
+        scores = np.exp(scores - scores.max())
+        probs = scores / scores.sum()
+        return dict(zip(self.classes, probs.tolist()))
+
+    def predict(self, headline: str, nut_graph: str = "", allowed: set[str] | None = None) -> tuple[str, float]:
+        """返回 (类别, 置信度)；allowed 限定可选类别（例如当前 categories_en.yaml 里的类别）"""
+        if not self._vector(f"{headline} {nut_graph}"):
+            # 没有任何已知特征，模型无从判断
+            return "Uncategorized", 0.0
+        probs = self.predict_proba(headline, nut_graph)
+        if allowed is not None:
+            probs = {c: p for c, p in probs.items() if c in allowed} or {"Uncategorized": 0.0}
+        category = max(probs, key=probs.get)
+        return category, probs[category]
+
+    def to_dict(self) -> dict:
+        terms = sorted(self.vocab, key=self.vocab.get)
+        return {
+            **self.meta,
+            "format_version": FORMAT_VERSION,
+            "classes": self.classes,
+            "terms": terms,
+            "idf": [round(x, 6) for x in self.idf],
+            "weights": np.round(self.weights, 6).tolist(),
+            "bias": np.round(self.bias, 6).tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LocalClassifier":
+        meta = {k: v for k, v in data.items() if k not in ("classes", "terms", "idf", "weights", "bias")}
+        return cls(
+            classes=data["classes"],
+            vocab={t: i for i, t in enumerate(data["terms"])},
+            idf=data["idf"],
+            weights=np.array(data["weights"], dtype=float).reshape(len(data["terms"]), len(data["classes"])),
+            bias=np.array(data["bias"], dtype=float),
+            meta=meta,
+        )
+
+    def save(self, path: Path | None = None) -> Path:
+        path = Path(path) if path else LOCAL_MODEL_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+
+def train(examples: list[tuple[str, str]] | None = None, epochs: int = 500, lr: float = 2.0,
+          l2: float = 1e-4, data_hash: str | None = None) -> LocalClassifier:
+    """TF-IDF（1 + log tf，L2 归一化）+ softmax 回归，全量梯度下降"""
+    if examples is None:
+        examples = load_training_examples()
+        data_hash = data_hash or training_data_hash()
+    if not examples:
+        raise ValueError("No training examples found")
+
+    docs = [tokenize(text) for text, _ in examples]
+    classes = sorted({label for _, label in examples} | {"Uncategorized"})
+    class_index = {c: i for i, c in enumerate(classes)}
+
+    df_counts = Counter(t for doc in docs for t in set(doc))
+    vocab = {t: i for i, t in enumerate(sorted(df_counts))}
+    n = len(docs)
+    idf = [math.log((1 + n) / (1 + df_counts[t])) + 1 for t in sorted(df_counts)]
+
+    X = np.zeros((n, len(vocab)))
+    for r, doc in enumerate(docs):
+        for t, c in Counter(doc).items():
+            X[r, vocab[t]] = (1 + math.log(c)) * idf[vocab[t]]
+        norm = np.linalg.norm(X[r])
+        if norm:
+            X[r] /= norm
+    Y = np.zeros((n, len(classes)))
+    Y[np.arange(n), [class_index[label] for _, label in examples]] = 1.0
+
+    W = np.zeros((len(vocab), len(classes)))
+    b = np.zeros(len(classes))
+    for _ in range(epochs):
+        logits = X @ W + b
+        logits -= logits.max(axis=1, keepdims=True)
+        P = np.exp(logits)
+        P /= P.sum(axis=1, keepdims=True)
+        G = (P - Y) / n
+        W -= lr * (X.T @ G + l2 * W)
+        b -= lr * G.sum(axis=0)
+
+    accuracy = float(((X @ W + b).argmax(axis=1) == Y.argmax(axis=1)).mean())
+    trained_at = datetime.now(timezone.utc)
+    meta = {
+        "model_version": f"{trained_at:%Y%m%d%H%M%S}-{data_hash or 'adhoc'}",
+        "trained_at": trained_at.isoformat(),
+        "data_hash": data_hash or "",
+        "n_examples": n,
+        "train_accuracy": round(accuracy, 4),
+    }
+    return LocalClassifier(classes, vocab, idf, W, b, meta)
+
+
+def load(path: Path | None = None) -> LocalClassifier | None:
+    path = Path(path) if path else LOCAL_MODEL_PATH
+    if not path.exists():
+        return None
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format_version") != FORMAT_VERSION:
+            return None
+        return LocalClassifier.from_dict(data)
+    except Exception as e:
+        print(f"⚠️ Could not load local classifier: {e}")
+        return None
+
+
+_model: LocalClassifier | None = None
+_model_lock = threading.Lock()
+
+
+def get_local_classifier(auto_train: bool = True) -> LocalClassifier | None:
+    """
+    进程内共用的本地模型
+
+    模型文件不存在、格式过旧或训练数据有变化时自动重新训练（auto_train=False 时只加载）
+    """
+    global _model
+    with _model_lock:
+        current_hash = training_data_hash()
+        if _model is not None and (not auto_train or _model.meta.get("data_hash") == current_hash):
+            return _model
+        model = load()
+        if auto_train and (model is None or model.meta.get("data_hash") != current_hash):
+            try:
+                model = train(data_hash=current_hash)
+                model.save()
+                print(f"🧠 Local classifier trained: {model.meta['n_examples']} examples, version {model.version}")
+            except Exception as e:
+                print(f"⚠️ Local classifier training failed: {e}")
+        _model = model
+        return _model
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local TF-IDF + logistic regression classifier")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("train", help="retrain from training_data/ and classification_feedback.json")
+    sub.add_parser("info", help="show the saved model")
+    p = sub.add_parser("predict", help="classify a headline")
+    p.add_argument("headline")
+    p.add_argument("nut_graph", nargs="?", default="")
+    args = ap.parse_args()
+
+    if args.command == "train":
+        model = train(data_hash=training_data_hash())
+        path = model.save()
+        print(f"✅ Saved {path} (version {model.version}, {model.meta['n_examples']} examples, "
+              f"{len(model.classes)} classes, {len(model.vocab)} features, "
+              f"train accuracy {model.meta['train_accuracy']:.1%})")
+    elif args.command == "info":
+        model = load()
+        if model is None:
+            print(f"No model at {LOCAL_MODEL_PATH}; run: python local_classifier.py train")
+            return
+        stale = model.meta.get("data_hash") != training_data_hash()
+        print(json.dumps({k: v for k, v in model.meta.items()}, indent=2))
+        print("⚠️ Training data changed since this model was trained" if stale else "✅ Up to date")
+    else:
+        model = get_local_classifier()
+        if model is None:
+            return
+        category, confidence = model.predict(args.headline, args.nut_graph)
+        print(f"{category} ({confidence:.2f})")
+
+
+if __name__ == "__main__":
+    main()
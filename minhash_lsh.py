@@ -0,0 +1,180 @@
+"""
+MinHash + LSH 候选对生成
+热点榜分组原来要在每个类别内两两比较所有文章（O(n²) 次 SequenceMatcher）。
+这里先给每篇文章的「标题 + 导语」词集合算 MinHash 签名，再按 band 分桶：
+只有至少一个 band 完全相同的文章才成为候选对，整体接近 O(n)。
+
+召回 / 速度的取舍由 threshold 控制（估计的 Jaccard 相似度拐点）：
+越低召回越高、候选越多越慢；越高越快但可能漏掉措辞差别大的同一事件报道。
+"""
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+from near_duplicates import normalize_text
+
+NUM_PERM = 64
+# 0.15 时热点榜（sequence 打分）的召回率比两两比较低约 5 个百分点；0.05 时相同
+DEFAULT_THRESHOLD = 0.05
+# 单个桶过大（大新闻日的头条事件、模板标题）时不直接展开成两两候选（避免退化成 O(n²)），
+# 而是用其他 band 再分桶；所有 band 都相同（词集合几乎一样）的仍然全部展开
+MAX_BUCKET_SIZE = 200
+# 过大的桶里一共不超过这么多对时精确统计没有展开的对数，否则只给上界
+COUNT_MISSED_LIMIT = 5_000_000
+
+_PRIME = np.uint64(4294967311)  # 大于 2^32 的素数
+_STOPWORDS = frozenset(
+    "a an the of to in on for and or but with by at from as is are was were be been it its this that "
+    "after over into about says said say new will would could may can his her their they he she we "
+    "us has have had not than more what how why who".split()
+)
+
+
+def shingles(text: str) -> set[str]:
+    """去停用词后的词集合（同一事件的不同报道措辞差别大，按词比按字符 n-gram 召回高）"""
+    return token_set(normalize_text(text))
+
+
+def token_set(normalized: str) -> set[str]:
+    """同 shingles，输入是已经 normalize_text 过的文本"""
+    return {w for w in normalized.split() if len(w) > 2 and w not in _STOPWORDS}
+
+
+def _hash32(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+def _permutations(num_perm: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    # a < 2^32 - 1：保证 a * h + b 不超出 uint64
+    a = rng.integers(1, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(token_sets: list[set[str]], num_perm: int = NUM_PERM, seed: int = 1) -> np.ndarray:
+    """(n, num_perm) 的 MinHash 签名矩阵；空集合的行全为最大值（不会与任何文章成为候选）"""
+    a, b = _permutations(num_perm, seed)
+    empty = np.iinfo(np.uint64).max
+    sigs = np.full((len(token_sets), num_perm), empty, dtype=np.uint64)
+    for i, tokens in enumerate(token_sets):
+        if not tokens:
+            continue
+        h = np.fromiter((_hash32(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+        sigs[i] = ((np.outer(a, h) + b[:, None]) % _PRIME).min(axis=1)
+    return sigs
+
+
+@lru_cache(maxsize=32)
+def lsh_params(threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM) -> tuple[int, int]:
+    """
+    选择 (bands, rows)，bands × rows ≤ num_perm：
+    最小化「相似度低于 threshold 却成为候选」与「高于 threshold 却漏掉」的概率积分之和
+    """
+    grid = np.linspace(0, 1, 201)
+    step = grid[1] - grid[0]
+    below, above = grid < threshold, grid >= threshold
+    best, best_err = (num_perm, 1), float("inf")
+    for rows in range(1, num_perm + 1):
+        for bands in range(1, num_perm // rows + 1):
+            p = 1 - (1 - grid ** rows) ** bands
+            err = (p[below].sum() + (1 - p[above]).sum()) * step
+            if err < best_err:
+                best, best_err = (bands, rows), err
+    return best
+
+
+def _add_all_pairs(pairs: set[tuple[int, int]], members: list[int]) -> None:
+    for x in range(len(members)):
+        for y in range(x + 1, len(members)):
+            pairs.add((members[x], members[y]))
+
+
+def _split_bucket(pairs: set[tuple[int, int]], blocks: list[np.ndarray], members: list[int],
+                  band: int, stats: dict) -> None:
+    """
+    过大的桶按其他 band 依次再分桶：子桶不超过 MAX_BUCKET_SIZE 时展开；
+    所有 band 都相同的一组（词集合几乎一样）全部展开
+    """
+    stats["oversized_buckets"] += 1
+    expanded = 0
+    groups = [members]
+    for other in list(range(band + 1, len(blocks))) + list(range(band)):
+        block = blocks[other]
+        next_groups = []
+        for group in groups:
+            sub: dict[bytes, list[int]] = defaultdict(list)
+            for i in group:
+                sub[block[i].tobytes()].append(i)
+            for sub_members in sub.values():
+                if len(sub_members) <= MAX_BUCKET_SIZE:
+                    _add_all_pairs(pairs, sub_members)
+                    expanded += len(sub_members) * (len(sub_members) - 1) // 2
+                else:
+                    next_groups.append(sub_members)
+        groups = next_groups
+        if not groups:
+            break
+    for group in groups:
+        _add_all_pairs(pairs, group)
+        expanded += len(group) * (len(group) - 1) // 2
+    # 上界：只在这个 band 上相同的对，可能已经由其他 band 的桶覆盖
+    stats["unexpanded_pairs"] += len(members) * (len(members) - 1) // 2 - expanded
+
+
+def _count_missed(pairs: set[tuple[int, int]], oversized: list[list[int]], n: int) -> int:
+    """过大的桶里最终没有成为候选的对数（跨桶去重）"""
+    keys = []
+    for members in oversized:
+        members = np.asarray(members, dtype=np.int64)
+        x, y = np.triu_indices(len(members), k=1)
+        keys.append(members[x] * n + members[y])
+    keys = np.unique(np.concatenate(keys))
+    found = np.fromiter((i * n + j for i, j in pairs), dtype=np.int64, count=len(pairs))
+    return int((~np.isin(keys, found)).sum())
+
+
+def candidate_pairs(signatures: np.ndarray, threshold: float = DEFAULT_THRESHOLD,
+                    stats: dict | None = None) -> set[tuple[int, int]]:
+    """
+    返回 {(i, j)}，i < j：至少有一个 band 完全相同的行对
+    stats：传入 dict 时累计 {"oversized_buckets": 再分桶的桶数,
+                             "unexpanded_pairs": 这些桶里最终没有成为候选的对数,
+                             "unexpanded_exact": False 表示桶太大、unexpanded_pairs 只是上界}
+    """
+    n, num_perm = signatures.shape
+    bands, rows = lsh_params(threshold, num_perm)
+    stats = {} if stats is None else stats
+    stats.setdefault("oversized_buckets", 0)
+    stats.setdefault("unexpanded_pairs", 0)
+    stats.setdefault("unexpanded_exact", True)
+    bound_before = stats["unexpanded_pairs"]
+    oversized: list[list[int]] = []
+    empty = np.all(signatures == np.iinfo(np.uint64).max, axis=1)
+    blocks = [np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows]) for band in range(bands)]
+    pairs: set[tuple[int, int]] = set()
+    for band, block in enumerate(blocks):
+        buckets: dict[bytes, list[int]] = defaultdict(list)
+        for i in range(n):
+            if not empty[i]:
+                buckets[block[i].tobytes()].append(i)
+        for members in buckets.values():
+            if len(members) > MAX_BUCKET_SIZE:
+                _split_bucket(pairs, blocks, members, band, stats)
+                oversized.append(members)
+            elif len(members) > 1:
+                _add_all_pairs(pairs, members)
+    if oversized:
+        if sum(len(m) * (len(m) - 1) // 2 for m in oversized) <= COUNT_MISSED_LIMIT:
+            stats["unexpanded_pairs"] = bound_before + _count_missed(pairs, oversized, n)
+        else:
+            stats["unexpanded_exact"] = False
+    return pairs
+
+
+def estimated_jaccard(signatures: np.ndarray, i: int, j: int) -> float:
+    return float(np.mean(signatures[i] == signatures[j]))
@@ -0,0 +1,138 @@
+"""
+近似重复 / 通稿检测
+AP、Reuters 的通稿会被 SCMP、Fox 等转载，URL 不同但标题和导语几乎一样。
+在入库时用 SimHash 给「标题 + 导语」做指纹，按 band 分桶找候选，O(n) 标出转载簇，
+避免每份拷贝都单独调用一次分类 API。
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+
+import pandas as pd
+
+from utils import UnionFind
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+SIMHASH_BITS = 64
+# tag_near_duplicates 加的辅助列，分类结果复制完就不再需要（不展示、不导出）
+DUP_COLUMNS = ["DupCluster", "DupRepresentative"]
+# 太短的文本（只有标题、没有导语）指纹不可靠，不参与聚类
+MIN_TOKENS = 6
+
+
+def normalize_text(text: str | None) -> str:
+    """小写、去标点、压缩空格"""
+    if not text:
+        return ""
+    text = _PUNCT_RE.sub(" ", str(text).lower())
+    return " ".join(text.split())
+
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+SHINGLE_SIZE = 5
+
+
+def _features(tokens: list[str]) -> list[str]:
+    # 字符 5-gram：短文本下比按词切分稳定，标点/连接词的小改动只影响少量特征
+    text = " ".join(tokens)
+    return [text[i:i + SHINGLE_SIZE] for i in range(max(len(text) - SHINGLE_SIZE + 1, 1))]
+
+
+def simhash(text: str) -> int | None:
+    """64 位 SimHash；文本过短时返回 None"""
+    return simhash_tokens(normalize_text(text).split())
+
+
+def simhash_tokens(tokens: list[str]) -> int | None:
+    """已归一化的词序列的 SimHash（article_features 复用归一化结果）"""
+    if len(tokens) < MIN_TOKENS:
+        return None
+    weights = [0] * SIMHASH_BITS
+    for feat in _features(tokens):
+        h = _hash64(feat)
+        for bit in range(SIMHASH_BITS):
+            if h >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+    value = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            value |= 1 << bit
+    return value
+
+
+def _hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def cluster_fingerprints(fingerprints: list[int | None], max_distance: int = 5) -> list[int]:
+    """
+    按汉明距离聚类指纹
+
+    把 64 位切成 max_distance + 1 段（鸽巢原理：距离 <= max_distance 的两个指纹至少有一段完全相同），
+    只比较同桶内的指纹，整体接近 O(n)。
+
+    Returns:
+        每个输入对应的簇编号（按首次出现顺序编号）
+    """
+    n = len(fingerprints)
+    uf = UnionFind(n)
+    bands = max_distance + 1
+    width = SIMHASH_BITS // bands
+    mask = (1 << width) - 1
+    buckets: dict[tuple[int, int], list[int]] = {}
+    for i, fp in enumerate(fingerprints):
+        if fp is None:
+            continue
+        for b in range(bands):
+            key = (b, (fp >> (b * width)) & mask)
+            bucket = buckets.setdefault(key, [])
+            for j in bucket:
+                if uf.find(i) != uf.find(j) and _hamming(fp, fingerprints[j]) <= max_distance:
+                    uf.union(i, j)
+            bucket.append(i)
+    return uf.labels()
+
+
+def tag_near_duplicates(df: pd.DataFrame, max_distance: int = 5,
+                        headline_col: str = "Headline", summary_col: str = "Nut Graph") -> pd.DataFrame:
+    """
+    标记转载簇
+
+    Returns:
+        DataFrame，新增两列：
+        - DupCluster: 转载簇编号（单独成簇的文章也有自己的编号）
+        - DupRepresentative: 是否为该簇的代表（每簇第一篇）
+    """
+    if df.empty:
+        return df
+    df = df.copy()
+    if headline_col == "Headline" and summary_col == "Nut Graph":
+        from article_features import features_for
+        fingerprints = [f.simhash for f in features_for(df)]
+    else:
+        texts = (df[headline_col].fillna("").astype(str) + " " + df[summary_col].fillna("").astype(str)).tolist()
+        fingerprints = [simhash(t) for t in texts]
+    labels = cluster_fingerprints(fingerprints, max_distance=max_distance)
+    df["DupCluster"] = labels
+    df["DupRepresentative"] = ~df["DupCluster"].duplicated(keep="first").to_numpy()
+    return df
+
+
+def propagate_from_representatives(df: pd.DataFrame, values: dict, column: str) -> pd.DataFrame:
+    """把代表文章的结果（如分类）复制给同簇的其他文章；values: {行索引: 值}，只包含代表行"""
+    rep_rows = df[df["DupRepresentative"]]
+    by_cluster = {cluster: values.get(idx) for idx, cluster in zip(rep_rows.index, rep_rows["DupCluster"])}
+    df[column] = df["DupCluster"].map(by_cluster)
+    return df
+
+
+def drop_dup_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """去掉 DupCluster / DupRepresentative 辅助列"""
+    return df.drop(columns=DUP_COLUMNS, errors="ignore")
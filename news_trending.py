@@ -3,8 +3,11 @@
 新闻热点榜功能
 识别相似新闻，按类别分组，统计报道数量
 """
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+from collections import Counter, defaultdict
+import json
+import os
 import re
 from difflib import SequenceMatcher
 from typing import List, Tuple, Dict, Optional
@@ -40,7 +43,7 @@ def are_similar_articles_api(
     date2: str = "",
 ) -> Optional[bool]:
     """
-    使用 OpenAI API 判断两篇文章是否相似（同一事件的不同报道）
+    使用 LLM API（经共享的 LLM 网关）判断两篇文章是否相似（同一事件的不同报道）
     
     Returns:
         True: 相似（同一事件）
@@ -48,32 +51,19 @@ def are_similar_articles_api(
         None: API 不可用或失败，使用文本相似度回退
     """
     try:
-        import os
-        from openai import OpenAI
-        
-        # 从环境变量或 Streamlit secrets 获取 API key
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            try:
-                import streamlit as st
-                if hasattr(st, "secrets") and "api" in st.secrets:
-                    api_key = st.secrets.get("api", {}).get("openai_api_key")
-            except:
-                pass
-        
-        if not api_key:
+        from llm_gateway import get_gateway
+        gateway = get_gateway()
+        if not gateway.has_key():
             return None
         
         # 检查预算（使用 api_classifier 的预算控制）
         try:
-            from api_classifier import _budget_allows_call, _record_call
+            from api_classifier import _budget_allows_call
             if not _budget_allows_call():
                 return None
         except ImportError:
             pass
         
-        client = OpenAI(api_key=api_key)
-        
         # 构建改进的 prompt（更好地识别地缘政治相关新闻）
         prompt = f"""You are a news analysis assistant. Determine if these two news articles are about the same event/story, even if reported by different outlets.
 
@@ -106,38 +96,13 @@ Are these two articles about the same event/story? Consider:
 
 Respond with ONLY "yes" or "no", nothing else."""
         
-        # 从环境变量或 Streamlit secrets 获取模型
-        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        try:
-            import streamlit as st
-            if hasattr(st, "secrets") and "api" in st.secrets:
-                model = st.secrets.get("api", {}).get("openai_model", model)
-        except:
-            pass
-        
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a news analysis assistant. Respond with only 'yes' or 'no'."},
-                {"role": "user", "content": prompt}
-            ],
+        result = gateway.chat(
+            prompt,
+            system="You are a news analysis assistant. Respond with only 'yes' or 'no'.",
             temperature=0.1,  # Low temperature for consistent results
-            max_tokens=10
-        )
-        
-        result = response.choices[0].message.content.strip().lower()
-        
-        # 记录 API 调用
-        try:
-            from api_classifier import _record_call
-            _record_call()
-        except:
-            pass
-        
-        # 添加延迟避免 rate limit
-        # Trending news 可能有很多次调用，需要更保守的延迟
-        import time
-        time.sleep(0.2)  # 200ms delay between requests (more conservative for trending)
+            max_tokens=10,
+            purpose="trending_similarity",
+        ).lower()
         
         if "yes" in result:
             return True
@@ -154,7 +119,77 @@ Respond with ONLY "yes" or "no", nothing else."""
         print(f"⚠️ API similarity check failed: {e}")
         return None
 
-def are_similar_articles(row1: pd.Series, row2: pd.Series, threshold: float = 0.7, use_api: bool = True, api_threshold: float = 0.4) -> bool:
+ADJUDICATION_SIZE = 12
+
+def _article_block(row: dict) -> str:
+    return (f"Headline: {row.get('Headline', '')}\n"
+            f"Summary: {str(row.get('Nut Graph', '') or '')[:400]}\n"
+            f"Outlet: {row.get('Outlet', '')}\n"
+            f"Date: {row.get('Date', '')}")
+
+def adjudicate_cluster_api(seed: dict, candidates: List[dict]) -> Optional[List[bool]]:
+    """
+    批量裁决：一个种子文章 + 若干中间地带的候选文章，一次请求判断哪些候选与种子是同一事件
+    
+    Returns:
+        与 candidates 等长的 [True/False, ...]；API 不可用、失败或返回无法解析时为 None
+    """
+    if not candidates:
+        return []
+    try:
+        from llm_gateway import get_gateway
+        gateway = get_gateway()
+        if not gateway.has_key():
+            return None
+        try:
+            from api_classifier import _budget_allows_call
+            if not _budget_allows_call():
+                return None
+        except ImportError:
+            pass
+        
+        numbered = "\n\n".join(f"[{k}]\n{_article_block(row)}" for k, row in enumerate(candidates, 1))
+        prompt = f"""You are a news analysis assistant. Decide which candidate articles report the same event/story as the seed article, even if they come from different outlets, use different wording or focus on different aspects.
+
+Treat articles as the same event when they share the same core event/fact, time period (within a few days), key actors and geopolitical context. Articles that merely share a broad topic (e.g. two unrelated trade stories) are NOT the same event.
+
+Seed article:
+{_article_block(seed)}
+
+Candidate articles:
+{numbered}
+
+Respond with JSON only: {{"same_event": [numbers of the candidates that are the same event as the seed]}}"""
+        raw = gateway.chat(
+            prompt,
+            system="You are a news analysis assistant. Respond with JSON only.",
+            temperature=0.1,
+            max_tokens=10 + 4 * len(candidates),
+            json_mode=True,
+            purpose="trending_cluster",
+            items=len(candidates),
+        )
+        start, end = raw.find("{"), raw.rfind("}")
+        try:
+            data = json.loads(raw[start:end + 1]) if start != -1 and end > start else None
+        except json.JSONDecodeError:
+            data = None
+        numbers = data.get("same_event") if isinstance(data, dict) else None
+        if not isinstance(numbers, list):
+            gateway.record_invalid("trending_cluster")
+            return None
+        chosen = {int(n) for n in numbers if str(n).strip().isdigit()}
+        return [k in chosen for k in range(1, len(candidates) + 1)]
+    
+    except ImportError:
+        return None
+    except Exception as e:
+        print(f"⚠️ API cluster adjudication failed: {e}")
+        return None
+
+def are_similar_articles(row1: pd.Series, row2: pd.Series, threshold: float = 0.7, use_api: bool = True, api_threshold: float = 0.4,
+                         headline_sim: Optional[float] = None, combined_sim: Optional[float] = None,
+                         verdicts=None, defer_api: bool = False, allocator=None) -> Optional[bool]:
     """
     判断两篇文章是否相似（同一事件的不同报道）
     
@@ -165,6 +200,10 @@ def are_similar_articles(row1: pd.Series, row2: pd.Series, threshold: float = 0.
         threshold: 文字相似度阈值（高于此值直接判断为相似）
         use_api: 是否使用 API 判断
         api_threshold: API 筛选阈值（只有文字相似度 > 此值的才用 API 确认）
+        headline_sim, combined_sim: 相似度引擎批量算好的相似度（传入时不再逐对计算）
+        verdicts: 本次运行的 API 判定缓存（verdict_cache.RunVerdicts）；命中或可推断时不调用 API
+        defer_api: 需要 API 确认（且缓存里没有）时不调用 API、返回 None，由调用方批量裁决
+        allocator: 本次运行的 API 配额（trending_budget.ApiAllocator）；用完后按文字相似度判定
     """
     # 提取标题和内容
     headline1 = str(row1.get('Headline', ''))
@@ -178,7 +217,8 @@ def are_similar_articles(row1: pd.Series, row2: pd.Series, threshold: float = 0.
     
     # ============ 混合策略 ============
     # 步骤 1: 先用文字相似度快速筛选
-    headline_sim = similarity_score(headline1, headline2)
+    if headline_sim is None:
+        headline_sim = similarity_score(headline1, headline2)
     
     # 如果标题相似度很低，直接判断为不相似（快速排除）
     if headline_sim < 0.3:
@@ -191,7 +231,8 @@ def are_similar_articles(row1: pd.Series, row2: pd.Series, threshold: float = 0.
     # 计算组合文字相似度
     text1 = f"{headline1} {nut1}"
     text2 = f"{headline2} {nut2}"
-    combined_sim = similarity_score(text1, text2)
+    if combined_sim is None:
+        combined_sim = similarity_score(text1, text2)
     
     # 如果组合相似度很低，直接判断为不相似
     if combined_sim < 0.3:
@@ -205,42 +246,320 @@ def are_similar_articles(row1: pd.Series, row2: pd.Series, threshold: float = 0.
     # 只对"较可能相似"的文章才用 API，进一步减少 API 调用
     # 降低 api_threshold 从 0.45 到 0.40，让更多边界情况使用 API 判断（提高地缘政治新闻识别）
     if use_api and combined_sim >= max(api_threshold, 0.40):
-        api_result = are_similar_articles_api(
-            headline1, nut1, headline2, nut2,
-            outlet1, outlet2, date1, date2
-        )
-        if api_result is not None:
-            return api_result
+        url1 = str(row1.get('URL', '') or '')
+        url2 = str(row2.get('URL', '') or '')
+        cacheable = verdicts is not None and url1 and url2
+        if cacheable:
+            cached = verdicts.lookup(url1, url2)
+            if cached is not None:
+                return cached
+        if defer_api:
+            return None
+        if allocator is None or allocator.take():
+            api_result = are_similar_articles_api(
+                headline1, nut1, headline2, nut2,
+                outlet1, outlet2, date1, date2
+            )
+            if api_result is not None:
+                if cacheable:
+                    verdicts.record(url1, url2, api_result)
+                return api_result
     
     # 步骤 3: 如果 API 不可用或失败，使用文字相似度
     return combined_sim >= threshold
 
-def group_similar_news(df: pd.DataFrame, similarity_threshold: float = 0.7, min_group_size: int = 2, use_api: bool = True) -> pd.DataFrame:
+def _new_lsh_stats() -> dict:
+    return {"candidate_pairs": 0, "oversized_buckets": 0, "unexpanded_pairs": 0, "unexpanded_exact": True}
+
+def _add_lsh_stats(total: dict, stats: dict) -> None:
+    for key in ("candidate_pairs", "oversized_buckets", "unexpanded_pairs"):
+        total[key] += stats.get(key, 0)
+    total["unexpanded_exact"] = total["unexpanded_exact"] and stats.get("unexpanded_exact", True)
+
+def _lsh_summary(stats: dict) -> str:
+    return (f"🪣 LSH: {stats['candidate_pairs']} candidate pair(s), {stats['oversized_buckets']} oversized bucket(s), "
+            f"{'' if stats['unexpanded_exact'] else 'up to '}{stats['unexpanded_pairs']} pair(s) in them not compared")
+
+def _candidate_neighbours(records: List[dict], lsh_threshold: float,
+                          lsh_stats: Optional[dict] = None) -> Dict[int, List[int]]:
+    """MinHash LSH 候选：{i: [j, ...]}（j > i，升序）；lsh_stats 累加候选对数和没有展开的对数"""
+    from article_features import features_for_records
+    from minhash_lsh import candidate_pairs
+    signatures = np.vstack([f.signature for f in features_for_records(records)])
+    neighbours = defaultdict(list)
+    stats = {}
+    pairs = candidate_pairs(signatures, lsh_threshold, stats)
+    if lsh_stats is not None:
+        _add_lsh_stats(lsh_stats, dict(stats, candidate_pairs=len(pairs)))
+    for i, j in pairs:
+        neighbours[i].append(j)
+    for js in neighbours.values():
+        js.sort()
+    return neighbours
+
+def _merge_neighbours(neighbours: Optional[Dict[int, List[int]]], pairs) -> Dict[int, List[int]]:
+    """把额外的候选对并入 {i: [j, ...]}（j > i，升序）"""
+    merged = defaultdict(set)
+    for i, js in (neighbours or {}).items():
+        merged[i].update(js)
+    for i, j in pairs:
+        merged[i].add(j)
+    return {i: sorted(js) for i, js in merged.items()}
+
+def _scored_neighbours(engine, positions: List[int], pairs, threshold: float) -> Dict[int, List[tuple]]:
+    """相似度引擎批量打分后的候选边：{i: [(j, headline_sim, combined_sim), ...]}"""
+    edges = engine.edges(positions, pairs, threshold=threshold)
+    neighbours = defaultdict(list)
+    for i, j, headline_sim, combined_sim in edges.items():
+        neighbours[i].append((j, headline_sim, combined_sim))
+    return neighbours
+
+def _category_neighbours(records: List[dict], engine, positions, candidates: str, lsh_threshold: float,
+                         blocking: str, window_days: int, similarity_threshold: float,
+                         lsh_stats: Optional[dict] = None):
+    """
+    一个类别（分块）的候选边：LSH / 实体分块候选，有相似度引擎时批量打分。
+    Returns: None（两两比较、无引擎）| {i: [j, ...]}（无引擎）| {i: [(j, headline_sim, combined_sim), ...]}
+    """
+    neighbours = _candidate_neighbours(records, lsh_threshold, lsh_stats) if candidates == "lsh" else None
+    if blocking == "entity":
+        from entity_blocking import blocked_pairs
+        neighbours = _merge_neighbours(neighbours, blocked_pairs(records, window_days=window_days))
+    if engine is not None:
+        pairs = [(i, j) for i, js in neighbours.items() for j in js] if neighbours is not None else None
+        neighbours = _scored_neighbours(engine, positions, pairs, similarity_threshold)
+    return neighbours
+
+# 进程池任务只需要这些列（MinHash 签名 / 实体分块的日期窗口）
+WORKER_COLUMNS = ['URL', 'Headline', 'Nut Graph', 'Date']
+# 文章数低于此值的类别在本进程计算：候选生成只要几十毫秒，进程启动和传输 TF-IDF 行反而更慢
+PARALLEL_MIN_ARTICLES = 500
+
+def _category_neighbours_task(task):
+    """进程池任务：一个类别的列数据 + 子引擎 → (候选边（普通 dict，便于回传）, LSH 统计)"""
+    columns, engine, options = task
+    names = list(columns)
+    records = [dict(zip(names, row)) for row in zip(*columns.values())]
+    lsh_stats = _new_lsh_stats()
+    neighbours = _category_neighbours(records, engine, np.arange(len(records)), lsh_stats=lsh_stats, **options)
+    return (dict(neighbours) if neighbours is not None else None), lsh_stats
+
+def _parallel_neighbours(category_groups, engine, workers: int, options: dict,
+                         lsh_stats: Optional[dict] = None) -> Dict[str, object]:
+    """各类别的候选边在进程池里计算，按类别名返回（与完成顺序无关）"""
+    from concurrent.futures import ProcessPoolExecutor
+    tasks, names = [], []
+    for category, category_df in category_groups:
+        if category_df.empty:
+            continue
+        # 只发送需要的列和该类别的 TF-IDF 行，不发送整个 DataFrame
+        columns = {c: category_df[c].tolist() for c in WORKER_COLUMNS if c in category_df.columns}
+        sub_engine = engine.take(category_df.index.to_numpy()) if engine is not None else None
+        tasks.append((columns, sub_engine, options))
+        names.append(category)
+    # 小类别合并成块发送，减少进程间往返；map 按提交顺序返回
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        results = list(pool.map(_category_neighbours_task, tasks, chunksize=chunksize))
+    if lsh_stats is not None:
+        for _, stats in results:
+            _add_lsh_stats(lsh_stats, stats)
+    return {name: neighbours for name, (neighbours, _) in zip(names, results)}
+
+def _load_run_verdicts(df: pd.DataFrame):
+    """API 可用时读入本次文章涉及的已缓存判定；不可用时返回 None"""
+    try:
+        from llm_gateway import get_gateway
+        from verdict_cache import load_verdicts
+        gateway = get_gateway()
+        if not gateway.has_key():
+            return None
+        urls = df['URL'].dropna().astype(str).tolist() if 'URL' in df.columns else []
+        return load_verdicts(urls, gateway.config.model())
+    except ImportError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Trending verdict cache unavailable: {e}")
+        return None
+
+def _run_allocator(api_calls: Optional[int] = None):
+    """本次运行的 API 配额；api_calls 给定时直接使用，否则按剩余日预算和配置分配"""
+    try:
+        from llm_gateway import get_gateway
+        from trending_budget import ApiAllocator, allocate_for_run
+        if not get_gateway().has_key():
+            return None
+        if api_calls is not None:
+            return ApiAllocator(max(0, api_calls))
+        return allocate_for_run()
+    except ImportError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Trending API allocation unavailable: {e}")
+        return None
+
+def _greedy_labels(records: List[dict], others, judge) -> List[int]:
+    """旧的贪心分组：每篇未处理的文章开新组，只和组的第一篇（种子）比较"""
+    labels = [-1] * len(records)
+    label = 0
+    for i in range(len(records)):
+        if labels[i] != -1:
+            continue
+        labels[i] = label
+        for j, headline_sim, combined_sim in others(i):
+            if labels[j] == -1 and judge(i, j, headline_sim, combined_sim):
+                labels[j] = label
+        label += 1
+    return labels
+
+def _union_find_labels(records: List[dict], others, judge, adjudicate=None, value=None) -> List[int]:
+    """
+    并查集聚类：判定为相似的边都合并（传递：A~B、B~C → 同组），结果与行顺序无关。
+    先处理文字相似度高的边；两端已在同一组的边不再判定（省掉这些边的 API 调用）。
+    
+    adjudicate(i, [j, ...]) -> [bool, ...]：批量裁决。给定时 judge 对需要 API 的边返回 None，
+    文字判定全部合并之后，再把仍未连通的中间地带边按种子分批（每批最多 ADJUDICATION_SIZE 篇）一次裁决
+    
+    value(combined_sim, size_a, size_b, outlets_a, outlets_b) -> float：API 配额有限时给出，
+    按期望价值先裁决价值最高的组和边（配额用完后 adjudicate 按文字相似度判定）
+    """
+    from utils import UnionFind
+    edges = [(i, j, headline_sim, combined_sim) for i in range(len(records)) for j, headline_sim, combined_sim in others(i)]
+    edges.sort(key=lambda e: -(e[3] if e[3] is not None else 0.0))
+    uf = UnionFind(len(records))
+    # 每个组的媒体集合（只在按期望价值排序时维护）
+    outlets = {i: frozenset([str(r.get('Outlet', '') or '')]) for i, r in enumerate(records)} if value else None
+    
+    def union(a, b):
+        ra, rb = uf.find(a), uf.find(b)
+        if uf.union(a, b) and outlets is not None:
+            merged = outlets.pop(ra) | outlets.pop(rb)
+            outlets[uf.find(a)] = merged
+    
+    pending = []
+    for i, j, headline_sim, combined_sim in edges:
+        if uf.find(i) == uf.find(j):
+            continue
+        verdict = judge(i, j, headline_sim, combined_sim)
+        if verdict is None:
+            pending.append((i, j, combined_sim))
+        elif verdict:
+            union(i, j)
+    # 在「组」的层面裁决：每次选相邻待裁决组最多的组，组内待裁决边最多的文章当种子，
+    # 每个相邻组只派一篇代表（热门事件的报道被文字判定切成多个碎片时，一次请求合并最多的碎片）
+    rejected = []
+    while pending:
+        different = {(uf.find(a), uf.find(b)) for a, b in rejected}
+        adjacent = defaultdict(dict)
+        open_edges = []
+        for a, b, sim in pending:
+            ra, rb = uf.find(a), uf.find(b)
+            if ra == rb or (ra, rb) in different or (rb, ra) in different:
+                continue
+            open_edges.append((a, b, sim))
+            if value is None:
+                adjacent[ra].setdefault(rb, (a, b, 0.0))
+                adjacent[rb].setdefault(ra, (b, a, 0.0))
+                continue
+            # 每对相邻组保留价值最高的一条边
+            v = value(sim, uf.size[ra], uf.size[rb], outlets[ra], outlets[rb])
+            if v > adjacent[ra].get(rb, (a, b, -1.0))[2]:
+                adjacent[ra][rb] = (a, b, v)
+                adjacent[rb][ra] = (b, a, v)
+        pending = open_edges
+        if not pending:
+            break
+        if value is None:
+            root = max(adjacent, key=lambda r: (len(adjacent[r]), -r))
+            ranked = sorted(adjacent[root].values(), key=lambda e: e[1])
+        else:
+            # 一次请求最多裁决 ADJUDICATION_SIZE 个相邻组：按这些组的价值之和选组
+            def batch_value(r):
+                return sum(sorted((e[2] for e in adjacent[r].values()), reverse=True)[:ADJUDICATION_SIZE])
+            root = max(adjacent, key=lambda r: (batch_value(r), -r))
+            ranked = sorted(adjacent[root].values(), key=lambda e: (-e[2], e[1]))
+        seed = Counter(a for a, _, _ in adjacent[root].values()).most_common(1)[0][0]
+        batch = [b for _, b, _ in ranked][:ADJUDICATION_SIZE]
+        for j, same in zip(batch, adjudicate(seed, batch)):
+            if same:
+                union(seed, j)
+            else:
+                rejected.append((seed, j))
+    return uf.labels()
+
+def group_similar_news(df: pd.DataFrame, similarity_threshold: float = 0.7, min_group_size: int = 2, use_api: bool = True,
+                       candidates: str = "lsh", lsh_threshold: float = 0.05, scorer: str = "sequence",
+                       clustering: str = "union_find", adjudication: str = "batch",
+                       blocking: str = "category", window_days: int = 3,
+                       api_calls: Optional[int] = None, workers: Optional[int] = 1) -> pd.DataFrame:
     """
     将相似新闻分组（按类别分组，然后在每个类别内进行相似度检查）
     
+    Args:
+        candidates: "lsh" = 只比较 MinHash LSH 找出的候选对（接近线性）；"all" = 类别内两两比较
+        lsh_threshold: LSH 的 Jaccard 拐点；越低召回越高、越慢。默认 0.05：bench_trending.py 上
+                       sequence 打分的召回率与两两比较相同（0.15 时低 5 个百分点），仍比两两比较快 7 倍以上
+        scorer: "sequence" = 逐对 SequenceMatcher（默认；0.3 / 0.4 / similarity_threshold 阈值按它标定）；
+                "tfidf" = 相似度引擎批量计算字符 n-gram TF-IDF 余弦相似度并按阈值预筛（快得多）。
+                tfidf 的分数经 sqrt 校准到与 SequenceMatcher 比率相近的尺度，同一组阈值只在合成数据上
+                验证过，尚未在真实文章上重新标定，所以暂不作为默认
+        clustering: "union_find" = 相似边的连通分量（与行顺序无关，开销与边数成正比）；
+                    "greedy" = 只和组内第一篇比较（旧行为）
+        adjudication: "batch" = 中间地带的边按种子分批，一次请求裁决多篇（仅 union_find）；
+                      "pair" = 每条边单独调用 API（旧行为）
+        blocking: "category" = 只在同一 Category 内比较；
+                  "entity" = 跨类别：共享关键实体且日期相差 ≤ window_days 天的文章对
+                  （candidates="lsh" 时再加上全量 LSH 候选），同一事件被分到不同类别也能成组
+        api_calls: 本次运行最多调用 API 的次数；None = 按剩余日预算和配置分配（trending_budget）。
+                   batch 模式下中间地带的边按期望价值排序，配额内的交给 API，其余按文字相似度判定
+        workers: >1 时各类别的候选生成（MinHash 签名、LSH、实体分块）和相似度打分在进程池里并行
+                 （None / 0 = CPU 核数，且不超过 CPU 核数）。TF-IDF 仍在本进程按整次运行统计，结果与单进程完全一致。
+                 只有文章数 ≥ PARALLEL_MIN_ARTICLES 的类别进进程池，这样的类别少于两个、
+                 或只有一个分块（没有 Category 列或 blocking="entity"）时不并行
+    
     Returns:
         DataFrame with 'GroupID' column indicating which articles are similar
     """
     if df.empty:
         return df
     
-    df = df.copy()
-    df['GroupID'] = -1
-    
     # 重置索引以便追踪
     df = df.reset_index(drop=True)
     
     # 先按类别分组，然后在每个类别内进行相似度检查
     # 这样可以确保同一类别内的相似文章被正确分组
-    if 'Category' not in df.columns:
-        # 如果没有类别列，使用全局分组
+    if 'Category' not in df.columns or blocking == "entity":
+        # 如果没有类别列（或按实体分块跨类别比较），使用全局分组
         category_groups = [('All', df)]
     else:
         # 按类别分组
         category_groups = [(cat, df[df['Category'] == cat]) for cat in df['Category'].unique()]
     
     group_id = 0
+    group_ids = np.full(len(df), -1, dtype=np.int64)
+    engine = None
+    if scorer == "tfidf":
+        from similarity_engine import SimilarityEngine
+        engine = SimilarityEngine(df.to_dict("records"))
+    parallel = None
+    lsh_stats = _new_lsh_stats()
+    cpus = os.cpu_count() or 1
+    workers = cpus if workers is None or workers <= 0 else min(workers, cpus)
+    large_groups = [(cat, group) for cat, group in category_groups if len(group) >= PARALLEL_MIN_ARTICLES]
+    if workers > 1 and len(large_groups) > 1:
+        # 大类别的候选生成和打分（CPU 密集）分给进程池；小类别、聚类、缓存和 API 裁决留在本进程
+        parallel = _parallel_neighbours(large_groups, engine, workers, dict(
+            candidates=candidates, lsh_threshold=lsh_threshold, blocking=blocking,
+            window_days=window_days, similarity_threshold=similarity_threshold), lsh_stats)
+    cluster = _union_find_labels if clustering == "union_find" else _greedy_labels
+    verdicts = _load_run_verdicts(df) if use_api else None
+    allocator = _run_allocator(api_calls) if use_api else None
+    value = None
+    if allocator is not None and allocator.limited:
+        from trending_budget import edge_value
+        def value(combined_sim, size_a, size_b, outlets_a, outlets_b):
+            return edge_value(combined_sim, similarity_threshold, size_a, size_b, outlets_a, outlets_b)
+    batched = use_api and clustering == "union_find" and adjudication == "batch"
     
     # 对每个类别分别进行相似度检查
     for category, category_df in category_groups:
@@ -248,36 +567,75 @@ def group_similar_news(df: pd.DataFrame, similarity_threshold: float = 0.7, min_
             continue
         
         # 保存原始索引
-        original_indices = category_df.index.tolist()
-        processed = set()
+        original_indices = category_df.index.to_numpy()
+        records = category_df.to_dict("records")
+        if parallel is not None and category in parallel:
+            neighbours = parallel[category]
+        else:
+            neighbours = _category_neighbours(records, engine, original_indices, candidates, lsh_threshold,
+                                              blocking, window_days, similarity_threshold, lsh_stats)
         
-        # 在该类别内进行相似度检查
-        for i in range(len(category_df)):
-            original_i = original_indices[i]
-            if original_i in processed:
-                continue
-            
-            # 创建新组
-            df.loc[original_i, 'GroupID'] = group_id
-            processed.add(original_i)
-            
-            # 查找相似文章（只在该类别内）
-            for j in range(i + 1, len(category_df)):
-                original_j = original_indices[j]
-                if original_j in processed:
-                    continue
-                
-                if are_similar_articles(
-                    category_df.iloc[i],
-                    category_df.iloc[j],
-                    threshold=similarity_threshold,
-                    use_api=use_api
-                ):
-                    df.loc[original_j, 'GroupID'] = group_id
-                    processed.add(original_j)
-            
-            group_id += 1
+        # 候选边（只在该类别内；LSH / 相似度引擎模式下只看候选边）
+        def others(i):
+            if neighbours is None:
+                return [(j, None, None) for j in range(i + 1, len(records))]
+            if scorer != "tfidf":
+                return [(j, None, None) for j in neighbours.get(i, [])]
+            return neighbours.get(i, [])
+        
+        def judge(i, j, headline_sim, combined_sim):
+            return are_similar_articles(
+                records[i],
+                records[j],
+                threshold=similarity_threshold,
+                use_api=use_api,
+                headline_sim=headline_sim,
+                combined_sim=combined_sim,
+                verdicts=verdicts,
+                defer_api=batched,
+                allocator=allocator,
+            )
+        
+        def adjudicate(i, js):
+            url_i = str(records[i].get('URL', '') or '')
+            urls = {j: str(records[j].get('URL', '') or '') for j in js}
+            # 本轮已裁决的结果可以传递推断（A~B、B≁C → A≁C），这些边不再发给 API
+            known = {}
+            if verdicts is not None and url_i:
+                known = {j: verdicts.lookup(url_i, urls[j]) for j in js if urls[j]}
+            ask = [j for j in js if known.get(j) is None]
+            results = []
+            if ask:
+                # 配额用完：不再调用 API
+                allowed = allocator is None or allocator.take()
+                results = adjudicate_cluster_api(records[i], [records[j] for j in ask]) if allowed else None
+            if results is None:
+                # API 不可用或失败：中间地带按文字相似度判定（低于阈值 → 不相似）
+                results = [False] * len(ask)
+            elif verdicts is not None and url_i:
+                for j, same in zip(ask, results):
+                    if urls[j]:
+                        verdicts.record(url_i, urls[j], same)
+            known.update(zip(ask, results))
+            return [bool(known[j]) for j in js]
+        
+        if batched:
+            labels = _union_find_labels(records, others, judge, adjudicate, value)
+        else:
+            labels = cluster(records, others, judge)
+        labels = np.asarray(labels, dtype=np.int64)
+        group_ids[original_indices] = group_id + labels
+        group_id += int(labels.max()) + 1
     
+    # 一次性写入（不再逐格 df.loc）
+    df['GroupID'] = group_ids
+    if candidates == "lsh":
+        # 过大的桶里没有比较的对会漏掉同一事件的报道，每次运行都记下来
+        print(_lsh_summary(lsh_stats))
+    if verdicts is not None and (verdicts.stats["hits"] or verdicts.stats["inferred"] or verdicts.stats["stored"]):
+        print(verdicts.summary())
+    if allocator is not None and (allocator.limited or allocator.stats["denied"]):
+        print(allocator.summary())
     return df
 
 def generate_trending_rank(df: pd.DataFrame, top_n: int = 3, min_sources: int = 3) -> pd.DataFrame:
@@ -298,6 +656,11 @@ def generate_trending_rank(df: pd.DataFrame, top_n: int = 3, min_sources: int =
     # 按类别和 GroupID 分组
     trending_news = []
     
+    # 跨类别的组（blocking="entity"）只计一次：归入组内文章最多的类别，统计全部成员
+    group_category = {}
+    for group_id, categories in df.groupby('GroupID', sort=False)['Category']:
+        group_category[group_id] = categories.value_counts(dropna=False).index[0]
+    
     for category in df['Category'].unique():
         category_df = df[df['Category'] == category]
         
@@ -305,8 +668,10 @@ def generate_trending_rank(df: pd.DataFrame, top_n: int = 3, min_sources: int =
         for group_id in category_df['GroupID'].unique():
             if group_id == -1:  # 跳过未分组的文章
                 continue
+            if group_category.get(group_id) != category:
+                continue
             
-            group_df = category_df[category_df['GroupID'] == group_id]
+            group_df = df[df['GroupID'] == group_id]
             
             # 至少需要 min_sources 家媒体报道
             if len(group_df) < min_sources:
@@ -0,0 +1,138 @@
+"""
+自适应限流器
+替代固定的 time.sleep(0.15)：按账户实际的 RPM / TPM 节流，
+根据响应头（x-ratelimit-* / anthropic-ratelimit-*）和 429 动态调整，线程安全，供并发分类共用。
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value) -> float | None:
+    """OpenAI 的重置时间形如 "1s" / "6m0s" / "20ms"；Anthropic 是 RFC 3339 时间戳；retry-after 是秒数"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except ValueError:
+        return None
+
+
+def _header_number(headers, *names) -> float | None:
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def _header_duration(headers, *names) -> float | None:
+    for name in names:
+        seconds = _parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+
+class AdaptiveRateLimiter:
+    """
+    请求节流（AIMD）
+
+    - acquire(): 请求前调用，按当前 RPM 排队；剩余 token 不够时等到窗口重置
+    - update(headers): 成功后用响应头校准上限和剩余额度，速率缓慢回升
+    - penalize(retry_after): 遇到 429 时速率减半，并暂停到 retry-after 之后
+    """
+
+    def __init__(self, rpm: float | None = None, min_rpm: float = 10):
+        if rpm is None:
+            try:
+                rpm = float(os.getenv("API_MAX_RPM", "500"))
+            except ValueError:
+                rpm = 500.0
+        self.max_rpm = max(rpm, min_rpm)
+        self.min_rpm = min_rpm
+        self.rpm = self.max_rpm
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._tokens_remaining: float | None = None
+        self._tokens_reset_at = 0.0
+        self.stats = {"requests": 0, "throttled": 0, "waited_s": 0.0}
+
+    def acquire(self, est_tokens: int = 0) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._paused_until)
+            if self._tokens_remaining is not None:
+                if now >= self._tokens_reset_at:
+                    self._tokens_remaining = None
+                elif est_tokens > self._tokens_remaining:
+                    start = max(start, self._tokens_reset_at)
+                    self._tokens_remaining = None
+                else:
+                    self._tokens_remaining -= est_tokens
+            self._next_slot = start + 60.0 / self.rpm
+            self.stats["requests"] += 1
+            wait = start - now
+            if wait > 0:
+                self.stats["waited_s"] += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def update(self, headers) -> None:
+        if not headers:
+            return
+        limit = _header_number(headers, "x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit")
+        remaining = _header_number(headers, "x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining")
+        reset = _header_duration(headers, "x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset")
+        tokens_remaining = _header_number(headers, "x-ratelimit-remaining-tokens", "anthropic-ratelimit-tokens-remaining")
+        tokens_reset = _header_duration(headers, "x-ratelimit-reset-tokens", "anthropic-ratelimit-tokens-reset")
+        with self._lock:
+            now = time.monotonic()
+            if limit:
+                # 留 10% 余量给同一个 key 的其他调用方
+                self.max_rpm = max(limit * 0.9, self.min_rpm)
+            self.rpm = min(self.max_rpm, self.rpm * 1.05 + 1)
+            if remaining is not None and remaining <= 0 and reset:
+                self._paused_until = max(self._paused_until, now + reset)
+            if tokens_remaining is not None and tokens_reset is not None:
+                self._tokens_remaining = tokens_remaining
+                self._tokens_reset_at = now + tokens_reset
+
+    def penalize(self, retry_after: float | None = None) -> None:
+        with self._lock:
+            self.rpm = max(self.min_rpm, self.rpm / 2)
+            pause = retry_after if retry_after is not None else 60.0 / self.rpm
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self.stats["throttled"] += 1
+
+
+def retry_after_from_headers(headers) -> float | None:
+    if not headers:
+        return None
+    ms = _header_number(headers, "retry-after-ms")
+    if ms is not None:
+        return ms / 1000.0
+    return _header_duration(headers, "retry-after")
@@ -0,0 +1,278 @@
+"""
+热点榜相似度引擎（向量化）
+原来的 similarity_score 每次只比较一对字符串（clean_text + SequenceMatcher），
+在 Python 循环里对每个候选对重复清洗、重复计算。这里把一次运行中的所有文章
+一次性向量化成稀疏 TF-IDF 矩阵（字符 3-gram，哈希到固定特征空间，L2 归一化），
+之后：
+
+- 候选对已知（MinHash LSH）时，用 pair_similarities 一次算出所有候选对的余弦相似度
+- 类别内两两比较时，用分块矩阵乘法（block_similarities）只保留高于阈值的元素
+
+标题 / 标题 + 导语两路相似度的 0.3 / 0.4 / 0.7 阈值在 numpy 里批量应用，
+返回的边列表再交给 are_similar_articles（只有中间地带的边才需要 API 确认）。
+
+有 scipy 时使用 scipy.sparse，没有时退回纯 numpy 的 CSR 实现（分块稠密乘法）。
+"""
+from __future__ import annotations
+
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from near_duplicates import normalize_text
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+NGRAM = 3
+HASH_BITS = 20
+BLOCK_SIZE = 512
+PAIR_CHUNK = 50000
+# 批量阈值（与 are_similar_articles 中的逐对阈值一致）
+REJECT_BELOW = 0.3
+API_ABOVE = 0.4
+
+
+def calibrate(cosine: np.ndarray) -> np.ndarray:
+    """
+    余弦相似度 → 与 SequenceMatcher 比率相近的尺度。
+    TF-IDF 余弦整体偏低（同一事件的两个标题约 0.2 ~ 0.6，无关标题接近 0），
+    取平方根后同一事件约 0.45 ~ 0.8、无关标题多在 0.3 以下，0.3 / 0.4 / 0.7 阈值大致保持原意。
+    这个对应关系只在 bench_trending.py 的合成数据上验证过；在真实文章上重新标定之前，
+    group_similar_news 默认仍用 SequenceMatcher（scorer="sequence"）。
+    """
+    return np.sqrt(np.clip(cosine, 0.0, 1.0))
+
+
+def _word_ngrams(word: str) -> list[int]:
+    """词内字符 n-gram（词两端补空格），哈希成整数特征"""
+    mask = (1 << HASH_BITS) - 1
+    padded = f" {word} "
+    return [zlib.crc32(padded[k:k + NGRAM].encode("utf-8")) & mask
+            for k in range(max(len(padded) - NGRAM + 1, 1))]
+
+
+def _ngrams(text: str, cache: dict[str, list[int]], normalized: bool = False) -> list[int]:
+    grams = []
+    for word in (text if normalized else normalize_text(text)).split():
+        hashed = cache.get(word)
+        if hashed is None:
+            hashed = cache[word] = _word_ngrams(word)
+        grams.extend(hashed)
+    return grams
+
+
+class SparseRows:
+    """最小的 CSR 矩阵：indptr / indices / data（每行 indices 升序、不重复）"""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, n_features: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_features = n_features
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def take(self, rows) -> "SparseRows":
+        rows = np.asarray(rows, dtype=np.int64)
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return SparseRows(indptr, self.indices[positions], self.data[positions], self.n_features)
+
+    def dense(self, columns: np.ndarray | None = None) -> np.ndarray:
+        """稠密化；columns 为特征编号 → 稠密列号的映射（只保留子集中出现过的特征）"""
+        width = self.n_features if columns is None else int(columns.max()) + 1
+        out = np.zeros((len(self), width), dtype=np.float32)
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        cols = self.indices if columns is None else columns[self.indices]
+        out[rows, cols] = self.data
+        return out
+
+    def to_scipy(self):
+        return sp.csr_matrix((self.data, self.indices, self.indptr), shape=(len(self), self.n_features))
+
+
+def tfidf_matrix(texts: list[str], cache: dict[str, list[int]] | None = None,
+                 normalized: bool = False) -> SparseRows:
+    """
+    次线性 TF × 平滑 IDF，每行 L2 归一化；空文本是全零行。
+    cache：词 → n-gram 哈希（可跨调用共用）；normalized：texts 已经 normalize_text 过
+    """
+    cache = {} if cache is None else cache
+    rows, feats = [], []
+    for r, text in enumerate(texts):
+        grams = _ngrams(text, cache, normalized)
+        rows.extend([r] * len(grams))
+        feats.extend(grams)
+    n = len(texts)
+    if not feats:
+        return SparseRows(np.zeros(n + 1, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                          np.zeros(0, dtype=np.float32), 1)
+    # 把哈希特征压缩成连续编号，(行, 特征) 去重计数
+    vocab, feat_ids = np.unique(np.asarray(feats, dtype=np.int64), return_inverse=True)
+    keys = np.asarray(rows, dtype=np.int64) * len(vocab) + feat_ids
+    keys, tf = np.unique(keys, return_counts=True)
+    row_ids, indices = np.divmod(keys, len(vocab))
+    df = np.bincount(indices, minlength=len(vocab))
+    idf = np.log((1 + n) / (1 + df)) + 1
+    data = (1 + np.log(tf)) * idf[indices]
+    norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=n))
+    data = (data / norms[row_ids]).astype(np.float32)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_ids, minlength=n), out=indptr[1:])
+    return SparseRows(indptr, indices, data, len(vocab))
+
+
+def pair_similarities(matrix: SparseRows, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """一批行对 (left[k], right[k]) 的余弦相似度（行已归一化，即稀疏点积）"""
+    left = np.asarray(left, dtype=np.int64)
+    right = np.asarray(right, dtype=np.int64)
+    if len(left) == 0:
+        return np.zeros(0, dtype=np.float32)
+    if len(left) > PAIR_CHUNK:
+        # 分块，限制展开后的 (对, 特征) 数组大小
+        return np.concatenate([pair_similarities(matrix, left[k:k + PAIR_CHUNK], right[k:k + PAIR_CHUNK])
+                               for k in range(0, len(left), PAIR_CHUNK)])
+    pair_ids = np.arange(len(left), dtype=np.int64)
+
+    def expand(rows):
+        sub = matrix.take(rows)
+        owners = np.repeat(pair_ids, np.diff(sub.indptr))
+        return owners * matrix.n_features + sub.indices, sub.data
+
+    keys_l, data_l = expand(left)
+    keys_r, data_r = expand(right)
+    # 同一对内 indices 不重复，(对编号, 特征) 是唯一键
+    _, pos_l, pos_r = np.intersect1d(keys_l, keys_r, assume_unique=True, return_indices=True)
+    owners = keys_l[pos_l] // matrix.n_features
+    return np.bincount(owners, weights=data_l[pos_l] * data_r[pos_r],
+                       minlength=len(left)).astype(np.float32)
+
+
+def block_similarities(matrix: SparseRows, rows: np.ndarray, threshold: float,
+                       block_size: int = BLOCK_SIZE) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    rows 内两两的余弦相似度 ≥ threshold 的行对（i < j 按 rows 中的位置），分块计算，
+    返回 (i, j, sim)，i / j 是 rows 中的位置
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    sub = matrix.take(rows)
+    out_i, out_j, out_s = [], [], []
+    if sp is not None:
+        x = sub.to_scipy()
+        xt = x.T.tocsc()
+        for start in range(0, len(sub), block_size):
+            block = (x[start:start + block_size] @ xt[:, start:]).tocoo()
+            i = block.row + start
+            j = block.col + start
+            keep = (block.data >= threshold) & (i < j)
+            out_i.append(i[keep])
+            out_j.append(j[keep])
+            out_s.append(block.data[keep])
+    else:
+        # 只保留子集中出现过的特征，稠密块的宽度 = 子集词表大小
+        present = np.unique(sub.indices)
+        columns = np.zeros(matrix.n_features, dtype=np.int64)
+        columns[present] = np.arange(len(present))
+        starts = list(range(0, len(sub), block_size))
+        blocks = {}
+
+        def dense_block(start):
+            if start not in blocks:
+                blocks[start] = sub.take(np.arange(start, min(start + block_size, len(sub)))).dense(columns)
+            return blocks[start]
+
+        for a, start_a in enumerate(starts):
+            left = dense_block(start_a)
+            for start_b in starts[a:]:
+                sims = left @ dense_block(start_b).T
+                bi, bj = np.nonzero(sims >= threshold)
+                keep = bi + start_a < bj + start_b
+                bi, bj = bi[keep], bj[keep]
+                out_i.append(bi + start_a)
+                out_j.append(bj + start_b)
+                out_s.append(sims[bi, bj])
+            blocks.pop(start_a, None)
+    if not out_i:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    return (np.concatenate(out_i).astype(np.int64), np.concatenate(out_j).astype(np.int64),
+            np.concatenate(out_s).astype(np.float32))
+
+
+@dataclass
+class SimilarityEdges:
+    """一个类别内的候选边（位置编号），附带两路相似度与批量判定结果"""
+    left: np.ndarray
+    right: np.ndarray
+    headline_sim: np.ndarray
+    combined_sim: np.ndarray
+    similar: np.ndarray       # 文字相似度已足够判断为同一事件
+    borderline: np.ndarray    # 中间地带：需要 API 确认（否则按文字相似度判定）
+
+    def __len__(self) -> int:
+        return len(self.left)
+
+    def items(self):
+        """[(i, j, headline_sim, combined_sim), ...]，供逐边调用 are_similar_articles"""
+        return list(zip(self.left.tolist(), self.right.tolist(),
+                        self.headline_sim.tolist(), self.combined_sim.tolist()))
+
+
+class SimilarityEngine:
+    """
+    一次运行的所有文章只向量化一次：
+        engine = SimilarityEngine(records)
+        edges = engine.edges(positions, pairs=None, threshold=0.7)
+    """
+
+    def __init__(self, records: list[dict]):
+        from article_features import features_for_records
+        features = features_for_records(records)
+        cache: dict[str, list[int]] = {}
+        self.headlines = tfidf_matrix([f.headline_norm for f in features], cache, normalized=True)
+        self.combined = tfidf_matrix([f.text_norm for f in features], cache, normalized=True)
+
+    def take(self, positions) -> "SimilarityEngine":
+        """只含这些文章的子引擎（IDF 仍按整次运行统计；体积小，可发给进程池）"""
+        sub = SimilarityEngine.__new__(SimilarityEngine)
+        sub.headlines = self.headlines.take(positions)
+        sub.combined = self.combined.take(positions)
+        return sub
+
+    def edges(self, positions, pairs=None, threshold: float = 0.7,
+              api_threshold: float = API_ABOVE) -> SimilarityEdges:
+        """
+        positions: 本类别文章在 records 中的编号；pairs: [(i, j)]（positions 内的位置），
+        None 时类别内两两比较（分块矩阵乘法）。
+        丢弃标题或组合相似度 < 0.3 的边；其余按阈值批量标记 similar / borderline。
+        返回的相似度已经过 calibrate，可直接传给 are_similar_articles。
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if pairs is None:
+            # 阈值在余弦尺度上是 REJECT_BELOW²（见 calibrate）
+            left, right, cosine = block_similarities(self.headlines, positions, REJECT_BELOW ** 2)
+            headline_sim = calibrate(cosine)
+        else:
+            pairs = np.asarray(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+            left, right = pairs[:, 0], pairs[:, 1]
+            headline_sim = calibrate(pair_similarities(self.headlines, positions[left], positions[right]))
+            keep = headline_sim >= REJECT_BELOW
+            left, right, headline_sim = left[keep], right[keep], headline_sim[keep]
+        combined_sim = calibrate(pair_similarities(self.combined, positions[left], positions[right]))
+        keep = (headline_sim >= threshold) | (combined_sim >= REJECT_BELOW)
+        left, right = left[keep], right[keep]
+        headline_sim, combined_sim = headline_sim[keep], combined_sim[keep]
+        order = np.lexsort((right, left))
+        left, right = left[order], right[order]
+        headline_sim, combined_sim = headline_sim[order], combined_sim[order]
+        similar = (headline_sim >= threshold) | (combined_sim >= threshold)
+        borderline = ~similar & (combined_sim >= max(api_threshold, API_ABOVE))
+        return SimilarityEdges(left, right, headline_sim, combined_sim, similar, borderline)
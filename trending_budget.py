@@ -0,0 +1,83 @@
+"""
+热点榜每次运行的 API 配额
+are_similar_articles 对每个中间地带（0.40 ≤ 组合相似度 < 阈值）的文章对都调用 API，没有上限：
+日期范围一大，热点榜就能在分类之前把当天预算花光。这里给每次运行分配固定的调用次数：
+
+- 配额 = 剩余日预算 × trending_budget_share ÷ cost_per_call，再受 trending_max_calls 限制
+  （没有日预算且没有固定上限时不限）
+- 中间地带的边按期望价值排序，只有排在前面的边在配额内交给 API，其余按文字相似度判定（低于阈值 → 不相似）
+- 缓存命中 / 传递推断出的判定不占配额
+
+期望价值 = 接近阈值的程度 × 合并的规模 × 新增的媒体：
+离阈值越近越可能是同一事件；合并两个大组比合并两篇散稿对热点榜影响大；
+同一家媒体的两篇稿子合并不增加「几家媒体报道」。
+
+用法：
+    allocator = allocate_for_run()
+    allocator.take()                  # True = 可以调用一次 API（并扣减配额）
+    edge_value(0.62, 0.7, 3, 1, {"Reuters", "AP"}, {"FT"})
+"""
+from __future__ import annotations
+
+import math
+
+# 中间地带的下沿（与 are_similar_articles 的 api_threshold 一致）
+API_FLOOR = 0.40
+
+
+def edge_value(combined_sim: float | None, threshold: float, size_a: int = 1, size_b: int = 1,
+               outlets_a: set | frozenset = frozenset(), outlets_b: set | frozenset = frozenset(),
+               api_floor: float = API_FLOOR) -> float:
+    """一条中间地带的边交给 API 的期望价值（越大越值得）"""
+    if combined_sim is None:
+        closeness = 0.5
+    else:
+        span = max(threshold - api_floor, 1e-6)
+        closeness = min(1.0, max(0.0, (combined_sim - api_floor) / span))
+    impact = math.log2(1 + size_a + size_b)
+    gained = len(outlets_a | outlets_b) - max(len(outlets_a), len(outlets_b))
+    # 新增媒体只做小幅加权：大组通常已经覆盖了大部分媒体，重罚会让大事件的合并排到后面
+    return (0.05 + closeness) * impact * (1 + 0.25 * gained)
+
+
+class ApiAllocator:
+    """一次运行的调用配额；calls=None 表示不限"""
+
+    def __init__(self, calls: int | None = None):
+        self.calls = calls
+        self.stats = {"granted": 0, "denied": 0}
+
+    @property
+    def limited(self) -> bool:
+        return self.calls is not None
+
+    @property
+    def remaining(self) -> int | None:
+        return None if self.calls is None else max(0, self.calls - self.stats["granted"])
+
+    def take(self, calls: int = 1) -> bool:
+        if self.calls is not None and self.stats["granted"] + calls > self.calls:
+            self.stats["denied"] += calls
+            return False
+        self.stats["granted"] += calls
+        return True
+
+    def summary(self) -> str:
+        cap = "unlimited" if self.calls is None else str(self.calls)
+        return (f"🎯 Trending API allocation: {self.stats['granted']}/{cap} calls used, "
+                f"{self.stats['denied']} left to text similarity")
+
+
+def allocate_for_run(config=None) -> ApiAllocator:
+    """按剩余日预算和配置算出本次运行的配额"""
+    if config is None:
+        from llm_gateway import get_gateway
+        config = get_gateway().config
+    calls = None
+    if config.daily_budget > 0:
+        from usage_ledger import get_ledger
+        remaining = max(0.0, config.daily_budget - get_ledger().cost_today())
+        calls = int(remaining * config.trending_budget_share / config.cost_per_call)
+    if config.trending_max_calls > 0:
+        calls = config.trending_max_calls if calls is None else min(calls, config.trending_max_calls)
+    return ApiAllocator(calls)
@@ -0,0 +1,324 @@
+"""
+热点榜聚类持久化（SQLite），跨运行增量更新
+原来每次渲染都对选中的日期范围从头跑 group_similar_news + generate_trending_rank。
+这里把聚类结果存下来：
+
+- clusters：类别、代表标题 / URL、first_seen / last_seen（文章日期）、文章数、媒体集合
+- members：每篇文章属于哪个簇，附带标题 / 导语 / 媒体 / 日期和 MinHash 签名
+
+新文章只和「最近活跃的簇」里被 MinHash LSH 选中的成员（锚点）一起跑 group_similar_news：
+与锚点同组的新文章并入锚点所在的簇（同组含多个簇的锚点时合并这些簇），其余新建簇。
+任意日期范围的热点榜变成对 members 的查询，打开「本周」只需要处理上次运行之后的新文章。
+已入库的文章如果类别 / 标题 / 导语变了（重新分类、人工更正），就地更新；
+按类别分块时类别变了的文章移出原簇，和新文章一起重新分组。
+
+用法：
+    store = get_trending_store()
+    store.update(df, similarity_threshold=0.55, use_api=True)
+    trending_df = store.trending_rank(start_date, end_date, urls=df["URL"], top_n=3, min_sources=2)
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from article_features import features_for
+from minhash_lsh import DEFAULT_THRESHOLD, candidate_pairs
+from utils import url_id
+
+TRENDING_STORE_PATH = Path(
+    os.getenv(
+        "TRENDING_STORE_PATH",
+        Path.home() / ".us_china_picker" / "trending_clusters.sqlite3"
+    )
+)
+
+# 新文章只与 last_seen 在此天数以内的簇比较
+ASSIGN_WINDOW_DAYS = 7
+# 每个簇最多带几个锚点参与分组（最近的成员优先）
+MAX_ANCHORS_PER_CLUSTER = 5
+
+
+def _day(value) -> str | None:
+    parsed = pd.to_datetime(value, errors="coerce")
+    if pd.isna(parsed):
+        return None
+    return parsed.strftime("%Y-%m-%d")
+
+
+def _text(value) -> str:
+    return "" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+
+
+class TrendingStore:
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else TRENDING_STORE_PATH
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS clusters ("
+                " cluster_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " category TEXT,"
+                " headline TEXT,"
+                " url TEXT,"
+                " first_seen TEXT,"
+                " last_seen TEXT,"
+                " size INTEGER,"
+                " outlets TEXT,"
+                " updated_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS members ("
+                " url_id TEXT PRIMARY KEY,"
+                " cluster_id INTEGER NOT NULL,"
+                " url TEXT,"
+                " category TEXT,"
+                " headline TEXT,"
+                " nut_graph TEXT,"
+                " outlet TEXT,"
+                " day TEXT,"
+                " signature BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS members_cluster ON members (cluster_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS members_day ON members (day)")
+            conn.execute("CREATE INDEX IF NOT EXISTS clusters_last_seen ON clusters (category, last_seen)")
+            self._conn = conn
+        return self._conn
+
+    # ------------------------------------------------------------------ 更新
+
+    def _known_members(self, conn: sqlite3.Connection, ids: list[str]) -> dict[str, tuple]:
+        """{url_id: (cluster_id, category, headline, nut_graph)}"""
+        known = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            known.update((r[0], r[1:]) for r in conn.execute(
+                "SELECT url_id, cluster_id, category, headline, nut_graph FROM members"
+                f" WHERE url_id IN ({placeholders})", chunk))
+        return known
+
+    def _refresh_known(self, conn: sqlite3.Connection, df: pd.DataFrame, known: dict[str, tuple],
+                       blocking: str, stats: dict) -> None:
+        """
+        已入库文章的类别 / 标题 / 导语有变化时更新 members；
+        blocking="category" 时类别变了的文章从 known 和 members 中移除，随后当作新文章重新分组
+        """
+        fields = [(k, col) for k, col in enumerate(("Category", "Headline", "Nut Graph"), start=1)
+                  if col in df.columns]
+        edited, moved = [], []
+        for idx, uid in zip(df.index, df["url_id"]):
+            stored = known.get(uid)
+            if stored is None:
+                continue
+            changed = {col for k, col in fields if _text(df.at[idx, col]) != (stored[k] or "")}
+            if not changed:
+                continue
+            if "Category" in changed and blocking == "category":
+                moved.append(uid)
+            else:
+                edited.append(idx)
+        if not edited and not moved:
+            return
+        touched = {known[uid][0] for uid in moved} | {known[df.at[idx, "url_id"]][0] for idx in edited}
+        with conn:
+            if edited:
+                rows = df.loc[edited]
+                signatures = [f.signature for f in features_for(rows)]
+                conn.executemany(
+                    "UPDATE members SET category = ?, headline = ?, nut_graph = ?, signature = ? WHERE url_id = ?",
+                    [(_text(row.get("Category", known[row["url_id"]][1])), _text(row.get("Headline")),
+                      _text(row.get("Nut Graph")), sig.tobytes(), row["url_id"])
+                     for (_, row), sig in zip(rows.iterrows(), signatures)],
+                )
+            conn.executemany("DELETE FROM members WHERE url_id = ?", [(uid,) for uid in moved])
+            self._refresh_clusters(conn, touched, time.time())
+        for uid in moved:
+            del known[uid]
+        stats["refreshed"], stats["reclustered"] = len(edited), len(moved)
+
+    def _anchors(self, conn: sqlite3.Connection, new: pd.DataFrame, signatures: np.ndarray,
+                 lsh_threshold: float, blocking: str = "category") -> pd.DataFrame:
+        """最近活跃簇里与新文章是 LSH 候选的成员（blocking="entity" 时不限同一类别）"""
+        days = [d for d in new["_day"] if d]
+        if not days:
+            return pd.DataFrame()
+        since = (pd.Timestamp(min(days)) - pd.Timedelta(days=ASSIGN_WINDOW_DAYS)).strftime("%Y-%m-%d")
+        by_category = "Category" in new.columns and blocking == "category"
+        categories = sorted(new["Category"].astype(str).unique()) if by_category else []
+        query = ("SELECT m.url_id, m.cluster_id, m.url, m.category, m.headline, m.nut_graph, m.outlet, m.day,"
+                 " m.signature FROM members m JOIN clusters c ON c.cluster_id = m.cluster_id"
+                 " WHERE c.last_seen >= ?")
+        params: list = [since]
+        if categories:
+            query += f" AND m.category IN ({','.join('?' * len(categories))})"
+            params += categories
+        rows = conn.execute(query + " ORDER BY m.day DESC", params).fetchall()
+        if not rows:
+            return pd.DataFrame()
+        members = pd.DataFrame(rows, columns=["url_id", "cluster_id", "URL", "Category", "Headline",
+                                              "Nut Graph", "Outlet", "_day", "signature"])
+        member_sigs = np.vstack([np.frombuffer(s, dtype=np.uint64) for s in members["signature"]])
+        stacked = np.vstack([signatures, member_sigs])
+        n_new = len(new)
+        new_categories = new["Category"].astype(str).to_numpy() if by_category else None
+        hit = set()
+        for i, j in candidate_pairs(stacked, lsh_threshold):
+            if i < n_new <= j:
+                m = j - n_new
+                if new_categories is None or new_categories[i] == members.at[m, "Category"]:
+                    hit.add(m)
+        anchors = members.loc[sorted(hit)]
+        anchors = anchors.groupby("cluster_id", sort=False).head(MAX_ANCHORS_PER_CLUSTER)
+        return anchors.drop(columns=["signature"]).rename(columns={"_day": "Date"})
+
+    def update(self, df: pd.DataFrame, similarity_threshold: float = 0.7, use_api: bool = True,
+               lsh_threshold: float = DEFAULT_THRESHOLD, blocking: str = "category", workers: int = 1,
+               scorer: str = "sequence") -> dict:
+        """
+        把 df 中还没入库的文章分配到已有簇或新建簇
+
+        Returns:
+            {"new": 新文章数（含重新分组的文章）, "anchors": 参与分组的已入库文章数,
+             "joined": 并入已有簇的新文章数, "clusters_created": n, "clusters_merged": m,
+             "refreshed": 就地更新类别 / 标题 / 导语的已入库文章数, "reclustered": 因类别变化重新分组的文章数}
+        """
+        from news_trending import group_similar_news
+
+        stats = {"new": 0, "anchors": 0, "joined": 0, "clusters_created": 0, "clusters_merged": 0,
+                 "refreshed": 0, "reclustered": 0}
+        if df.empty or "URL" not in df.columns:
+            return stats
+        df = df[df["URL"].notna() & (df["URL"].astype(str) != "")].copy()
+        df["url_id"] = [url_id(str(u)) for u in df["URL"]]
+        df = df.drop_duplicates("url_id")
+        with self._lock:
+            conn = self._connect()
+            known = self._known_members(conn, df["url_id"].tolist())
+            self._refresh_known(conn, df, known, blocking, stats)
+            new = df[~df["url_id"].isin(known)].reset_index(drop=True)
+            if new.empty:
+                return stats
+            new["_day"] = [_day(d) for d in new.get("Date", pd.Series([None] * len(new)))]
+            signatures = np.vstack([f.signature for f in features_for(new)])
+            anchors = self._anchors(conn, new, signatures, lsh_threshold, blocking)
+            stats["new"], stats["anchors"] = len(new), len(anchors)
+
+            batch = new.drop(columns=["_day"]).assign(cluster_id=-1)
+            if not anchors.empty:
+                batch = pd.concat([batch, anchors], ignore_index=True)
+            grouped = group_similar_news(batch, similarity_threshold=similarity_threshold, use_api=use_api,
+                                         lsh_threshold=lsh_threshold, blocking=blocking, workers=workers,
+                                         scorer=scorer)
+
+            now = time.time()
+            touched: set[int] = set()
+            assignment: dict[int, int] = {}
+            with conn:
+                for _, group in grouped.groupby("GroupID", sort=True):
+                    existing = sorted(int(c) for c in group["cluster_id"].unique() if c != -1)
+                    if existing:
+                        target = existing[0]
+                        # 同组含多个已有簇的锚点：合并到编号最小的簇
+                        for other in existing[1:]:
+                            conn.execute("UPDATE members SET cluster_id = ? WHERE cluster_id = ?", (target, other))
+                            conn.execute("DELETE FROM clusters WHERE cluster_id = ?", (other,))
+                            stats["clusters_merged"] += 1
+                        stats["joined"] += int((group["cluster_id"] == -1).sum())
+                    else:
+                        first = group.iloc[0]
+                        target = conn.execute(
+                            "INSERT INTO clusters (category, updated_at) VALUES (?, ?)",
+                            (_text(first.get("Category")), now),
+                        ).lastrowid
+                        stats["clusters_created"] += 1
+                    touched.add(target)
+                    for uid in group.loc[group["cluster_id"] == -1, "url_id"]:
+                        assignment[uid] = target
+                rows = []
+                for k, row in new.iterrows():
+                    rows.append((row["url_id"], assignment[row["url_id"]], _text(row.get("URL")),
+                                 _text(row.get("Category")), _text(row.get("Headline")),
+                                 _text(row.get("Nut Graph")), _text(row.get("Outlet")), row["_day"],
+                                 signatures[k].tobytes()))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO members (url_id, cluster_id, url, category, headline, nut_graph,"
+                    " outlet, day, signature) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._refresh_clusters(conn, touched, now)
+        return stats
+
+    def _refresh_clusters(self, conn: sqlite3.Connection, cluster_ids: set[int], now: float) -> None:
+        """重算簇的汇总字段：代表文章（最早的一篇）、first/last_seen、文章数、媒体集合"""
+        for cid in cluster_ids:
+            rows = conn.execute(
+                "SELECT headline, url, day, outlet FROM members WHERE cluster_id = ?"
+                " ORDER BY day IS NULL, day, rowid", (cid,)
+            ).fetchall()
+            if not rows:
+                # 成员都移走了（类别变化后重新分组）
+                conn.execute("DELETE FROM clusters WHERE cluster_id = ?", (cid,))
+                continue
+            days = [r[2] for r in rows if r[2]]
+            outlets = sorted({r[3] for r in rows if r[3]})
+            conn.execute(
+                "UPDATE clusters SET headline = ?, url = ?, first_seen = ?, last_seen = ?, size = ?,"
+                " outlets = ?, updated_at = ? WHERE cluster_id = ?",
+                (rows[0][0], rows[0][1], min(days) if days else None, max(days) if days else None,
+                 len(rows), json.dumps(outlets, ensure_ascii=False), now, cid),
+            )
+
+    # ------------------------------------------------------------------ 查询
+
+    def members(self, start=None, end=None, urls=None) -> pd.DataFrame:
+        """日期范围内（含两端）的成员；urls 进一步限定为这些文章（例如当前页面筛选后的结果）"""
+        query = "SELECT url_id, cluster_id, url, category, headline, outlet, day FROM members WHERE 1 = 1"
+        params: list = []
+        if start is not None:
+            query += " AND day >= ?"
+            params.append(_day(start))
+        if end is not None:
+            query += " AND day <= ?"
+            params.append(_day(end))
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        result = pd.DataFrame(rows, columns=["url_id", "GroupID", "URL", "Category", "Headline", "Outlet", "Date"])
+        if urls is not None:
+            wanted = {url_id(str(u)) for u in urls if isinstance(u, str) and u}
+            result = result[result["url_id"].isin(wanted)]
+        return result
+
+    def trending_rank(self, start=None, end=None, urls=None, top_n: int = 3, min_sources: int = 3) -> pd.DataFrame:
+        """与 news_trending.generate_trending_rank 相同的输出格式（GroupID = 持久化的簇编号）"""
+        from news_trending import generate_trending_rank
+        members = self.members(start, end, urls)
+        if members.empty:
+            return pd.DataFrame()
+        # 代表标题用簇里最早的一篇
+        members = members.sort_values(["GroupID", "Date"], na_position="last", kind="stable")
+        return generate_trending_rank(members.drop(columns=["url_id"]), top_n=top_n, min_sources=min_sources)
+
+
+_default_store: TrendingStore | None = None
+
+
+def get_trending_store() -> TrendingStore:
+    """进程内共用一个连接"""
+    global _default_store
+    if _default_store is None:
+        _default_store = TrendingStore()
+    return _default_store
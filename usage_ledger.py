@@ -0,0 +1,291 @@
+"""
+API 用量账本（SQLite）
+按天 × 模型累计请求数、处理的文章数、prompt / completion / cached token 和按模型单价计算的费用。
+
+- 记录先进内存计数器，每 FLUSH_INTERVAL 秒或每 FLUSH_EVERY 次请求批量 upsert 一次（进程退出时也会写盘）
+- SQLite 事务保证多线程 / 多进程同时写入不丢数据
+- 预算检查读内存中的「今日已入库费用 + 未入库增量」，O(1)；每 REFRESH_INTERVAL 秒从库里刷新一次，
+  以看到其他进程（如每日采集任务）产生的用量
+- 旧版 api_usage.json（{日期: 调用次数}）首次打开时自动导入
+- 并发请求发出前用 reserve() 预占预估费用（锁内检查 + 占用），返回后 release()：
+  同时在途的请求不会都通过同一次预算检查
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+USAGE_DB_PATH = Path(
+    os.getenv(
+        "API_USAGE_DB_PATH",
+        Path.home() / ".us_china_picker" / "api_usage.sqlite3"
+    )
+)
+LEGACY_USAGE_PATH = Path(
+    os.getenv(
+        "API_USAGE_TRACK_PATH",
+        Path.home() / ".us_china_picker" / "api_usage.json"
+    )
+)
+
+FLUSH_INTERVAL = 5.0
+FLUSH_EVERY = 20
+REFRESH_INTERVAL = 30.0
+
+# 美元 / 百万 token：(input, cached input, output)；按模型名前缀匹配，越具体的写在越前面
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+    "claude-3-haiku": (0.25, 0.03, 1.25),
+    "claude-3-5-haiku": (0.80, 0.08, 4.00),
+    "claude-3-5-sonnet": (3.00, 0.30, 15.00),
+    "claude-3-7-sonnet": (3.00, 0.30, 15.00),
+}
+
+
+def model_price(model: str) -> tuple[float, float, float] | None:
+    model = (model or "").lower()
+    for prefix, price in MODEL_PRICING.items():
+        if model.startswith(prefix):
+            return price
+    return None
+
+
+def token_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float | None:
+    """按单价计算一次请求的费用；未知模型返回 None"""
+    price = model_price(model)
+    if price is None:
+        return None
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * price[0] + cached_tokens * price[1] + completion_tokens * price[2]) / 1_000_000
+
+
+_FIELDS = ("calls", "items", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd")
+
+
+class UsageLedger:
+    def __init__(self, path: Path | None = None, legacy_path: Path | None = None,
+                 legacy_cost_per_call: float = 0.0003):
+        self.path = Path(path) if path else USAGE_DB_PATH
+        self.legacy_path = Path(legacy_path) if legacy_path else LEGACY_USAGE_PATH
+        self.legacy_cost_per_call = legacy_cost_per_call
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        # {(day, model): [calls, items, prompt, completion, cached, cost]}
+        self._pending: dict[tuple[str, str], list] = {}
+        self._pending_records = 0
+        self._last_flush = time.monotonic()
+        self._last_refresh = 0.0
+        self._day = ""
+        self._stored_today = dict.fromkeys(_FIELDS, 0)
+        # 已预占、请求尚未返回的预估费用
+        self._reserved = 0.0
+        atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self._conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                with conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS daily_usage ("
+                        " day TEXT NOT NULL, model TEXT NOT NULL,"
+                        " calls INTEGER NOT NULL DEFAULT 0, items INTEGER NOT NULL DEFAULT 0,"
+                        " prompt_tokens INTEGER NOT NULL DEFAULT 0, completion_tokens INTEGER NOT NULL DEFAULT 0,"
+                        " cached_tokens INTEGER NOT NULL DEFAULT 0, cost_usd REAL NOT NULL DEFAULT 0,"
+                        " PRIMARY KEY (day, model))"
+                    )
+                    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                self._conn = conn
+                self._migrate_legacy()
+            except sqlite3.Error as e:
+                print(f"⚠️ API usage ledger unavailable: {e}")
+                return None
+        return self._conn
+
+    def _migrate_legacy(self) -> None:
+        """导入旧版 api_usage.json（只按调用次数记录，费用按 cost_per_call 估算）"""
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_imported'").fetchone():
+            return
+        rows = []
+        if self.legacy_path.exists():
+            try:
+                with self.legacy_path.open("r", encoding="utf-8") as f:
+                    data = json.load(f)
+                rows = [(day, "legacy", int(calls), int(calls), calls * self.legacy_cost_per_call)
+                        for day, calls in data.items() if isinstance(calls, (int, float))]
+            except Exception as e:
+                print(f"⚠️ Could not import legacy API usage file: {e}")
+        with conn:
+            # 另一个进程可能刚导入过，INSERT OR IGNORE meta 作为互斥标记
+            cur = conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                               (str(self.legacy_path),))
+            if cur.rowcount and rows:
+                conn.executemany(
+                    "INSERT INTO daily_usage (day, model, calls, items, cost_usd) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(day, model) DO UPDATE SET calls = calls + excluded.calls,"
+                    " items = items + excluded.items, cost_usd = cost_usd + excluded.cost_usd",
+                    rows,
+                )
+
+    def record(self, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               cached_tokens: int = 0, calls: int = 1, items: int = 1,
+               fallback_cost_per_call: float | None = None, price_factor: float = 1.0) -> float:
+        """
+        记录一次（或 calls 次）请求，返回本次费用
+
+        未知模型（没有单价）或没有 token 信息时，按 fallback_cost_per_call × items 估算
+        price_factor: 按 token 计费时的折扣（Batch API 为 0.5）
+        """
+        cost = token_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+        if cost is not None:
+            cost *= price_factor
+        if cost is None or (prompt_tokens == 0 and completion_tokens == 0):
+            cost = (fallback_cost_per_call if fallback_cost_per_call is not None
+                    else self.legacy_cost_per_call) * items
+        day = date.today().isoformat()
+        with self._lock:
+            acc = self._pending.setdefault((day, model or "unknown"), [0, 0, 0, 0, 0, 0.0])
+            for i, v in enumerate((calls, items, prompt_tokens, completion_tokens, cached_tokens, cost)):
+                acc[i] += v
+            self._pending_records += 1
+            due = (self._pending_records >= FLUSH_EVERY
+                   or time.monotonic() - self._last_flush >= FLUSH_INTERVAL)
+        if due:
+            self.flush()
+        return cost
+
+    def flush(self) -> None:
+        """未入库的增量一次性 upsert（单个事务）"""
+        with self._lock:
+            if not self._pending:
+                self._last_flush = time.monotonic()
+                return
+            conn = self._connect()
+            if conn is None:
+                return
+            rows = [(day, model, *vals) for (day, model), vals in self._pending.items()]
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO daily_usage (day, model, calls, items, prompt_tokens, completion_tokens,"
+                        " cached_tokens, cost_usd) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT(day, model) DO UPDATE SET"
+                        " calls = calls + excluded.calls, items = items + excluded.items,"
+                        " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+                        " completion_tokens = completion_tokens + excluded.completion_tokens,"
+                        " cached_tokens = cached_tokens + excluded.cached_tokens,"
+                        " cost_usd = cost_usd + excluded.cost_usd",
+                        rows,
+                    )
+            except sqlite3.Error as e:
+                print(f"⚠️ API usage ledger write failed: {e}")
+                return
+            today = date.today().isoformat()
+            if self._day == today:
+                for (day, _), vals in self._pending.items():
+                    if day == today:
+                        for field, v in zip(_FIELDS, vals):
+                            self._stored_today[field] += v
+            self._pending.clear()
+            self._pending_records = 0
+            self._last_flush = time.monotonic()
+
+    def _refresh_today(self) -> None:
+        """调用方需持有锁；日期变化或超过 REFRESH_INTERVAL 时从库里重读今天的合计"""
+        today = date.today().isoformat()
+        if self._day == today and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+            return
+        conn = self._connect()
+        totals = None
+        if conn is not None:
+            try:
+                totals = conn.execute(
+                    "SELECT " + ", ".join(f"COALESCE(SUM({f}), 0)" for f in _FIELDS)
+                    + " FROM daily_usage WHERE day = ?", (today,)
+                ).fetchone()
+            except sqlite3.Error:
+                totals = None
+        self._stored_today = dict(zip(_FIELDS, totals)) if totals else dict.fromkeys(_FIELDS, 0)
+        self._day = today
+        self._last_refresh = time.monotonic()
+
+    def _today_locked(self) -> dict:
+        """调用方需持有锁"""
+        self._refresh_today()
+        totals = dict(self._stored_today)
+        for (day, _), vals in self._pending.items():
+            if day == self._day:
+                for field, v in zip(_FIELDS, vals):
+                    totals[field] += v
+        return totals
+
+    def today(self) -> dict:
+        """今天的合计（已入库 + 未入库）"""
+        with self._lock:
+            return self._today_locked()
+
+    def cost_today(self) -> float:
+        return self.today()["cost_usd"]
+
+    def committed_today(self) -> float:
+        """今天已花的费用 + 在途请求预占的费用（预算检查用）"""
+        with self._lock:
+            return self._today_locked()["cost_usd"] + self._reserved
+
+    def reserve(self, amount: float, budget: float) -> bool:
+        """预算内时预占 amount 并返回 True；已花 + 已预占 + amount 超过 budget 时返回 False"""
+        with self._lock:
+            if self._today_locked()["cost_usd"] + self._reserved + amount > budget:
+                return False
+            self._reserved += amount
+            return True
+
+    def release(self, amount: float) -> None:
+        """请求返回后释放预占（实际费用已由 record() 记入）"""
+        with self._lock:
+            self._reserved = max(0.0, self._reserved - amount)
+
+    def average_cost_per_item(self, days: int = 7) -> float | None:
+        """最近 N 天每篇文章的平均费用（用于费用预估）；没有按 token 计费的历史时返回 None"""
+        self.flush()
+        since = (date.today() - timedelta(days=days)).isoformat()
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                cost, items = conn.execute(
+                    "SELECT COALESCE(SUM(cost_usd), 0), COALESCE(SUM(items), 0) FROM daily_usage"
+                    " WHERE day >= ? AND prompt_tokens > 0", (since,)
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+        return cost / items if items else None
+
+
+_ledger: UsageLedger | None = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger(legacy_cost_per_call: float = 0.0003) -> UsageLedger:
+    """进程内共用一个账本"""
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = UsageLedger(legacy_cost_per_call=legacy_cost_per_call)
+    return _ledger
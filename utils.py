@@ -132,3 +132,38 @@ def normalize_source_short(raw_source: str) -> str:
         return domain_map[dom]
     # 未命中则返回域名（不是 URL），避免展示长链接
     return dom or raw_source
+
+class UnionFind:
+    # 并查集：路径压缩 + 按大小合并
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int) -> bool:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return True
+
+    def labels(self) -> list[int]:
+        """按首次出现顺序给每个连通分量编号（0, 1, 2, ...），与输入顺序无关的稳定编号"""
+        mapping: dict[int, int] = {}
+        out = []
+        for i in range(len(self.parent)):
+            root = self.find(i)
+            if root not in mapping:
+                mapping[root] = len(mapping)
+            out.append(mapping[root])
+        return out
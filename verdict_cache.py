@@ -0,0 +1,191 @@
+"""
+热点榜 API 判定结果持久化缓存（SQLite）
+are_similar_articles_api 对每个中间地带的文章对都要调用一次 LLM，结果原来不保存：
+重复打开同一周、或日期范围有重叠时，每个调用都会重来一遍。
+
+缓存键 = 两篇文章 url_id 的无序对 + 模型；值 = 是否同一事件。
+一次运行开始时把涉及本次文章的判定一次性读进内存，并做传递推断：
+- A~B、B~C 都判为相同 → A、C 相同
+- A~B 相同、B≁C 不同 → A、C 不同
+
+用法：
+    verdicts = load_verdicts(urls, model)
+    verdicts.lookup(url1, url2)           # True / False / None（没有缓存、也推断不出）
+    verdicts.record(url1, url2, same)     # 写入内存和 SQLite
+    verdicts.stats                        # {"hits": n, "inferred": m, "misses": k, "stored": s}
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils import UnionFind, url_id
+
+TRENDING_VERDICT_CACHE_PATH = Path(
+    os.getenv(
+        "TRENDING_VERDICT_CACHE_PATH",
+        Path.home() / ".us_china_picker" / "trending_verdicts.sqlite3"
+    )
+)
+
+
+def pair_key(url1: str, url2: str) -> tuple[str, str]:
+    a, b = url_id(url1), url_id(url2)
+    return (a, b) if a <= b else (b, a)
+
+
+class VerdictCache:
+    """SQLite 存储层：{(id_a, id_b): same}，id_a < id_b"""
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else TRENDING_VERDICT_CACHE_PATH
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self._conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS verdicts ("
+                    " id_a TEXT NOT NULL,"
+                    " id_b TEXT NOT NULL,"
+                    " model TEXT NOT NULL,"
+                    " same INTEGER NOT NULL,"
+                    " created_at REAL,"
+                    " PRIMARY KEY (id_a, id_b, model))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS verdicts_b ON verdicts (id_b, model)")
+                self._conn = conn
+            except sqlite3.Error as e:
+                print(f"⚠️ Trending verdict cache unavailable: {e}")
+                return None
+        return self._conn
+
+    def touching(self, ids: list[str], model: str) -> dict[tuple[str, str], bool]:
+        """至少一端在 ids 中的所有判定"""
+        found: dict[tuple[str, str], bool] = {}
+        with self._lock:
+            conn = self._connect()
+            if conn is None or not ids:
+                return found
+            unique = list(dict.fromkeys(ids))
+            # SQLite 默认最多 999 个参数，分块查询
+            for start in range(0, len(unique), 400):
+                chunk = unique[start:start + 400]
+                placeholders = ",".join("?" * len(chunk))
+                try:
+                    rows = conn.execute(
+                        f"SELECT id_a, id_b, same FROM verdicts WHERE model = ?"
+                        f" AND (id_a IN ({placeholders}) OR id_b IN ({placeholders}))",
+                        [model, *chunk, *chunk],
+                    ).fetchall()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Trending verdict cache read failed: {e}")
+                    rows = []
+                for a, b, same in rows:
+                    found[(a, b)] = bool(same)
+        return found
+
+    def put_many(self, items: dict[tuple[str, str], bool], model: str) -> None:
+        if not items:
+            return
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            now = time.time()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO verdicts (id_a, id_b, model, same, created_at)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        [(a, b, model, int(same), now) for (a, b), same in items.items()],
+                    )
+            except sqlite3.Error as e:
+                print(f"⚠️ Trending verdict cache write failed: {e}")
+
+
+class RunVerdicts:
+    """一次热点榜运行的判定视图：直接命中 + 传递推断，新判定写回缓存"""
+
+    def __init__(self, known: dict[tuple[str, str], bool], model: str, cache: VerdictCache | None = None,
+                 ids: list[str] | None = None):
+        self.model = model
+        self.cache = cache
+        self.known = dict(known)
+        # 节点 = 本次运行的文章 + 缓存判定里出现的其他文章
+        nodes = list(ids or []) + [key for pair in self.known for key in pair]
+        self._index = {key: n for n, key in enumerate(dict.fromkeys(nodes))}
+        self._uf = UnionFind(len(self._index))
+        self._different: set[tuple[int, int]] = set()
+        self.stats = {"hits": 0, "inferred": 0, "misses": 0, "stored": 0}
+        for (a, b), same in self.known.items():
+            self._add(a, b, same)
+
+    def _add(self, a: str, b: str, same: bool) -> None:
+        if a not in self._index or b not in self._index:
+            return
+        na, nb = self._index[a], self._index[b]
+        if same:
+            ra, rb = self._uf.find(na), self._uf.find(nb)
+            self._uf.union(na, nb)
+            root = self._uf.find(na)
+            # 合并后把「不同」关系改挂到新的根上
+            self._different = {
+                (root if x in (ra, rb) else x, root if y in (ra, rb) else y) for x, y in self._different
+            }
+        else:
+            ra, rb = self._uf.find(na), self._uf.find(nb)
+            self._different.update({(ra, rb), (rb, ra)})
+
+    def lookup(self, url1: str, url2: str) -> bool | None:
+        a, b = pair_key(url1, url2)
+        if (a, b) in self.known:
+            self.stats["hits"] += 1
+            return self.known[(a, b)]
+        if a in self._index and b in self._index:
+            ra, rb = self._uf.find(self._index[a]), self._uf.find(self._index[b])
+            if ra == rb:
+                self.stats["inferred"] += 1
+                return True
+            if (ra, rb) in self._different:
+                self.stats["inferred"] += 1
+                return False
+        self.stats["misses"] += 1
+        return None
+
+    def record(self, url1: str, url2: str, same: bool) -> None:
+        key = pair_key(url1, url2)
+        self.known[key] = same
+        self._add(*key, same)
+        if self.cache is not None:
+            self.cache.put_many({key: same}, self.model)
+        self.stats["stored"] += 1
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"♻️ Trending verdicts: {s['hits']} cached, {s['inferred']} inferred, "
+                f"{s['stored']} new API verdicts stored")
+
+
+_default_cache: VerdictCache | None = None
+
+
+def get_verdict_cache() -> VerdictCache:
+    """进程内共用一个缓存连接"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = VerdictCache()
+    return _default_cache
+
+
+def load_verdicts(urls: list[str], model: str, cache: VerdictCache | None = None) -> RunVerdicts:
+    cache = cache or get_verdict_cache()
+    ids = [url_id(u) for u in urls if u]
+    return RunVerdicts(cache.touching(ids, model), model, cache, ids)
@@ -1,7 +1,7 @@
 import requests
 from datetime import datetime, timezone
 from dateutil import parser as dtparser
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List
 
 from utils import clean_html
 
@@ -236,7 +236,8 @@ def _fetch_wsj_articles_by_query(
     max_pages: int = 5,
     timeout: int = 15,
     raw_source: str = "https://www.wsj.com",
-    filter_china_related: bool = False
+    filter_china_related: bool = False,
+    on_page: Callable[[List[Dict[str, Any]]], bool] | None = None,
 ) -> List[Dict[str, Any]]:
     """
     根据搜索查询拉取 WSJ 文章（通用函数）
@@ -249,6 +250,7 @@ def _fetch_wsj_articles_by_query(
         timeout: 超时时间
         raw_source: 原始来源 URL
         filter_china_related: 是否过滤 China 相关文章（用于 world section）
+        on_page: 可选回调，每页结束时传入本页新增的文章；返回 True 表示调用方已经够了，停止翻页
     """
     results: List[Dict[str, Any]] = []
     session = requests.Session()
@@ -286,6 +288,7 @@ def _fetch_wsj_articles_by_query(
             break
 
         stop_paging = False
+        page_start = len(results)
         for article in articles:
             url = article.get("sourceUrl")
             title = (article.get("headline") or {}).get("text")
@@ -316,13 +319,17 @@ def _fetch_wsj_articles_by_query(
                 "raw_source": raw_source,
             })
 
+        if on_page and on_page(results[page_start:]):
+            stop_paging = True
+
         if stop_paging:
             break
 
     return results
 
 
-def fetch_wsj_articles(*, date_from: datetime, date_to: datetime, max_pages: int = 5, timeout: int = 15, include_world_asia: bool = True) -> List[Dict[str, Any]]:
+def fetch_wsj_articles(*, date_from: datetime, date_to: datetime, max_pages: int = 5, timeout: int = 15, include_world_asia: bool = True,
+                       on_page: Callable[[List[Dict[str, Any]]], bool] | None = None) -> List[Dict[str, Any]]:
     """
     拉取 WSJ China 相关文章。
     
@@ -341,6 +348,7 @@ def fetch_wsj_articles(*, date_from: datetime, date_to: datetime, max_pages: int
         max_pages: world/china section 的最大页数（默认 5）
         timeout: 超时时间
         include_world_asia: 是否包含 world/asia section 的 China 相关文章（默认 True）
+        on_page: 可选回调（每页结束时调用，返回 True 停止翻页），两个 section 共用
     
     Returns:
         去重后的文章列表（按 URL 去重）
@@ -356,7 +364,8 @@ def fetch_wsj_articles(*, date_from: datetime, date_to: datetime, max_pages: int
         max_pages=max_pages,  # 保持原有的页数
         timeout=timeout,
         raw_source="https://www.wsj.com/world/china",
-        filter_china_related=False  # world/china section 的文章都是 China 相关的，不需要过滤
+        filter_china_related=False,  # world/china section 的文章都是 China 相关的，不需要过滤
+        on_page=on_page,
     )
     
     for article in china_section_results:
@@ -380,7 +389,8 @@ def fetch_wsj_articles(*, date_from: datetime, date_to: datetime, max_pages: int
             max_pages=world_asia_max_pages,  # 只取前 3 页
             timeout=timeout,
             raw_source="https://www.wsj.com/world/asia",
-            filter_china_related=True  # 过滤非 China 相关文章（因为 world/asia 包含很多非 China 文章）
+            filter_china_related=True,  # 过滤非 China 相关文章（因为 world/asia 包含很多非 China 文章）
+            on_page=on_page,
         )
         
         for article in world_asia_results: